@@ -80,6 +80,8 @@ if DEBUG:
 
 MIDDLEWARE = [
     # "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "project.metrics.MetricsMiddleware",
+    "project.query_budget.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -91,7 +93,10 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_htmx.middleware.HtmxMiddleware",
     "project.acl_handler.UserAdminCheckMiddleware",
+    "project.cart.CartContextMiddleware",
     "project.librarysettings.LibrarySettingsMiddleware",
+    # Library managers can profile any page with ?_profile=1, see project/profiler.py
+    "project.profiler.RequestProfilerMiddleware",
 ]
 
 if DEBUG:
@@ -127,6 +132,9 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # Take the write lock when a transaction starts, SQLite ignores
+        # select_for_update() and the cart changes rely on it, see project/cart.py
+        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
     }
 }
 
@@ -138,6 +146,54 @@ if DATABASE_URL:
         ssl_require=not DEBUG,
     )
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The local memory cache is per process. Set CACHE_URL to a redis URL so the
+# version stamps used by the catalogue caches are shared by all gunicorn workers
+# and the management commands. Without it, the library settings are read again
+# from the database, the group memberships are not kept across requests and the
+# shop capacity cannot be enabled, see project/cache_versions.py
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+CACHE_URL = os.environ.get("CACHE_URL")
+if CACHE_URL:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": CACHE_URL,
+    }
+
+# Whether every process of the site shares the default cache. Set it on a single
+# process deployment to use the local memory cache as a shared one.
+CACHE_SHARED = env_bool("CACHE_SHARED", default=bool(CACHE_URL))
+
+# Dotted path of the plant full-text search backend, chosen from the database
+# vendor when empty. See project/search_backends.py
+PLANT_SEARCH_BACKEND = os.environ.get("PLANT_SEARCH_BACKEND")
+
+# Answer the boolean and lookup facets of the plant catalogue filter from
+# in-memory bitsets kept by each worker process.
+PLANT_BITMAP_INDEX = env_bool("PLANT_BITMAP_INDEX", default=False)
+
+# Log the requests running more SQL queries than their view's budget, or repeating
+# a query more often than QUERY_BUDGET_DUPLICATES. See project/query_budget.py
+QUERY_BUDGET_ENABLED = env_bool("QUERY_BUDGET_ENABLED", default=DEBUG)
+QUERY_BUDGET_DEFAULT = int(os.environ.get("QUERY_BUDGET_DEFAULT", 30))
+QUERY_BUDGET_DUPLICATES = int(os.environ.get("QUERY_BUDGET_DUPLICATES", 5))
+
+# Request, cache and Celery task metrics served at /metrics/ in the Prometheus
+# format. Every web and worker process writes its counts in METRICS_DIR, which
+# they must share. The endpoint only answers the clients sending
+# "Authorization: Bearer <METRICS_TOKEN>", it is not found while the token is unset.
+# See project/metrics.py
+METRICS_ENABLED = env_bool("METRICS_ENABLED", default=False)
+METRICS_DIR = Path(os.environ.get("METRICS_DIR") or BASE_DIR / "logs/metrics")
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -186,6 +242,14 @@ STATIC_ROOT = BASE_DIR / "staticfiles/"
 MEDIA_ROOT = BASE_DIR / "media"
 MEDIA_URL = "/media/"
 
+# Pre-rendered public pages, for the web server to serve to visitors without a
+# session. Written by the render_public_site command and, when PUBLIC_SITE_RENDER
+# is set, refreshed by a Celery task after each edit. See project/public_site.py
+PUBLIC_SITE_ROOT = Path(
+    os.environ.get("PUBLIC_SITE_ROOT") or MEDIA_ROOT / "public-site"
+)
+PUBLIC_SITE_RENDER = env_bool("PUBLIC_SITE_RENDER", default=False)
+
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
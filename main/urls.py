@@ -7,7 +7,7 @@ from django.urls import include, path
 from django.utils.translation import gettext_lazy as _
 from ninja import NinjaAPI
 
-from project import views
+from project import admission, metrics, views
 from project.api import router as home_router
 
 api = NinjaAPI(version="1.0.0")
@@ -16,6 +16,7 @@ api.add_router("/", home_router)
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("healthz/", lambda request: HttpResponse("ok", content_type="text/plain")),
+    path("metrics/", metrics.metrics_view, name="metrics"),
     path("stripe/webhook/", views.stripe_webhook, name="stripe-webhook"),
 ]
 
@@ -887,6 +888,11 @@ urlpatterns += i18n_patterns(
         views.checkout,
         name="checkout",
     ),
+    path(
+        _("waiting-room/"),
+        admission.waiting_room,
+        name="shop-waiting-room",
+    ),
     path(
         _("donate/"),
         views.donation_page,
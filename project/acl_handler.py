@@ -1,10 +1,77 @@
+"""Group based access control.
+
+The group names of a user are read once per request and kept on the user object,
+and across requests in the Django cache under the GROUPS version stamp. The
+receivers in project.signals evict a user's entry when their groups change, and
+bump the stamp when a group is renamed, deleted or cleared of its users.
+Anonymous requests never query the groups.
+
+The evictions only reach the other workers through a shared cache. Without one,
+see cache_versions.is_shared(), the groups are read once per request, so a user
+removed from a group loses its access right away on every worker.
+"""
+
 from functools import wraps
 
 from django.contrib import messages
 from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db import transaction
 from django.http import HttpResponseForbidden
 
-from project.models import ProjectUser
+from project import cache_versions, metrics
+
+_USER_GROUPS_KEY_PREFIX = "user-groups"
+_GROUP_NAMES_KEY_PREFIX = "group-names"
+TIMEOUT = 60 * 60 * 24
+
+
+def _user_groups_key(user_id) -> str:
+    version = cache_versions.get_version(cache_versions.GROUPS)
+    return f"{_USER_GROUPS_KEY_PREFIX}:{version}:{user_id}"
+
+
+def user_groups(user) -> frozenset[str]:
+    """Return the names of the groups user belongs to."""
+    if not user.is_authenticated:
+        return frozenset()
+    groups = getattr(user, "_group_names", None)
+    if groups is None:
+        if not cache_versions.is_shared():
+            groups = frozenset(user.groups.values_list("name", flat=True))
+            user._group_names = groups
+            return groups
+        key = _user_groups_key(user.pk)
+        groups = cache.get(key)
+        metrics.cache_lookup("user-groups", groups is not None)
+        if groups is None:
+            groups = frozenset(user.groups.values_list("name", flat=True))
+            cache.set(key, groups, TIMEOUT)
+        user._group_names = groups
+    return groups
+
+
+def group_names() -> list[str]:
+    """Return the names of every group."""
+    if not cache_versions.is_shared():
+        return list(Group.objects.values_list("name", flat=True))
+    version = cache_versions.get_version(cache_versions.GROUPS)
+    key = f"{_GROUP_NAMES_KEY_PREFIX}:{version}"
+    names = cache.get(key)
+    metrics.cache_lookup("group-names", names is not None)
+    if names is None:
+        names = list(Group.objects.values_list("name", flat=True))
+        cache.set(key, names, TIMEOUT)
+    return names
+
+
+def evict_user_groups_on_commit(user_ids):
+    """Drop the cached groups of user_ids once the current transaction commits."""
+    user_ids = list(user_ids)
+    if user_ids:
+        transaction.on_commit(
+            lambda: cache.delete_many([_user_groups_key(pk) for pk in user_ids])
+        )
 
 
 def _is_in_group(request, group_name: list[str] | str) -> bool:
@@ -16,16 +83,9 @@ def _is_in_group(request, group_name: list[str] | str) -> bool:
     Returns:
         bool: True if the user is in the specified group, False otherwise.
     """
-    user = request.user
-    if not user.is_authenticated:
-        return False
-    try:
-        if isinstance(group_name, str):
-            group_name = [group_name]
-        project_user = ProjectUser.objects.get(username=user)
-        return project_user.groups.filter(name__in=group_name).exists()
-    except ProjectUser.DoesNotExist:
-        return False
+    if isinstance(group_name, str):
+        group_name = [group_name]
+    return not user_groups(request.user).isdisjoint(group_name)
 
 
 def make_group_checker(group_name):
@@ -93,8 +153,7 @@ def create_all_group_checkers():
               checker functions.
     """
     groups_checkers = {}
-    groups = Group.objects.values_list("name", flat=True)
-    for group in groups:
+    for group in group_names():
         groups_checkers[group] = make_group_checker(group)
 
     return groups_checkers
@@ -106,13 +165,14 @@ class UserAdminCheckMiddleware:
         self.get_response = get_response
 
     def __call__(self, request):
-        groups_checkers = create_all_group_checkers()
-        for group_name, checker in groups_checkers.items():
-            setattr(
-                request.user,
-                f'is_{group_name.lower().replace(" ", "_")}',
-                checker(request),
-            )
+        if request.user.is_authenticated:
+            groups_checkers = create_all_group_checkers()
+            for group_name, checker in groups_checkers.items():
+                setattr(
+                    request.user,
+                    f'is_{group_name.lower().replace(" ", "_")}',
+                    checker(request),
+                )
 
         response = self.get_response(request)
         if response.status_code == 403:
@@ -0,0 +1,228 @@
+"""Admission control of the seed shop, for the rush when the shop opens.
+
+When LibrarySetting.shop_capacity is set, at most that many customers use the cart
+and checkout views at once, the views decorated with admission_required. The next
+customers are sent to a waiting room, a page polling its queue position with htmx
+every POLL_INTERVAL seconds, and are let in, in their order of arrival, as places
+free up.
+
+An admitted customer keeps their place while they make a cart or checkout request
+at least every LibrarySetting.shop_idle_minutes, and gives it up when they place
+their order. A waiting visitor who stops polling for WAITING_TIMEOUT seconds, e.g.
+who closed the page, leaves the queue.
+
+The admission token of a visitor is kept in their session. The places and the queue
+are small entries of the default cache, which expire on their own:
+
+- a key per place, holding the token of its customer, taken with cache.add() so
+  two visitors never get the same place
+- a key per admitted token, naming its place
+- a ticket number per waiting token, from a counter, and a key per ticket
+
+A visitor is only let in when no more visitors wait ahead of them than there are
+free places, and when they take one of them. Otherwise, e.g. when others took the
+free places first, they stay in the waiting room. A poll reads at most
+QUEUE_WINDOW tickets at the head of the queue, the position of the visitors behind
+them counts the tickets of the visitors who left meanwhile.
+
+Every process must see the same places and queue, so the capacity is only applied
+with a shared cache, see cache_versions.is_shared(). reset() starts a new
+generation of the keys, under the ADMISSION version stamp.
+"""
+
+import uuid
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
+from django.utils.http import url_has_allowed_host_and_scheme
+
+from project import cache_versions
+
+SESSION_KEY = "admission_token"
+# Seconds between two polls of the waiting room
+POLL_INTERVAL = 5
+WAITING_TIMEOUT = 6 * POLL_INTERVAL
+# Tickets read at the head of the queue by a poll
+QUEUE_WINDOW = 200
+
+
+def _token(request) -> str:
+    token = request.session.get(SESSION_KEY)
+    if token is None:
+        token = request.session[SESSION_KEY] = uuid.uuid4().hex
+    return token
+
+
+def _prefix() -> str:
+    return f"admission:{cache_versions.get_version(cache_versions.ADMISSION)}"
+
+
+def _place_key(prefix, place) -> str:
+    return f"{prefix}:place:{place}"
+
+
+def _ticket_key(prefix, ticket) -> str:
+    return f"{prefix}:ticket:{ticket}"
+
+
+def _next_ticket(prefix) -> int:
+    key = f"{prefix}:tickets"
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key)
+
+
+def _position(prefix, ticket) -> int:
+    """Return the position of ticket in the queue, moving its head forward.
+
+    The tickets beyond QUEUE_WINDOW are counted whether their visitor still waits.
+    """
+    head_key = f"{prefix}:head"
+    head = cache.get(head_key, 1)
+    window = range(head, min(ticket, head + QUEUE_WINDOW))
+    waiting = cache.get_many([_ticket_key(prefix, number) for number in window])
+    # The first ticket still waiting, the tickets before it left the queue
+    first = next(
+        (number for number in window if _ticket_key(prefix, number) in waiting),
+        window.stop,
+    )
+    if first > head:
+        cache.set(head_key, first, timeout=None)
+    return len(waiting) + ticket - window.stop + 1
+
+
+def _is_admitted(prefix, token, timeout) -> bool:
+    """Tell whether token holds a place, renewing it for timeout seconds."""
+    admitted_key = f"{prefix}:admitted:{token}"
+    place = cache.get(admitted_key)
+    if place is None or cache.get(_place_key(prefix, place)) != token:
+        return False
+    cache.touch(_place_key(prefix, place), timeout)
+    cache.touch(admitted_key, timeout)
+    return True
+
+
+def _take_place(prefix, token, places, timeout) -> bool:
+    """Take one of the free places for token, False when others took them."""
+    for place in places:
+        if cache.add(_place_key(prefix, place), token, timeout=timeout):
+            cache.set(f"{prefix}:admitted:{token}", place, timeout=timeout)
+            return True
+    return False
+
+
+def admit(request) -> int:
+    """Admit the visitor of request, or return their position in the queue.
+
+    Return 0 once admitted, renewing the admission, or when the shop has no
+    capacity limit or no shared cache to apply it.
+    """
+    library_settings = request.library_settings
+    capacity = library_settings.shop_capacity
+    if not capacity or not cache_versions.is_shared():
+        return 0
+    token = _token(request)
+    timeout = library_settings.shop_idle_minutes * 60
+    prefix = _prefix()
+    if _is_admitted(prefix, token, timeout):
+        return 0
+
+    waiting_key = f"{prefix}:waiting:{token}"
+    ticket = cache.get(waiting_key)
+    if ticket is None:
+        ticket = _next_ticket(prefix)
+    cache.set_many(
+        {waiting_key: ticket, _ticket_key(prefix, ticket): token},
+        timeout=WAITING_TIMEOUT,
+    )
+    position = _position(prefix, ticket)
+    taken = cache.get_many([_place_key(prefix, place) for place in range(capacity)])
+    free = [
+        place for place in range(capacity) if _place_key(prefix, place) not in taken
+    ]
+    if position <= len(free) and _take_place(prefix, token, free, timeout):
+        cache.delete_many([waiting_key, _ticket_key(prefix, ticket)])
+        return 0
+    return position
+
+
+def release(request):
+    """Give up the place of the visitor of request, e.g. after their order."""
+    token = request.session.get(SESSION_KEY)
+    if token is None:
+        return
+    prefix = _prefix()
+    admitted_key = f"{prefix}:admitted:{token}"
+    place = cache.get(admitted_key)
+    if place is None:
+        return
+    if cache.get(_place_key(prefix, place)) == token:
+        cache.delete(_place_key(prefix, place))
+    cache.delete(admitted_key)
+
+
+def reset():
+    """Empty the shop and the queue, e.g. when the shop opens."""
+    cache_versions.bump_version(cache_versions.ADMISSION)
+
+
+def admission_required(view_func):
+    """Send the visitors over the shop capacity to the waiting room."""
+
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        if not request.library_settings.is_shop_open or not admit(request):
+            return view_func(request, *args, **kwargs)
+        is_htmx = request.headers.get("HX-Request") == "true"
+        # Back to the page the visitor came from, not to a POST-only view
+        if request.method == "GET" and not is_htmx:
+            next_url = request.get_full_path()
+        else:
+            next_url = request.headers.get("Referer", "")
+        query = urlencode({"next": _safe_next(request, next_url)})
+        url = f"{reverse('shop-waiting-room')}?{query}"
+        if is_htmx:
+            response = HttpResponse(status=200)
+            response["HX-Redirect"] = url
+            return response
+        return redirect(url)
+
+    return wrapped_view
+
+
+def _safe_next(request, next_url) -> str:
+    if url_has_allowed_host_and_scheme(
+        next_url, {request.get_host()}, require_https=request.is_secure()
+    ):
+        return next_url
+    return reverse("shopping-cart")
+
+
+def waiting_room(request):
+    """Show the queue position of the visitor, and let them in on their turn.
+
+    The page polls this view with htmx, which answers with the position fragment
+    or, once admitted, redirects to the next parameter.
+    """
+    next_url = _safe_next(request, request.GET.get("next", ""))
+    is_htmx = request.headers.get("HX-Request") == "true"
+
+    position = admit(request) if request.library_settings.is_shop_open else 0
+    if not position:
+        if is_htmx:
+            response = HttpResponse(status=200)
+            response["HX-Redirect"] = next_url
+            return response
+        return redirect(next_url)
+
+    context = {
+        "position": position,
+        "poll_interval": POLL_INTERVAL,
+        "next_url": next_url,
+    }
+    if is_htmx:
+        return render(request, "project/_waiting_room_position.html", context)
+    return render(request, "project/waiting-room.html", context)
@@ -1,14 +1,33 @@
 # This api uses the djang-ninja framework to create a RESTful API for the plant profiles.
 
-from django.shortcuts import get_object_or_404
-from ninja import ModelSchema, Router
+from django.http import Http404, HttpResponse
+from ninja import ModelSchema, Router, Schema
 from ninja.security import APIKeyHeader
 
+from project import autocomplete, cache_versions, conditional, profile_bundle
 from project.models import PlantProfile
 
 router = Router()
 
 
+def not_modified(request, response: HttpResponse, validators):
+    """Return a 304 response when the client copy is current, else None.
+
+    The validators are also added to the ninja temporal response.
+    """
+    conditional_response = conditional.not_modified(request, validators)
+    if conditional_response is None:
+        conditional.set_validators(response, validators)
+    return conditional_response
+
+
+def catalogue_validators(request):
+    latest_change, rows = conditional.table_state(PlantProfile.objects.all())
+    return conditional.validators(
+        request, latest_change, rows, last_modified=latest_change, private=False
+    )
+
+
 # define a get decorator to the root url
 # define a method named home that take a request as an argument and return a string
 @router.get("/")
@@ -61,27 +80,70 @@ class PlantProfileSchema(ModelSchema):
 # Define a get decorator to the /plant-profiles/ url
 # Define a method named plant_profiles that take a request as an argument and return a list of PlantProfile objects
 @router.get("/plant-profiles/", response=list[PlantProfileSchema])
-def plant_profiles(request):
-
+def plant_profiles(request, response: HttpResponse):
+    if cached := not_modified(request, response, catalogue_validators(request)):
+        return cached
     return PlantProfile.objects.filter(seed_availability=True)
 
 
 @router.get("/seeds-available/", response=list[PlantProfileSchema], auth=api_key)
-def seeds_available(request):
+def seeds_available(request, response: HttpResponse):
     """Usage example:
     curl -X 'GET' \
     'http://127.0.0.1:8000/api/v1/seeds-available/' \
     -H 'accept: application/json' \
     -H 'X-API-Key: test'
     """
+    if cached := not_modified(request, response, catalogue_validators(request)):
+        return cached
     return PlantProfile.objects.filter(seed_availability=True)
 
 
 @router.get("/plant-profile/{pk}/", response=PlantProfileSchema)
-def plant_profile(request, pk: int):
+def plant_profile(request, pk: int, response: HttpResponse):
     """Usage exmple:
     curl -X 'GET' \
     'http://127.0.0.1:8000/api/v1/plant-profiles/' \
     -H 'accept: application/json'
     """
-    return get_object_or_404(PlantProfile, pk=pk)
+    modified = (
+        PlantProfile.objects.filter(pk=pk).values_list("modified", flat=True).first()
+    )
+    if modified is not None:
+        validators = conditional.validators(
+            request, pk, modified, last_modified=modified, private=False
+        )
+        if cached := not_modified(request, response, validators):
+            return cached
+    bundle = profile_bundle.load(pk)
+    if bundle is None:
+        raise Http404
+    return bundle.plant
+
+
+class PlantNameSuggestionSchema(Schema):
+    label: str
+    kind: str
+    plant_id: int | None = None
+    latin_name: str | None = None
+
+
+@router.get("/plant-names/autocomplete/", response=list[PlantNameSuggestionSchema])
+def plant_name_autocomplete(
+    request, response: HttpResponse, q: str = "", limit: int = 10
+):
+    """Usage example:
+    curl -X 'GET' \
+    'http://127.0.0.1:8000/api/v1/plant-names/autocomplete/?q=milk&limit=5' \
+    -H 'accept: application/json'
+
+    kind is one of latin, english, french, synonym or non_native.
+    """
+    # Each process bumps its own catalogue version stamp without a shared cache
+    if cache_versions.is_shared():
+        validators = conditional.validators(
+            request, cache_versions.get_version(cache_versions.CATALOGUE), private=False
+        )
+        if cached := not_modified(request, response, validators):
+            return cached
+    return autocomplete.suggest(q, max(limit, 0))
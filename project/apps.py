@@ -7,6 +7,8 @@ class ProjectConfig(AppConfig):
 
     def ready(self):
         """
-        Import signal handlers when the app is ready.
+        Import signal handlers when the app is ready, the Celery task signal
+        receivers of project.metrics included.
         """
+        import project.metrics  # noqa
         import project.signals  # noqa
@@ -0,0 +1,182 @@
+"""In-memory prefix trie for the plant name type-ahead.
+
+Each worker process can keep one trie over the accent-folded latin, english and
+french names of the active plant profiles, their obsolete names and the names of
+the non-native species. Every word of a name starts a path in the trie, so
+"milk" suggests "Common Milkweed" and "strang" suggests "Dog-strangling vine".
+
+Every node keeps the best MAX_SUGGESTIONS entries below it, ranked current names
+first, then obsolete names, then non-native species, shorter names first. A lookup
+walks one node per character of the prefix and slices that list.
+
+The trie is rebuilt lazily whenever the catalogue version stamp in the shared
+cache changes, see project.cache_versions and the receivers in project.signals.
+Without a shared cache, see cache_versions.is_shared(), the stamps bumped by the
+other processes are not seen, and the trie is also rebuilt once it is older than
+REBUILD_INTERVAL.
+"""
+
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from project import cache_versions, metrics, models
+from project.normalize import fold_text
+
+MAX_SUGGESTIONS = 10
+# Seconds a trie is used without a shared cache, the longest an edit made by
+# another process takes to be suggested.
+REBUILD_INTERVAL = 60
+
+LATIN = "latin"
+ENGLISH = "english"
+FRENCH = "french"
+SYNONYM = "synonym"
+NON_NATIVE = "non_native"
+KIND_RANKS = {LATIN: 0, ENGLISH: 0, FRENCH: 0, SYNONYM: 1, NON_NATIVE: 2}
+
+SPACES_RE = re.compile(r"\s+")
+
+
+def fold_prefix(value: str | None) -> str:
+    """Return value folded with runs of whitespace collapsed to one space."""
+    return SPACES_RE.sub(" ", fold_text(value)).lstrip()
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    label: str
+    kind: str
+    # The plant profile named, None for a non-native species
+    plant_id: int | None = None
+    latin_name: str | None = None
+
+
+class _Node:
+    __slots__ = ("children", "entries")
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []
+
+
+class PlantNameTrie:
+    """Prefix trie over every plant name, built from three queries."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.built = time.monotonic()
+        self.root = _Node()
+        self.suggestions = []
+
+    @staticmethod
+    def _suggestions():
+        for plant in models.PlantProfile.objects.values(
+            "id", "latin_name", "english_name", "french_name"
+        ):
+            for kind, field in (
+                (LATIN, "latin_name"),
+                (ENGLISH, "english_name"),
+                (FRENCH, "french_name"),
+            ):
+                if plant[field]:
+                    yield Suggestion(
+                        plant[field], kind, plant["id"], plant["latin_name"]
+                    )
+        obsolete_names = models.ObsoleteNames.objects.filter(
+            plant_profile__in=models.PlantProfile.objects.all()
+        ).values_list("obsolete_name", "plant_profile_id", "plant_profile__latin_name")
+        for obsolete_name, plant_id, latin_name in obsolete_names:
+            if obsolete_name:
+                yield Suggestion(obsolete_name, SYNONYM, plant_id, latin_name)
+        for species in models.NonNativeSpecies.objects.values_list(
+            "latin_name", "english_name_en", "english_name_fr"
+        ):
+            for name in dict.fromkeys(species):
+                if name:
+                    yield Suggestion(name, NON_NATIVE)
+
+    @classmethod
+    def build(cls, version=None):
+        trie = cls(version)
+        ranked = sorted(
+            cls._suggestions(),
+            key=lambda s: (KIND_RANKS[s.kind], len(s.label), fold_text(s.label)),
+        )
+        # A plant whose names are spelled alike is suggested once
+        seen = set()
+        suggestions = []
+        for suggestion in ranked:
+            key = (fold_text(suggestion.label), suggestion.plant_id)
+            if key not in seen:
+                seen.add(key)
+                suggestions.append(suggestion)
+        trie.suggestions = suggestions
+        # Suggestions are inserted best first, a node is full once it holds
+        # MAX_SUGGESTIONS entries and no later one can displace them.
+        for position, suggestion in enumerate(suggestions):
+            key = fold_prefix(suggestion.label).rstrip()
+            starts = [
+                i
+                for i, char in enumerate(key)
+                if char.isalnum() and (i == 0 or not key[i - 1].isalnum())
+            ]
+            for start in starts:
+                node = trie.root
+                for char in key[start:]:
+                    node = node.children.setdefault(char, _Node())
+                    entries = node.entries
+                    # A name repeating a word reaches the same nodes twice
+                    if len(entries) < MAX_SUGGESTIONS and (
+                        not entries or entries[-1] != position
+                    ):
+                        entries.append(position)
+        return trie
+
+    def suggest(self, prefix, limit=MAX_SUGGESTIONS):
+        """Return up to limit suggestions whose name has a word starting with prefix."""
+        node = self.root
+        for char in fold_prefix(prefix):
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if node is self.root:
+            return []
+        return [self.suggestions[position] for position in node.entries[:limit]]
+
+
+_trie = None
+_trie_lock = threading.Lock()
+
+
+def get_trie():
+    """Return the plant name trie for the current catalogue version.
+
+    The trie is rebuilt at most once per version, or per REBUILD_INTERVAL without a
+    shared cache, by a single thread of the process.
+    """
+    global _trie
+    version = cache_versions.get_version(cache_versions.CATALOGUE)
+    trie = _trie
+    hit = _is_current(trie, version)
+    metrics.cache_lookup("plant-name-trie", hit)
+    if hit:
+        return trie
+    with _trie_lock:
+        if not _is_current(_trie, version):
+            _trie = PlantNameTrie.build(version)
+        return _trie
+
+
+def _is_current(trie, version):
+    if trie is None or trie.version != version:
+        return False
+    if cache_versions.is_shared():
+        return True
+    return time.monotonic() - trie.built < REBUILD_INTERVAL
+
+
+def suggest(prefix, limit=MAX_SUGGESTIONS):
+    """Return up to limit plant name suggestions for prefix, best first."""
+    return get_trie().suggest(prefix, min(limit, MAX_SUGGESTIONS))
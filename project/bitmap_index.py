@@ -0,0 +1,167 @@
+"""In-memory bitmap index over the plant catalogue.
+
+Each worker process can keep one bitset per boolean attribute of PlantProfile and
+one membership bitset per growth habit, bloom colour, lifespan and ecozone. Bit n
+of every bitset stands for the n-th plant, ordered by id, so any combination of
+those facets is answered with integer AND/NOT operations and only the matching ids
+go back to the database.
+
+The index is disabled unless settings.PLANT_BITMAP_INDEX is set. It is rebuilt
+whenever the catalogue version stamp in the shared cache changes, see
+project.cache_versions and the receivers in project.signals. Without a shared
+cache, see cache_versions.is_shared(), a process would not see the edits saved by
+the others, so the filters go through the database instead.
+"""
+
+import threading
+
+from django.conf import settings
+from django.db import models as db_models
+from django.utils.translation import get_language
+
+from project import cache_versions, models
+
+
+class PlantBitmapIndex:
+    """Bitsets over every plant profile, active or not, built from one query."""
+
+    def __init__(self, version=None):
+        self.version = version
+        self.ids = []
+        # {plant id: bit mask}
+        self.positions = {}
+        self.all_bits = 0
+        self.booleans = {}
+        self.growth_habits = {}
+        self.bloom_colours = {}
+        self.ecozones = {}
+        # {language code: {lifespan label: bits}}, lifespans are filtered by label
+        self.lifespans = {}
+
+    @staticmethod
+    def boolean_fields():
+        return [
+            field.name
+            for field in models.PlantProfile._meta.get_fields()
+            if isinstance(field, db_models.BooleanField) and not field.is_relation
+        ]
+
+    @classmethod
+    def build(cls, version=None):
+        index = cls(version)
+        boolean_fields = cls.boolean_fields()
+        index.booleans = dict.fromkeys(boolean_fields, 0)
+
+        rows = models.PlantProfile.all_objects.order_by("id").values_list(
+            "id", "growth_habit_id", "bloom_colour_id", "lifespan_id", *boolean_fields
+        )
+        lifespan_bits = {}
+        position = index.positions
+        for bit, row in enumerate(rows):
+            plant_id, growth_habit_id, bloom_colour_id, lifespan_id = row[:4]
+            mask = 1 << bit
+            position[plant_id] = mask
+            index.ids.append(plant_id)
+            for name, value in zip(boolean_fields, row[4:]):
+                if value:
+                    index.booleans[name] |= mask
+            if growth_habit_id is not None:
+                index.growth_habits[growth_habit_id] = (
+                    index.growth_habits.get(growth_habit_id, 0) | mask
+                )
+            if bloom_colour_id is not None:
+                index.bloom_colours[bloom_colour_id] = (
+                    index.bloom_colours.get(bloom_colour_id, 0) | mask
+                )
+            if lifespan_id is not None:
+                lifespan_bits[lifespan_id] = lifespan_bits.get(lifespan_id, 0) | mask
+        index.all_bits = (1 << len(index.ids)) - 1
+
+        ecozones = models.PlantProfile.ecozones.through.objects.values_list(
+            "ecozone_id", "plantprofile_id"
+        )
+        for ecozone_id, plant_id in ecozones:
+            index.ecozones[ecozone_id] = index.ecozones.get(
+                ecozone_id, 0
+            ) | position.get(plant_id, 0)
+
+        language_codes = [code for code, _name in settings.LANGUAGES]
+        for lifespan in models.PlantLifespan.objects.all():
+            bits = lifespan_bits.get(lifespan.id, 0)
+            for code in language_codes:
+                label = getattr(lifespan, f"lifespan_{code}", None)
+                if label:
+                    labels = index.lifespans.setdefault(code, {})
+                    labels[label] = labels.get(label, 0) | bits
+        return index
+
+    def boolean(self, name):
+        """Bits of the plants where the boolean field name is True."""
+        return self.booleans[name]
+
+    def growth_habit(self, growth_habit_id):
+        return self.growth_habits.get(growth_habit_id, 0)
+
+    def bloom_colour(self, bloom_colour_id):
+        return self.bloom_colours.get(bloom_colour_id, 0)
+
+    def ecozone(self, ecozone_id):
+        return self.ecozones.get(ecozone_id, 0)
+
+    def lifespan(self, label):
+        """Bits of the plants whose lifespan reads label in the active language."""
+        language = (get_language() or settings.LANGUAGE_CODE).split("-")[0]
+        return self.lifespans.get(language, {}).get(label, 0)
+
+    def bits_for(self, ids):
+        """Return the bits of the given plant ids, unknown ids are ignored."""
+        bits = 0
+        positions = self.positions
+        for plant_id in ids:
+            bits |= positions.get(plant_id, 0)
+        return bits
+
+    def negate(self, bits):
+        return self.all_bits & ~bits
+
+    def ids_for(self, bits):
+        """Return the plant ids whose bit is set, in id order."""
+        ids = []
+        bit = 0
+        while bits:
+            if bits & 1:
+                ids.append(self.ids[bit])
+            # Skip runs of unset bits a byte at a time
+            if not bits & 0xFF:
+                bits >>= 8
+                bit += 8
+            else:
+                bits >>= 1
+                bit += 1
+        return ids
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """Return the bitmap index for the current catalogue version.
+
+    Returns None when the index is disabled in the settings or the cache is not
+    shared. The index is rebuilt
+    at most once per version by a single thread of the process.
+    """
+    global _index
+    if not getattr(settings, "PLANT_BITMAP_INDEX", False):
+        return None
+    if not cache_versions.is_shared():
+        return None
+    version = cache_versions.get_version(cache_versions.CATALOGUE)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = PlantBitmapIndex.build(version)
+        return _index
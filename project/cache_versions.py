@@ -0,0 +1,72 @@
+"""Version stamps kept in the shared Django cache.
+
+A version stamp names a group of tables. It is bumped after any committed write to
+those tables, and every worker process compares the stamp it built its in-memory
+structures from with the shared one to know when to rebuild them.
+
+A missing stamp, for example after a cache restart, is recreated from the clock so
+it never goes back to a value a worker has already seen.
+
+The stamps bumped by another process, a gunicorn worker or a management command,
+are only seen when the default cache is shared, see is_shared().
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# PlantProfile rows, their many-to-many relations and the related species, and
+# their obsolete names.
+CATALOGUE = "catalogue"
+# Lookup tables listed in the catalogue filter sidebar.
+LOOKUPS = "lookups"
+# Auth groups and their names, see project.acl_handler.
+GROUPS = "groups"
+# The LibrarySetting singleton, see project.librarysettings.
+LIBRARY_SETTINGS = "library-settings"
+# The generation of the shop places and queue, see project.admission.
+ADMISSION = "admission"
+
+_KEY_PREFIX = "version-stamp"
+
+
+def is_shared() -> bool:
+    """Tell whether the default cache is shared by every process of the site."""
+    return settings.CACHE_SHARED
+
+
+def _key(name: str) -> str:
+    return f"{_KEY_PREFIX}:{name}"
+
+
+def get_version(name: str) -> int:
+    """Return the current version stamp for name, creating it when missing."""
+    key = _key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name: str) -> int:
+    """Increment the version stamp for name and return the new value."""
+    key = _key(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The stamp expired or was evicted, start again from the clock.
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+def bump_version_on_commit(name: str) -> None:
+    """Bump the version stamp once the current transaction commits.
+
+    Workers that rebuild before the commit would otherwise cache the old rows
+    under the new stamp.
+    """
+    transaction.on_commit(lambda: bump_version(name))
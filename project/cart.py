@@ -0,0 +1,221 @@
+"""Request-scoped customer and shopping cart state.
+
+CartContextMiddleware attaches a CartContext to every request as request.cart. The
+customer of the session, with their seed application, and the lines of their cart
+are each read once, on first use.
+
+The cart changes, add(), set_quantity() and remove(), are safe when many requests
+of a customer change the cart at once, e.g. when the shop opens. Each one locks
+the customer row, reads the cart total and the quantity of the line in a single
+query, checks the cart limit and writes the line, in one transaction. The new
+total is known from that read, an add-to-cart request does not read the lines.
+
+Checkout takes the same lock and reads the lines again with locked_lines(), so the
+order holds the lines of the cart as it is emptied.
+
+The cart item count kept in the session is updated along, see
+LibrarySettingsMiddleware.
+"""
+
+from dataclasses import dataclass
+from functools import cached_property
+
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+
+from project.models import Customer, ShoppingCart
+
+# Session key of the cart item count shown in the navigation bar
+CART_COUNT_SESSION_KEY = "cart_item_count"
+MAX_NON_PRIORITY_CART_ITEMS = 15
+
+
+@dataclass(frozen=True)
+class CartChange:
+    """Outcome of a cart change."""
+
+    # Quantity of the line after the change, 0 without a line
+    quantity: int
+    # Packets in the cart after the change
+    total: int
+    # False when refused by the cart limit, or when there was no line to update
+    accepted: bool = True
+
+    def __bool__(self):
+        return self.accepted
+
+
+class CartContext:
+    """The customer of a request and their cart lines, read once per request."""
+
+    def __init__(self, request):
+        self.request = request
+        # Cart total after the last change, while the lines are not read
+        self._known_total = None
+
+    @cached_property
+    def customer(self):
+        """Return the customer of the session, or None."""
+        customer_id = self.request.session.get("customer_id")
+        if not customer_id:
+            return None
+        return (
+            Customer.objects.select_related("application")
+            .filter(id=customer_id)
+            .first()
+        )
+
+    @cached_property
+    def _lines(self) -> dict:
+        if self.customer is None:
+            return {}
+        lines = (
+            ShoppingCart.objects.filter(customer=self.customer)
+            .select_related("plant_profile")
+            .order_by("added_date", "id")
+        )
+        return {line.plant_profile_id: line for line in lines}
+
+    @property
+    def lines(self) -> list:
+        """Return the cart lines, with their plant profiles."""
+        return list(self._lines.values())
+
+    @property
+    def total(self) -> int:
+        """Return the number of seed packets in the cart."""
+        if "_lines" not in self.__dict__ and self._known_total is not None:
+            return self._known_total
+        return sum(line.quantity for line in self._lines.values())
+
+    @property
+    def max_items(self):
+        """Return the most packets the customer may order, None for no limit."""
+        customer = self.customer
+        if customer and customer.application and customer.application.priority == 1:
+            return None
+        return MAX_NON_PRIORITY_CART_ITEMS
+
+    def allows(self, total) -> bool:
+        """Tell whether the cart may hold total packets."""
+        return self.max_items is None or total <= self.max_items
+
+    def line(self, plant_id):
+        """Return the cart line of plant_id, or None."""
+        return self._lines.get(plant_id)
+
+    def add(self, plant_profile, quantity) -> CartChange:
+        """Add quantity packets of plant_profile to the cart, within the limit."""
+        return self._change(plant_profile.id, quantity, plant_profile=plant_profile)
+
+    def set_quantity(self, plant_id, quantity) -> CartChange:
+        """Set the quantity of the line of plant_id, removed from 0 down."""
+        return self._change(plant_id, quantity, relative=False)
+
+    def remove(self, plant_id) -> CartChange:
+        """Remove the line of plant_id."""
+        return self._change(plant_id, 0, relative=False)
+
+    def _change(self, plant_id, quantity, relative=True, plant_profile=None):
+        customer = self.customer
+        lines = ShoppingCart.objects.filter(customer=customer)
+        with transaction.atomic():
+            self._lock_customer()
+            current = lines.aggregate(
+                total=Coalesce(Sum("quantity"), 0),
+                line=Sum("quantity", filter=Q(plant_profile_id=plant_id)),
+            )
+            old = current["line"] or 0
+            new = old + quantity if relative else max(quantity, 0)
+            total = current["total"] - old + new
+            if (current["line"] is None and not relative) or (
+                new > old and not self.allows(total)
+            ):
+                return self._changed(plant_id, old, current["total"], False)
+
+            line = lines.filter(plant_profile_id=plant_id)
+            created = None
+            if new == 0:
+                line.delete()
+            elif current["line"] is not None:
+                line.update(quantity=F("quantity") + quantity if relative else new)
+            else:
+                # A duplicate line fails on the unique (customer, plant_profile)
+                created = ShoppingCart.objects.create(
+                    customer=customer, plant_profile=plant_profile, quantity=new
+                )
+        return self._changed(plant_id, new, total, True, created)
+
+    def _changed(self, plant_id, quantity, total, accepted, created=None):
+        lines = self.__dict__.get("_lines")
+        if lines is not None:
+            if not quantity:
+                lines.pop(plant_id, None)
+            elif plant_id in lines:
+                lines[plant_id].quantity = quantity
+            elif created is not None:
+                lines[plant_id] = created
+            else:
+                # Read again on next use
+                del self.__dict__["_lines"]
+        self._known_total = total
+        self._save_count()
+        return CartChange(quantity, total, accepted)
+
+    def _lock_customer(self):
+        customer = self.customer
+        # Concurrent changes of the cart wait here for this one to commit
+        list(Customer.objects.select_for_update().filter(pk=customer.pk).values("pk"))
+
+    def locked_lines(self) -> list:
+        """Lock the customer and read their cart lines again, in a transaction.
+
+        The cart does not change until the transaction commits, e.g. while its
+        lines are ordered.
+        """
+        self._lock_customer()
+        self.__dict__.pop("_lines", None)
+        return self.lines
+
+    def drop_lines(self):
+        self.__dict__["_lines"] = {}
+        self._save_count()
+
+    def count(self) -> int:
+        """Return the session cart item count, counted from the lines when missing."""
+        count = self.request.session.get(CART_COUNT_SESSION_KEY)
+        if count is None:
+            count = self._save_count()
+        return count
+
+    def _save_count(self) -> int:
+        count = self.total
+        self.request.session[CART_COUNT_SESSION_KEY] = count
+        return count
+
+    def reset(self):
+        """Forget the customer and lines, after the session customer changed."""
+        self.__dict__.pop("customer", None)
+        self.__dict__.pop("_lines", None)
+        self._known_total = None
+        self.request.session.pop(CART_COUNT_SESSION_KEY, None)
+
+
+def get_cart(request) -> CartContext:
+    """Return the cart context of request, creating it outside the middleware."""
+    cart = getattr(request, "cart", None)
+    if cart is None:
+        cart = request.cart = CartContext(request)
+    return cart
+
+
+class CartContextMiddleware:
+    """Middleware attaching a lazy CartContext to each request as request.cart."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.cart = CartContext(request)
+        return self.get_response(request)
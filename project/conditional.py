@@ -0,0 +1,143 @@
+"""HTTP conditional GET for the public catalogue pages and the API.
+
+A view answers If-None-Match and If-Modified-Since with a 304, before rendering
+anything, when the validators computed from a few cheap aggregates still match:
+
+- MAX(modified) and COUNT(*) of the tables the page shows; the count catches the
+  deletions, which leave MAX(modified) unchanged;
+- a catalogue version stamp for what has no modified column, e.g. the
+  many-to-many relations or the bee and butterfly species. The stamps are only
+  seen by every process with a shared cache, see cache_versions.is_shared(),
+  the pages relying on them have no validators otherwise.
+
+Last-Modified is only sent when every table shown has a modified column, the ETag
+is the validator the HTML pages rely on. HTML pages embed the navigation of the
+signed in user, so their ETag also varies on the user, their groups and the
+language, on the shop and donation links of the library settings and on the cart
+count of the session, and they are marked private.
+"""
+
+import hashlib
+from dataclasses import dataclass
+from datetime import datetime
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+from django.utils.translation import get_language
+
+from project import acl_handler
+
+
+@dataclass
+class Validators:
+    etag: str
+    last_modified: datetime | None = None
+    private: bool = True
+
+
+def table_state(queryset) -> tuple[datetime | None, int]:
+    """Return (MAX(modified), COUNT(*)) of queryset, in one query."""
+    state = queryset.order_by().aggregate(latest=Max("modified"), rows=Count("pk"))
+    return state["latest"], state["rows"]
+
+
+def latest(*values) -> datetime | None:
+    """Return the most recent of the datetimes values, None values are ignored."""
+    return max((value for value in values if value is not None), default=None)
+
+
+def _navigation_state(request) -> tuple:
+    """Return what the navigation of an HTML page shows, besides the user."""
+    library_settings = getattr(request, "library_settings", None)
+    links = (
+        (library_settings.is_shop_open, library_settings.is_accepting_donations)
+        if library_settings is not None
+        else None
+    )
+    return (
+        links,
+        getattr(request, "cart_item_count", None),
+        sorted(acl_handler.user_groups(request.user)),
+    )
+
+
+def validators(request, *parts, last_modified=None, private=True) -> Validators:
+    """Return the validators of a response built from parts.
+
+    parts are any values whose repr changes with the content of the response.
+    """
+    if private:
+        user_id = request.user.pk if request.user.is_authenticated else None
+        parts += (get_language(), user_id, _navigation_state(request))
+    digest = hashlib.sha256(repr(parts).encode()).hexdigest()[:32]
+    return Validators(quote_etag(digest), last_modified, private)
+
+
+def not_modified(request, validators: Validators):
+    """Return the 304 (or 412) response matching the request headers, else None."""
+    if request.method not in ("GET", "HEAD") or validators is None:
+        return None
+    # A message waits to be shown, the page cached by the browser lacks it
+    if validators.private and len(messages.get_messages(request)):
+        return None
+    last_modified = validators.last_modified
+    response = get_conditional_response(
+        request,
+        etag=validators.etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    if response is not None and response.status_code == 304:
+        _add_headers(response, validators)
+    return response
+
+
+def set_validators(response, validators: Validators):
+    """Add the validators to response, clients must revalidate before reusing it."""
+    if validators is None or response.status_code != 200:
+        return response
+    return _add_headers(response, validators)
+
+
+def _add_headers(response, validators: Validators):
+    response.headers["ETag"] = validators.etag
+    if validators.last_modified:
+        response.headers["Last-Modified"] = http_date(
+            validators.last_modified.timestamp()
+        )
+    if validators.private:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Cookie"])
+    else:
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+def condition(validators_func):
+    """Decorate a view to answer conditional GET requests.
+
+    validators_func(request, *args, **kwargs) returns the Validators of the page,
+    or None to skip the conditional handling.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def inner(request, *args, **kwargs):
+            page_validators = None
+            if request.method in ("GET", "HEAD"):
+                page_validators = validators_func(request, *args, **kwargs)
+                response = not_modified(request, page_validators)
+                if response is not None:
+                    return response
+            response = view(request, *args, **kwargs)
+            return set_validators(response, page_validators)
+
+        return inner
+
+    return decorator
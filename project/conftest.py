@@ -0,0 +1,18 @@
+import pytest
+
+from project.query_budget import assert_within_budget
+
+
+@pytest.fixture
+def within_query_budget(client):
+    """Request a path with the test client, failing over the view's query budget.
+
+    Usage:
+        def test_calendar(within_query_budget):
+            within_query_budget(reverse("blooming-calendar"))
+    """
+
+    def check(path, budget=None, **kwargs):
+        return assert_within_budget(client, path, budget=budget, **kwargs)
+
+    return check
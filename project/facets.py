@@ -0,0 +1,122 @@
+"""Facet counts for the plant catalogue filter sidebar.
+
+For the current PlantProfileFilter state, facet_counts() returns how many of the
+matching plants each sidebar option would keep: every boolean attribute, including
+the is_native_to_* provinces, every growth habit, bloom colour and ecozone. The
+counts come from one pass over the bitmap index when it is enabled, otherwise
+from one aggregate query.
+
+Facets are keyed by the id of their sidebar input, e.g. "full_sun",
+"growth_habit_3" or "ecozone_5".
+"""
+
+from django.db.models import Count, Q
+
+from project import bitmap_index, filter_schema, models
+
+BOOLEAN_METHODS = (
+    "filter_boolean",
+    "filter_seed_availability",
+    "filter_accepting_seed",
+)
+EXCLUDE_METHODS = ("filter_excludes",)
+STARTER_PACKS = (
+    "starter_pack_shade",
+    "starter_pack_sun_dry",
+    "starter_pack_sun_wet",
+)
+
+
+def boolean_facets(filterset):
+    """Return (facet id, selected value) pairs of the boolean facets.
+
+    Plants are kept when the field is True, or False for the excluding filters.
+    """
+    boolean_fields = set(bitmap_index.PlantBitmapIndex.boolean_fields())
+    facets = [(name, True) for name in STARTER_PACKS]
+    for name, filter_ in filterset.filters.items():
+        if name not in boolean_fields:
+            continue
+        if filter_.method in BOOLEAN_METHODS:
+            facets.append((name, True))
+        elif filter_.method in EXCLUDE_METHODS:
+            facets.append((name, False))
+    return facets
+
+
+def facet_counts(filterset):
+    """Return {facet id: count} for the plants matched by filterset."""
+    schema = filter_schema.get_filter_schema()
+    growth_habit_ids = schema.growth_habit_ids
+    bloom_colour_ids = schema.bloom_colour_ids
+    ecozone_ids = schema.ecozone_ids
+    booleans = boolean_facets(filterset)
+
+    index = bitmap_index.get_index()
+    if index is not None:
+        return _bitmap_counts(
+            index,
+            filterset.qs,
+            booleans,
+            growth_habit_ids,
+            bloom_colour_ids,
+            ecozone_ids,
+        )
+    return _aggregate_counts(
+        filterset.qs, booleans, growth_habit_ids, bloom_colour_ids, ecozone_ids
+    )
+
+
+def _bitmap_counts(
+    index, queryset, booleans, growth_habit_ids, bloom_colour_ids, ecozone_ids
+):
+    bits = index.bits_for(queryset.order_by().values_list("id", flat=True))
+    counts = {}
+    for name, selected in booleans:
+        facet_bits = index.boolean(name)
+        if not selected:
+            facet_bits = index.negate(facet_bits)
+        counts[name] = (bits & facet_bits).bit_count()
+    for growth_habit_id in growth_habit_ids:
+        counts[f"growth_habit_{growth_habit_id}"] = (
+            bits & index.growth_habit(growth_habit_id)
+        ).bit_count()
+    for bloom_colour_id in bloom_colour_ids:
+        counts[f"bloom_colour_{bloom_colour_id}"] = (
+            bits & index.bloom_colour(bloom_colour_id)
+        ).bit_count()
+    for ecozone_id in ecozone_ids:
+        counts[f"ecozone_{ecozone_id}"] = (bits & index.ecozone(ecozone_id)).bit_count()
+    return counts
+
+
+def _aggregate_counts(
+    queryset, booleans, growth_habit_ids, bloom_colour_ids, ecozone_ids
+):
+    conditions = {name: Q(**{name: selected}) for name, selected in booleans}
+    for growth_habit_id in growth_habit_ids:
+        conditions[f"growth_habit_{growth_habit_id}"] = Q(
+            growth_habit_id=growth_habit_id
+        )
+    for bloom_colour_id in bloom_colour_ids:
+        conditions[f"bloom_colour_{bloom_colour_id}"] = Q(
+            bloom_colour_id=bloom_colour_id
+        )
+    # A subquery rather than a join, so the ecozones the plants are already
+    # filtered on do not restrict or multiply the counted rows.
+    ecozone_plants = models.PlantProfile.ecozones.through.objects
+    for ecozone_id in ecozone_ids:
+        conditions[f"ecozone_{ecozone_id}"] = Q(
+            id__in=ecozone_plants.filter(ecozone_id=ecozone_id).values(
+                "plantprofile_id"
+            )
+        )
+
+    # Aliases are prefixed, the aggregate names may not clash with model fields
+    result = queryset.order_by().aggregate(
+        **{
+            f"facet_{name}": Count("id", filter=condition)
+            for name, condition in conditions.items()
+        }
+    )
+    return {name: result[f"facet_{name}"] for name in conditions}
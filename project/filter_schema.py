@@ -0,0 +1,203 @@
+"""Cached schema of the plant catalogue filter sidebar.
+
+The sidebar lists the ecozones, growth habits, bloom colours and stratification
+durations, and htmx sends every filter input named in the hx-include selector with
+each request. FilterSchema gathers those lookup rows and the selector once; it is
+kept in the Django cache under the LOOKUPS version stamp, bumped by the signals
+whenever one of the lookup tables changes.
+
+The rows are ordered on their translated label, so the schema is cached per
+language.
+
+The stamp only reaches the other workers through a shared cache. Without one, see
+cache_versions.is_shared(), the schema is built again every time, so a new lookup
+row shows up right away on every worker.
+"""
+
+from dataclasses import dataclass
+
+from django.core.cache import cache
+from django.utils import translation
+
+from project import cache_versions, metrics, models
+
+_KEY_PREFIX = "filter-schema"
+# Stale schemas are never read again once the stamp moves on, let them expire.
+TIMEOUT = 60 * 60 * 24
+
+SUN_FILTERS = ["#full_sun", "#part_shade", "#full_shade"]
+MOISTURE_FILTERS = ["#moisture_dry", "#moisture_medium", "#moisture_wet"]
+PHYSICAL_ATTRIBUTES_FILTERS = ["#max_height", "#max_width"]
+LIFECYCLE_FILTERS = [
+    "#annual",
+    "#biennial",
+    "#perennial",
+    "#spring_ephemeral",
+    "#self_seeding",
+]
+BLOOM_PERIOD_FILTERS = ["#bloom_start", "#bloom_end"]
+SOIL_TOLERANCE_FILTERS = [
+    "#limestone_tolerant",
+    "#sand_tolerant",
+    "#acidic_soil_tolerant",
+]
+HARVESTING_START_FILTERS = [f"#harvesting_start_{month}" for month in range(4, 13)]
+SEED_SHARING_FILTERS = ["#seed_availability", "#accepting_seed"]
+GARDEN_SUITABILITY_FILTERS = [
+    "#rock_garden",
+    "#rain_garden",
+    "#shoreline_rehab",
+    "#container_suitable",
+    "#school_garden",
+    "#woodland_garden",
+    "#wetland_garden",
+    "#boulevard_garden_tolerant",
+    "#row_garden",
+]
+FUNCTIONAL_USE_FILTERS = ["#ground_cover", "#hedge", "#windbreak_edge"]
+GARDENING_EXPERIENCE_FILTERS = [
+    "#beginner_friendly",
+    "#does_not_spread",
+    "#transplantation_tolerant",
+    "#germinate_easy",
+    "#starter_pack_shade",
+    "#starter_pack_sun_dry",
+    "#starter_pack_sun_wet",
+]
+WILDLIFE_INTERACTION_FILTERS = [
+    "#hummingbird_friendly",
+    "#pollinator_garden",
+    "#bird_friendly",
+    "#deer_tolerant",
+    "#rabbit_tolerant",
+]
+ENVIRONMENTAL_STRESS_TOLERANCE_FILTERS = [
+    "#drought_tolerant",
+    "#salt_tolerant",
+    "#foot_traffic_tolerant",
+    "#juglone_tolerant",
+]
+ECOSYSTEM_SERVICES_FILTERS = [
+    "#bee_host",
+    "#butterfly_host",
+    "#nitrogen_fixer",
+    "#keystones_species",
+]
+CONSERVATION_STATUS_FILTERS = [
+    "#endangered",
+    "#grasp_candidate",
+    "#native_to_ottawa_region",
+]
+SAFETY_AND_COMPATIBILITY_FILTERS = [
+    "#septic_tank_safe",
+    "#cause_skin_rashes",
+    "#produces_burs",
+    "#exclude_toxic",
+]
+REGION_FILTERS = [
+    "#is_native_to_AB",
+    "#is_native_to_BC",
+    "#is_native_to_MB",
+    "#is_native_to_NB",
+    "#is_native_to_NL",
+    "#is_native_to_NS",
+    "#is_native_to_NT",
+    "#is_native_to_NU",
+    "#is_native_to_ON",
+    "#is_native_to_PE",
+    "#is_native_to_QC",
+    "#is_native_to_SK",
+    "#is_native_to_YT",
+    "#native_to_ottawa_region",
+]
+ADMIN_CONTROLS_FILTERS = [
+    "#is_draft",
+    "#is_not_active",
+    "#is_accepted",
+    "#has_notice",
+]
+
+
+def build_hx_include(growth_habits, bloom_colours, ecozones) -> str:
+    """Return the hx-include selector of every input of the filter sidebar."""
+    growth_habit_filters = [f"#growth_habit_{habit.id}" for habit in growth_habits]
+    growth_habit_filters.append("#growth_habit_reset")
+    bloom_colour_filters = [f"#bloom_colour_{color.id}" for color in bloom_colours]
+    ecozones_filters = [f"#ecozone_{ecozone.id}" for ecozone in ecozones]
+    return ",".join(
+        ["#any_plant_name"]
+        + ["#is_active"]
+        + SUN_FILTERS
+        + MOISTURE_FILTERS
+        + growth_habit_filters
+        + PHYSICAL_ATTRIBUTES_FILTERS
+        + LIFECYCLE_FILTERS
+        + BLOOM_PERIOD_FILTERS
+        + bloom_colour_filters
+        + SOIL_TOLERANCE_FILTERS
+        + HARVESTING_START_FILTERS
+        + ["#stratification_duration"]
+        + SEED_SHARING_FILTERS
+        + GARDEN_SUITABILITY_FILTERS
+        + FUNCTIONAL_USE_FILTERS
+        + GARDENING_EXPERIENCE_FILTERS
+        + WILDLIFE_INTERACTION_FILTERS
+        + ENVIRONMENTAL_STRESS_TOLERANCE_FILTERS
+        + ECOSYSTEM_SERVICES_FILTERS
+        + CONSERVATION_STATUS_FILTERS
+        + SAFETY_AND_COMPATIBILITY_FILTERS
+        + REGION_FILTERS
+        + ecozones_filters
+        + ADMIN_CONTROLS_FILTERS
+    )
+
+
+@dataclass
+class FilterSchema:
+    growth_habits: list
+    ecozones: list
+    bloom_colours: list
+    stratification_durations: list
+    hx_include: str
+
+    @classmethod
+    def build(cls) -> "FilterSchema":
+        growth_habits = list(models.GrowthHabit.objects.order_by("growth_habit"))
+        ecozones = list(models.Ecozone.objects.order_by("ecozone"))
+        bloom_colours = list(models.BloomColour.objects.order_by("bloom_colour"))
+        stratification_durations = list(
+            models.StratificationDuration.objects.order_by("stratification_duration")
+        )
+        return cls(
+            growth_habits=growth_habits,
+            ecozones=ecozones,
+            bloom_colours=bloom_colours,
+            stratification_durations=stratification_durations,
+            hx_include=build_hx_include(growth_habits, bloom_colours, ecozones),
+        )
+
+    @property
+    def growth_habit_ids(self) -> list[int]:
+        return [habit.id for habit in self.growth_habits]
+
+    @property
+    def ecozone_ids(self) -> list[int]:
+        return [ecozone.id for ecozone in self.ecozones]
+
+    @property
+    def bloom_colour_ids(self) -> list[int]:
+        return [colour.id for colour in self.bloom_colours]
+
+
+def get_filter_schema() -> FilterSchema:
+    """Return the filter schema of the current language, built when missing."""
+    if not cache_versions.is_shared():
+        return FilterSchema.build()
+    version = cache_versions.get_version(cache_versions.LOOKUPS)
+    key = f"{_KEY_PREFIX}:{version}:{translation.get_language()}"
+    schema = cache.get(key)
+    metrics.cache_lookup("filter-schema", schema is not None)
+    if schema is None:
+        schema = FilterSchema.build()
+        cache.set(key, schema, TIMEOUT)
+    return schema
@@ -1,9 +1,9 @@
-from unicodedata import normalize
-
 import django_filters
 from django.db.models import Q
+from django_filters.constants import EMPTY_VALUES
 
-from project import models, utils
+from project import bitmap_index, filter_schema, models, search_backends, utils
+from project.normalize import SEARCH_KEY_SEPARATOR, fold_text
 
 
 class PlantImageFilter(django_filters.FilterSet):
@@ -15,11 +15,11 @@ class PlantImageFilter(django_filters.FilterSet):
     )
 
     def filter_any_name(self, queryset, name, value):
-        return queryset.filter(
-            Q(plant_profile__latin_name__icontains=value)
-            | Q(plant_profile__english_name__icontains=value)
-            | Q(plant_profile__french_name__icontains=value)
-        )
+        # Full-text search on the names and obsolete names, not the narratives
+        if not search_backends.query_words(value):
+            return queryset
+        plant_ids = search_backends.search(value, names_only=True)
+        return queryset.filter(plant_profile_id__in=plant_ids)
 
     class Meta:
         model = models.PlantImage
@@ -278,12 +278,15 @@ class PlantProfileFilter(django_filters.FilterSet):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        # Build ecozone filters at runtime to avoid DB access during module import.
-        for ecozone in models.Ecozone.objects.all():
-            self.filters.setdefault(
-                f"ecozone_{ecozone.id}",
+        # Build ecozone filters at runtime to avoid DB access during module import,
+        # the ecozone ids come from the cached filter schema.
+        for ecozone_id in filter_schema.get_filter_schema().ecozone_ids:
+            ecozone_filter = self.filters.setdefault(
+                f"ecozone_{ecozone_id}",
                 django_filters.CharFilter(method="filter_ecozones"),
             )
+            # FilterSet.__init__ only binds the declared filters
+            ecozone_filter.parent = self
 
     # Admin Filters
     is_draft = django_filters.CharFilter(
@@ -312,6 +315,57 @@ class PlantProfileFilter(django_filters.FilterSet):
         method="filter_boolean",
     )
 
+    def filter_queryset(self, queryset):
+        # Answer the bitmap-indexed facets in memory when the index is enabled,
+        # the remaining filters still go through the database.
+        index = bitmap_index.get_index()
+        if index is None:
+            return super().filter_queryset(queryset)
+        bits = index.all_bits
+        for name, value in self.form.cleaned_data.items():
+            if value in EMPTY_VALUES:
+                continue
+            try:
+                facet_bits = self._bitmap_facet(index, name, value)
+            except (KeyError, ValueError):
+                facet_bits = None
+            if facet_bits is None:
+                queryset = self.filters[name].filter(queryset, value)
+            else:
+                bits &= facet_bits
+        if bits == index.all_bits:
+            return queryset
+        return queryset.filter(id__in=index.ids_for(bits))
+
+    def _bitmap_facet(self, index, name, value):
+        # Mirror of the filter_* methods below, None when the filter is not indexed
+        method = self.filters[name].method
+        if method in (
+            "filter_boolean",
+            "filter_seed_availability",
+            "filter_accepting_seed",
+        ):
+            return index.boolean(name)
+        if method == "filter_excludes":
+            return index.negate(index.boolean(name))
+        if method == "filter_starter_pack":
+            if value in (
+                "starter_pack_shade",
+                "starter_pack_sun_dry",
+                "starter_pack_sun_wet",
+            ):
+                return index.boolean(value)
+            return 0
+        if method == "filter_growth_habit":
+            return index.growth_habit(int(value))
+        if method == "filter_bloom_colour":
+            return index.bloom_colour(int(value))
+        if method == "filter_ecozones":
+            return index.ecozone(int(value))
+        if method == "filter_lifespan":
+            return index.lifespan(value)
+        return None
+
     def filter_ecozones(self, queryset, name, value):
         # check if a given plant is native to the ecozone specified in 'name'
         if value:
@@ -321,66 +375,23 @@ class PlantProfileFilter(django_filters.FilterSet):
             return queryset
 
     def filter_normalized_plant_name(self, queryset, name, value):
+        # search_name holds the accent-folded names maintained by PlantProfile.save()
         normalized_value = self._normalize_value(value)
-
-        all_plants = queryset.all()
-        matching_ids = []
-
-        # Filter manually to handle accents in all name fields
-        for plant in all_plants:
-            # Check french_name
-            if plant.french_name:
-                normalized_name = self._normalize_value(plant.french_name)
-                if normalized_value in normalized_name:
-                    matching_ids.append(plant.id)
-                    continue
-
-            # Check latin_name
-            if plant.latin_name:
-                normalized_name = self._normalize_value(plant.latin_name)
-                if normalized_value in normalized_name:
-                    matching_ids.append(plant.id)
-                    continue
-
-            # Check english_name
-            if plant.english_name:
-                normalized_name = self._normalize_value(plant.english_name)
-                if normalized_value in normalized_name:
-                    matching_ids.append(plant.id)
-                    continue
-
-        return queryset.filter(id__in=matching_ids)
+        return queryset.filter(search_name__contains=normalized_value)
 
     def filter_non_native_name(self, queryset, name, value):
+        # Join through the substitutes table on the folded non-native search_name
         normalized_value = self._normalize_value(value)
-
-        # Prefetch alternatives to avoid an extra DB query for each plant.
-        all_plants = queryset.prefetch_related("substitute_for_non_native").all()
-        matching_ids = []
-
-        for plant in all_plants:
-            for non_native in plant.substitute_for_non_native.all():
-                names_to_check = [
-                    non_native.latin_name,
-                    non_native.english_name,
-                    getattr(non_native, "english_name_en", ""),
-                    getattr(non_native, "english_name_fr", ""),
-                ]
-                if any(
-                    normalized_value in self._normalize_value(candidate)
-                    for candidate in names_to_check
-                    if candidate
-                ):
-                    matching_ids.append(plant.id)
-                    break
-
-        return queryset.filter(id__in=matching_ids)
+        substitutes = models.PlantProfile.substitute_for_non_native.through.objects
+        return queryset.filter(
+            id__in=substitutes.filter(
+                nonnativespecies__search_name__contains=normalized_value
+            ).values("plantprofile_id")
+        )
 
     @staticmethod
     def _normalize_value(value):
-        return (
-            normalize("NFKD", value).encode("ASCII", "ignore").decode("ASCII").lower()
-        )
+        return fold_text(value).replace(SEARCH_KEY_SEPARATOR, " ")
 
     def filter_any_name(self, queryset, name, value):
         return queryset.filter(
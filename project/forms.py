@@ -5,7 +5,7 @@ from django.forms import ModelForm
 from django.utils.dates import MONTHS
 from django.utils.translation import gettext_lazy as _
 
-from project import models
+from project import cache_versions, models
 
 
 class TextAreaField(forms.CharField):
@@ -134,11 +134,26 @@ class SearchPlantForm(forms.ModelForm):
 class AdminLibrarySettingForm(forms.ModelForm):
     class Meta:
         model = models.LibrarySetting
-        fields = ["is_shop_open", "is_accepting_seeds", "is_accepting_donations"]
+        fields = [
+            "is_shop_open",
+            "is_accepting_seeds",
+            "is_accepting_donations",
+            "shop_capacity",
+            "shop_idle_minutes",
+        ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    def clean_shop_capacity(self):
+        """Refuse a capacity the workers could not share, see project.admission."""
+        capacity = self.cleaned_data.get("shop_capacity")
+        if capacity and not cache_versions.is_shared():
+            raise ValidationError(
+                _("The shop capacity needs a shared cache, set CACHE_URL.")
+            )
+        return capacity
+
 
 class AdminOrderSeedApplicationForm(forms.ModelForm):
     class Meta:
@@ -1,8 +1,57 @@
 # a Middleware class to to check library settings on each request
 
-from django.db import models
+import threading
+import time
 
-from project.models import LibrarySetting, ShoppingCart
+from project import cache_versions, metrics, utils
+from project.models import LibrarySetting
+
+# Seconds a worker uses its copy of the library settings before comparing it with
+# the LIBRARY_SETTINGS version stamp, the longest a change takes to reach it.
+# Without a shared cache the stamps of the other processes are not seen, and the
+# copy is read again from the database after that time.
+CHECK_INTERVAL = 5
+
+_lock = threading.Lock()
+# (version stamp, LibrarySetting, time of the last version check)
+_local = None
+
+
+def get_library_settings():
+    """Return the library settings held by this worker, reloaded after a change.
+
+    The instance is shared by the requests of the worker and must not be modified,
+    edit a fresh copy from the database instead.
+    """
+    global _local
+    now = time.monotonic()
+    local = _local
+    if local is not None and now - local[2] < CHECK_INTERVAL:
+        metrics.cache_lookup("library-settings", True)
+        return local[1]
+    if cache_versions.is_shared():
+        version = cache_versions.get_version(cache_versions.LIBRARY_SETTINGS)
+        hit = local is not None and local[0] == version
+    else:
+        # openshop or another worker may have changed the row
+        version, hit = None, False
+    metrics.cache_lookup("library-settings", hit)
+    if hit:
+        _local = (version, local[1], now)
+        return local[1]
+    with _lock:
+        library_settings = LibrarySetting.objects.first()
+        if not library_settings:
+            library_settings = LibrarySetting.objects.create()
+        _local = (version, library_settings, now)
+    return library_settings
+
+
+def invalidate():
+    """Make every worker reload the library settings, this one right away."""
+    global _local
+    cache_versions.bump_version(cache_versions.LIBRARY_SETTINGS)
+    _local = None
 
 
 class LibrarySettingsMiddleware:
@@ -16,27 +65,9 @@ class LibrarySettingsMiddleware:
 
     def __call__(self, request):
         # Attach library settings to the request object
-        request.library_settings = self.get_library_settings()
+        request.library_settings = get_library_settings()
         customer_id = request.session.get("customer_id")
         if request.library_settings.is_shop_open and customer_id:
-            request.cart_item_count = self.get_cart_item_count(customer_id)
+            request.cart_item_count = utils.get_cart_count(request)
         response = self.get_response(request)
         return response
-
-    def get_cart_item_count(self, customer_id):
-        item_count = ShoppingCart.objects.filter(customer__id=customer_id).aggregate(
-            total_quantity=models.Sum("quantity")
-        )["total_quantity"]
-        if not item_count:
-            item_count = 0
-        return item_count
-
-    def get_library_settings(self):
-        # Fetch library settings from the database
-        try:
-            settings = LibrarySetting.objects.first()
-            if not settings:
-                settings = LibrarySetting.objects.create()
-            return settings
-        except LibrarySetting.DoesNotExist:
-            return LibrarySetting.objects.create()
@@ -0,0 +1,523 @@
+"""Load test of the seed shop opening, run with the loadtest_shop command.
+
+Simulated shoppers, in a thread pool, each create a customer profile, add seed
+packets to their cart and check out, as the subscribers do when the shop opens:
+
+    create-customer -> add-to-cart x adds -> checkout
+
+A shopper sent to the waiting room polls it until admitted, then goes on. With
+burst above 1, the adds of a shopper are sent that many at a time on the same
+session, as a customer clicking "Add" repeatedly, to race the cart limit.
+
+The requests go through the Django test client, in process, or to a running
+server given its base URL. The sessions are kept in cookies, so a server with
+DEBUG off, and secure cookies, must be reached over https.
+
+run() returns a LoadTestReport with the latency percentiles of each step, the
+throughput, the database lock errors and the order correctness issues, read back
+from the database: carts over the cart limit, accepted packets missing from the
+order, and leftover cart lines.
+
+The customers and orders are debug data, see create_dummy_orders, removed with
+delete_debug_orders --delete-debug-customers.
+"""
+
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.test import Client
+from django.urls import Resolver404, resolve, reverse
+from django.utils import translation
+
+from project import models
+from project.cart import MAX_NON_PRIORITY_CART_ITEMS
+from project.management.commands.create_dummy_orders import (
+    DEBUG_CUSTOMER_EMAIL_PREFIX,
+    DEBUG_ORDER_NOTE,
+    ensure_applications,
+    ensure_plants,
+    postal_code,
+)
+
+LOADTEST_EMAIL_PREFIX = f"{DEBUG_CUSTOMER_EMAIL_PREFIX}loadtest."
+STEPS = ("customer-form", "create-customer", "add-to-cart", "waiting-room", "checkout")
+PERCENTILES = (50, 95, 99)
+# Database errors raised when a lock is not granted, by backend
+LOCK_ERROR_MARKERS = (
+    "database is locked",
+    "database table is locked",
+    "deadlock detected",
+    "could not serialize access",
+    "could not obtain lock",
+    "lock wait timeout",
+)
+
+
+class ShopperError(Exception):
+    """A shopper could not go on, e.g. their checkout failed."""
+
+
+@dataclass(frozen=True)
+class Reply:
+    """Status and lower-cased headers of a response."""
+
+    status: int
+    headers: dict
+
+    @property
+    def redirect(self):
+        """Return the URL the response sends the browser to, or None."""
+        if "hx-redirect" in self.headers:
+            return self.headers["hx-redirect"]
+        if 300 <= self.status < 400:
+            return self.headers.get("location")
+        return None
+
+
+class ClientTransport:
+    """Send the requests through the Django test client, in this process."""
+
+    def __init__(self):
+        self.client = Client(HTTP_HOST="localhost")
+
+    def clone(self):
+        """Return a transport on the same session, for another thread."""
+        clone = ClientTransport()
+        clone.client.cookies.update(self.client.cookies)
+        return clone
+
+    def request(self, method, path, data=None, headers=None) -> Reply:
+        if method == "POST":
+            response = self.client.post(path, data or {}, headers=headers)
+        else:
+            response = self.client.get(path, headers=headers)
+        return Reply(
+            response.status_code,
+            {name.lower(): value for name, value in response.items()},
+        )
+
+
+class HttpTransport:
+    """Send the requests to a running server."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def clone(self):
+        clone = HttpTransport(self.base_url, self.timeout)
+        clone.session.cookies.update(self.session.cookies)
+        return clone
+
+    def request(self, method, path, data=None, headers=None) -> Reply:
+        headers = dict(headers or {})
+        url = self.base_url + path
+        if method == "POST":
+            headers["X-CSRFToken"] = self.session.cookies.get("csrftoken", "")
+            headers["Referer"] = url
+        response = self.session.request(
+            method,
+            url,
+            data=data,
+            headers=headers,
+            allow_redirects=False,
+            timeout=self.timeout,
+        )
+        return Reply(
+            response.status_code,
+            {name.lower(): value for name, value in response.headers.items()},
+        )
+
+
+@dataclass(frozen=True)
+class Shopper:
+    """What a simulated shopper orders."""
+
+    index: int
+    email: str
+    application_id: int
+    province: str
+    # (add-to-cart path, plant id, quantity) of each add
+    adds: tuple
+
+
+@dataclass
+class ShopperResult:
+    shopper: Shopper
+    # (step, seconds) of each request
+    timings: list = field(default_factory=list)
+    # plant id: packets the shop accepted
+    accepted: Counter = field(default_factory=Counter)
+    refused: int = 0
+    lock_errors: int = 0
+    errors: list = field(default_factory=list)
+    order_id: int | None = None
+
+
+@dataclass(frozen=True)
+class StepStats:
+    step: str
+    count: int
+    # milliseconds, by percentile
+    percentiles: dict
+    max: float
+
+
+@dataclass
+class LoadTestReport:
+    shoppers: int
+    workers: int
+    seconds: float
+    requests: int
+    orders: int
+    refused: int
+    lock_errors: int
+    steps: list
+    errors: list
+    issues: list
+
+    @property
+    def throughput(self) -> float:
+        """Return the requests served per second."""
+        return self.requests / self.seconds if self.seconds else 0.0
+
+    @property
+    def orders_per_second(self) -> float:
+        return self.orders / self.seconds if self.seconds else 0.0
+
+    @property
+    def ok(self) -> bool:
+        """Tell whether the run had no lock error, error or correctness issue."""
+        return not (self.lock_errors or self.errors or self.issues)
+
+
+def percentile(values, rank) -> float:
+    """Return the nearest-rank percentile of values, 0 without values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+def is_lock_error(error) -> bool:
+    message = str(error).lower()
+    return any(marker in message for marker in LOCK_ERROR_MARKERS)
+
+
+def _path(url) -> str:
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+def _match(url):
+    """Return the ResolverMatch of url, None for no URL or an unknown one."""
+    if not url:
+        return None
+    path = urlsplit(url).path
+    # The i18n patterns only resolve the prefix of the active language
+    language = translation.get_language_from_path(path) or settings.LANGUAGES[0][0]
+    try:
+        with translation.override(language):
+            return resolve(path)
+    except Resolver404:
+        return None
+
+
+def _reverse(url_name, *args) -> str:
+    # Outside a request the active language is LANGUAGE_CODE, which the i18n
+    # patterns do not serve
+    with translation.override(settings.LANGUAGES[0][0]):
+        return reverse(url_name, args=args)
+
+
+def prepare(count, adds, seed=42) -> list:
+    """Return count shoppers making adds add-to-cart requests each.
+
+    The seed applications and plants are those of create_dummy_orders.
+    """
+    rng = random.Random(seed)
+    applications = ensure_applications()
+    plant_ids = list(
+        models.PlantProfile.objects.filter(
+            pk__in=[plant.pk for plant in ensure_plants(rng)]
+        ).values_list("pk", flat=True)
+    )
+    if not plant_ids:
+        raise ShopperError("No active plant profile to add to the carts.")
+    paths = {pk: _reverse("add-to-cart", pk) for pk in plant_ids}
+    run = uuid.uuid4().hex[:8]
+    shoppers = []
+    for index in range(count):
+        shopper_adds = []
+        for _ in range(adds):
+            pk = rng.choice(plant_ids)
+            shopper_adds.append((paths[pk], pk, rng.randint(1, 3)))
+        shoppers.append(
+            Shopper(
+                index=index,
+                email=f"{LOADTEST_EMAIL_PREFIX}{run}.{index + 1}@example.org",
+                application_id=rng.choice(applications).pk,
+                province="Ontario" if index % 2 == 0 else "Quebec",
+                adds=tuple(shopper_adds),
+            )
+        )
+    return shoppers
+
+
+class ShopperRun:
+    """Drive one shopper through the shop, recording each request."""
+
+    def __init__(self, shopper, transport, burst=1, poll=1.0, wait_timeout=120):
+        self.shopper = shopper
+        self.transport = transport
+        self.burst = burst
+        self.poll = poll
+        self.wait_timeout = wait_timeout
+        self.result = ShopperResult(shopper)
+        self._lock = threading.Lock()
+        self.paths = {
+            "create-customer": _reverse("create-customer"),
+            "checkout": _reverse("checkout"),
+        }
+
+    def __call__(self) -> ShopperResult:
+        try:
+            self.create_customer()
+            if self.burst > 1:
+                with ThreadPoolExecutor(self.burst) as pool:
+                    list(pool.map(self._add_on_clone, self.shopper.adds))
+            else:
+                for add in self.shopper.adds:
+                    self.add_to_cart(self.transport, *add)
+            if self.result.accepted:
+                self.checkout()
+        except ShopperError as e:
+            self.result.errors.append(f"{self.shopper.email}: {e}")
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                connections.close_all()
+        return self.result
+
+    def send(self, transport, step, method, path, data=None, headers=None):
+        """Send a request, return its Reply or None after a server error."""
+        start = time.perf_counter()
+        try:
+            reply = transport.request(method, path, data, headers)
+        except (DatabaseError, requests.RequestException) as e:
+            reply = None
+            error = e
+        else:
+            error = f"HTTP {reply.status}" if reply.status >= 500 else None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.result.timings.append((step, elapsed))
+            if error is not None:
+                if is_lock_error(error):
+                    self.result.lock_errors += 1
+                else:
+                    self.result.errors.append(f"{self.shopper.email} {step}: {error}")
+        return None if error is not None else reply
+
+    def create_customer(self):
+        path = self.paths["create-customer"]
+        shopper = self.shopper
+        # Sets the CSRF cookie of a server
+        self.send(self.transport, "customer-form", "GET", path)
+        rng = random.Random(shopper.index)
+        data = {
+            "first_name": "Load",
+            "last_name": f"Test {shopper.index + 1}",
+            "email": shopper.email,
+            "application": shopper.application_id,
+            "address": f"{100 + shopper.index} Load Test Avenue",
+            "city": "Ottawa" if shopper.province == "Ontario" else "Gatineau",
+            "province": shopper.province,
+            "postal_code": postal_code(rng, shopper.province),
+        }
+        reply = self.send(self.transport, "create-customer", "POST", path, data)
+        if reply is None or reply.status != 302:
+            raise ShopperError("the customer profile was not created")
+        match = _match(reply.redirect)
+        if match is None or match.url_name != "shopping-cart":
+            raise ShopperError(f"create-customer redirected to {reply.redirect}")
+
+    def _add_on_clone(self, add):
+        transport = self.transport.clone()
+        try:
+            self.add_to_cart(transport, *add)
+        finally:
+            connections.close_all()
+
+    def add_to_cart(self, transport, path, plant_id, quantity):
+        reply = self.admitted(
+            transport,
+            "add-to-cart",
+            "POST",
+            path,
+            {"quantity": quantity},
+            {"HX-Request": "true"},
+        )
+        if reply is None:
+            return
+        with self._lock:
+            if reply.redirect is not None:
+                self.result.errors.append(
+                    f"{self.shopper.email} add-to-cart: redirected to {reply.redirect}"
+                )
+            elif "hx-retarget" in reply.headers:
+                # Refused by the cart limit
+                self.result.refused += 1
+            else:
+                self.result.accepted[plant_id] += quantity
+
+    def checkout(self):
+        data = {"donation_amount": "0", "customer_note": DEBUG_ORDER_NOTE}
+        reply = self.admitted(
+            self.transport, "checkout", "POST", self.paths["checkout"], data
+        )
+        if reply is None:
+            raise ShopperError("the checkout failed")
+        match = _match(reply.redirect)
+        if match is None or match.url_name != "order-confirmation":
+            raise ShopperError(f"checkout answered {reply.status} {reply.redirect}")
+        self.result.order_id = int(match.kwargs["pk"])
+
+    def admitted(self, transport, step, method, path, data=None, headers=None):
+        """Send a request, after waiting in the waiting room when sent there."""
+        deadline = time.monotonic() + self.wait_timeout
+        reply = self.send(transport, step, method, path, data, headers)
+        while reply is not None and self._waiting(reply):
+            wait_path = _path(reply.redirect)
+            # Poll the waiting room until it sends the shopper back
+            while True:
+                if time.monotonic() > deadline:
+                    raise ShopperError(f"still waiting after {self.wait_timeout}s")
+                time.sleep(self.poll)
+                position = self.send(
+                    transport,
+                    "waiting-room",
+                    "GET",
+                    wait_path,
+                    headers={"HX-Request": "true"},
+                )
+                if position is None:
+                    return None
+                if position.redirect:
+                    break
+            reply = self.send(transport, step, method, path, data, headers)
+        return reply
+
+    @staticmethod
+    def _waiting(reply) -> bool:
+        match = _match(reply.redirect)
+        return match is not None and match.url_name == "shop-waiting-room"
+
+
+def check_orders(results) -> list:
+    """Return the correctness issues of the orders and carts of the shoppers."""
+    issues = []
+    emails = [result.shopper.email for result in results]
+    orders = {
+        order.pk: order
+        for order in models.Order.objects.filter(
+            customer__email__in=emails
+        ).select_related("customer__application")
+    }
+    items = {}
+    for order_id, plant_id, quantity in models.OrderItem.objects.filter(
+        order_id__in=orders
+    ).values_list("order_id", "plant_profile_id", "quantity"):
+        items.setdefault(order_id, Counter())[plant_id] += quantity
+    leftovers = Counter(
+        models.ShoppingCart.objects.filter(customer__email__in=emails).values_list(
+            "customer__email", flat=True
+        )
+    )
+
+    for result in results:
+        email = result.shopper.email
+        if result.order_id is None:
+            if result.accepted and not result.errors:
+                issues.append(f"{email}: no order for accepted packets")
+            continue
+        order = orders.get(result.order_id)
+        if order is None or order.customer.email != email:
+            issues.append(f"{email}: order #{result.order_id} not found")
+            continue
+        ordered = items.get(order.pk, Counter())
+        lost = result.accepted - ordered
+        if lost:
+            issues.append(f"{email}: {sum(lost.values())} packet(s) lost")
+        extra = ordered - result.accepted
+        if extra:
+            issues.append(f"{email}: {sum(extra.values())} packet(s) never accepted")
+        total = sum(ordered.values())
+        if order.seed_quantity != total:
+            issues.append(
+                f"{email}: order #{order.pk} stores {order.seed_quantity} packets, "
+                f"has {total}"
+            )
+        if order.customer.application.priority != 1 and (
+            total > MAX_NON_PRIORITY_CART_ITEMS
+        ):
+            issues.append(f"{email}: order #{order.pk} over the cart limit ({total})")
+        if leftovers[email]:
+            issues.append(f"{email}: {leftovers[email]} cart line(s) left")
+    return issues
+
+
+def run(shoppers, transport_factory, workers=10, burst=1, poll=1.0, wait_timeout=120):
+    """Drive shoppers through the shop with workers threads, return the report.
+
+    transport_factory() returns the transport of a new shopper. One worker runs
+    the shoppers in this thread, e.g. inside a test transaction.
+    """
+
+    def drive(shopper):
+        return ShopperRun(shopper, transport_factory(), burst, poll, wait_timeout)()
+
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(drive, shoppers))
+    else:
+        results = [drive(shopper) for shopper in shoppers]
+    seconds = time.perf_counter() - start
+
+    durations = {step: [] for step in STEPS}
+    for result in results:
+        for step, elapsed in result.timings:
+            durations[step].append(elapsed * 1000)
+    steps = [
+        StepStats(
+            step,
+            len(values),
+            {rank: percentile(values, rank) for rank in PERCENTILES},
+            max(values),
+        )
+        for step, values in durations.items()
+        if values
+    ]
+    return LoadTestReport(
+        shoppers=len(shoppers),
+        workers=workers,
+        seconds=seconds,
+        requests=sum(len(result.timings) for result in results),
+        orders=sum(result.order_id is not None for result in results),
+        refused=sum(result.refused for result in results),
+        lock_errors=sum(result.lock_errors for result in results),
+        steps=steps,
+        errors=[error for result in results for error in result.errors],
+        issues=check_orders(results),
+    )
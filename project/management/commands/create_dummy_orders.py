@@ -6,12 +6,64 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 
-from project import models
+from project import models, order_statistics
 
 DEBUG_CUSTOMER_EMAIL_PREFIX = "debug.customer."
 DEBUG_ORDER_NOTE = "Generated for development/debugging."
 
 
+def ensure_applications():
+    """Return the seed applications of the debug customers, created if missing."""
+    defaults = [
+        ("Home garden", 3),
+        ("School project", 2),
+        ("Community restoration", 1),
+        ("Pollinator habitat", 2),
+    ]
+    apps = []
+    for name, priority in defaults:
+        app, _ = models.OrderSeedApplication.objects.get_or_create(
+            seed_application=name,
+            defaults={"priority": priority},
+        )
+        apps.append(app)
+    return apps
+
+
+def ensure_plants(rng):
+    """Return at least 10 plant profiles to order, debug plants added if needed."""
+    plants = list(models.PlantProfile.all_objects.order_by("pk")[:30])
+    if len(plants) >= 10:
+        return plants
+
+    # Ensure enough plants exist so order items can vary in debugging scenarios.
+    missing = 10 - len(plants)
+    for i in range(missing):
+        latin_name = f"Debugplant {rng.randint(1000, 9999)} {i}"
+        plant = models.PlantProfile.all_objects.create(
+            latin_name=latin_name,
+            english_name=f"Debug Plant {i}",
+            french_name=f"Plante test {i}",
+            is_active=True,
+            is_accepted=True,
+            is_draft=False,
+        )
+        plants.append(plant)
+    return plants
+
+
+def postal_code(rng, province):
+    letters = "ABCEGHJKLMNPRSTVXY"
+    if province == "Quebec":
+        first = "G"
+    else:
+        first = "K"
+    return (
+        f"{first}{rng.choice(letters)}{rng.randint(0, 9)} "
+        f"{rng.randint(0, 9)}{rng.choice(letters)}{rng.randint(0, 9)}"
+    )
+
+
 class Command(BaseCommand):
     help = "Create dummy customer orders for development and debugging."
 
@@ -79,8 +131,8 @@ class Command(BaseCommand):
             models.Order.objects.all().delete()
             models.Customer.objects.all().delete()
 
-        applications = self._ensure_applications()
-        plants = self._ensure_plants(rng)
+        applications = ensure_applications()
+        plants = ensure_plants(rng)
 
         first_names = [
             "Alex",
@@ -127,7 +179,7 @@ class Command(BaseCommand):
                 address=f"{100 + idx} Debug Avenue",
                 city=city,
                 province=province,
-                postal_code=self._postal_code(rng, province),
+                postal_code=postal_code(rng, province),
                 application=rng.choice(applications),
             )
 
@@ -139,20 +191,27 @@ class Command(BaseCommand):
             )
 
             order_dt = self._random_datetime_for_year_range(rng, from_year, to_year)
+            item_count = rng.randint(1, min(4, len(plants)))
+            items = [
+                models.OrderItem(
+                    order=order, plant_profile=plant, quantity=rng.randint(1, 5)
+                )
+                for plant in rng.sample(plants, item_count)
+            ]
+            models.OrderItem.objects.bulk_create(items)
+            order_statistics.items_added(items)
+            placed = order_statistics.order_facts(order)
             models.Order.objects.filter(pk=order.pk).update(
                 order_date=order_dt,
                 created=order_dt,
                 modified=order_dt,
+                item_count=item_count,
+                seed_quantity=sum(item.quantity for item in items),
             )
-
-            item_count = rng.randint(1, min(4, len(plants)))
-            for plant in rng.sample(plants, item_count):
-                models.OrderItem.objects.create(
-                    order=order,
-                    plant_profile=plant,
-                    quantity=rng.randint(1, 5),
-                )
-                created_items += 1
+            # Counted in the year the order is backdated to
+            order.order_date = order_dt
+            order_statistics.record_order(placed, order_statistics.order_facts(order))
+            created_items += item_count
 
             created_orders += 1
 
@@ -167,53 +226,6 @@ class Command(BaseCommand):
             )
         )
 
-    def _ensure_applications(self):
-        defaults = [
-            ("Home garden", 3),
-            ("School project", 2),
-            ("Community restoration", 1),
-            ("Pollinator habitat", 2),
-        ]
-        apps = []
-        for name, priority in defaults:
-            app, _ = models.OrderSeedApplication.objects.get_or_create(
-                seed_application=name,
-                defaults={"priority": priority},
-            )
-            apps.append(app)
-        return apps
-
-    def _ensure_plants(self, rng):
-        plants = list(models.PlantProfile.all_objects.order_by("pk")[:30])
-        if len(plants) >= 10:
-            return plants
-
-        # Ensure enough plants exist so order items can vary in debugging scenarios.
-        missing = 10 - len(plants)
-        for i in range(missing):
-            latin_name = f"Debugplant {rng.randint(1000, 9999)} {i}"
-            plant = models.PlantProfile.all_objects.create(
-                latin_name=latin_name,
-                english_name=f"Debug Plant {i}",
-                french_name=f"Plante test {i}",
-                is_active=True,
-                is_accepted=True,
-                is_draft=False,
-            )
-            plants.append(plant)
-        return plants
-
-    def _postal_code(self, rng, province):
-        letters = "ABCEGHJKLMNPRSTVXY"
-        if province == "Quebec":
-            first = "G"
-        else:
-            first = "K"
-        return (
-            f"{first}{rng.choice(letters)}{rng.randint(0, 9)} "
-            f"{rng.randint(0, 9)}{rng.choice(letters)}{rng.randint(0, 9)}"
-        )
-
     def _random_datetime_for_year_range(self, rng, from_year, to_year):
         year = rng.randint(from_year, to_year)
         start = datetime(year, 1, 1, 8, 0, 0)
@@ -19,7 +19,8 @@ from django.core.exceptions import ValidationError
 from django.core.management.base import BaseCommand
 from django.db import models
 
-from project.models import PlantProfile
+from project import cache_versions, profile_fragments
+from project.models import PlantCard, PlantProfile, PlantSearchDocument
 
 
 class Command(BaseCommand):
@@ -137,6 +138,16 @@ class Command(BaseCommand):
                     "FloatField": None,
                 }.get(field_type, None)
                 PlantProfile.objects.all().update(**{property_name: reset_value})
+                cache_versions.bump_version_on_commit(cache_versions.CATALOGUE)
+                profile_fragments.evict_on_commit(
+                    PlantProfile.objects.values_list("id", flat=True)
+                )
+                if property_name in PlantCard.PLANT_FIELDS:
+                    PlantCard.rebuild()
+                if property_name in PlantProfile.SEARCH_NAME_FIELDS:
+                    # update() bypasses save(), refresh the folded search names
+                    PlantProfile.rebuild_search_names()
+                    PlantSearchDocument.rebuild()
 
             not_found = []
             updated = 0
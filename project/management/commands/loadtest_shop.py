@@ -0,0 +1,148 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from project import loadtest
+from project.models import LibrarySetting
+
+# Errors and issues listed in full, the rest are counted
+MAX_LISTED = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the shop opening: simulated shoppers create a customer, add to "
+        "their cart and check out concurrently. Reports the latency percentiles, "
+        "throughput, database lock errors and order correctness."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--shoppers",
+            type=int,
+            default=50,
+            help="Number of simulated shoppers (default: 50).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=10,
+            help="Shoppers served at once, in threads (default: 10).",
+        )
+        parser.add_argument(
+            "--adds",
+            type=int,
+            default=8,
+            help="Add-to-cart requests of each shopper, of 1 to 3 packets (default: 8).",
+        )
+        parser.add_argument(
+            "--burst",
+            type=int,
+            default=1,
+            help="Add-to-cart requests a shopper sends at once (default: 1).",
+        )
+        parser.add_argument(
+            "--url",
+            help=(
+                "Base URL of a running server, e.g. http://127.0.0.1:8000. "
+                "Default: the Django test client, in this process."
+            ),
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed of the carts (default: 42).",
+        )
+        parser.add_argument(
+            "--poll",
+            type=float,
+            default=1.0,
+            help="Seconds between two waiting room polls (default: 1).",
+        )
+        parser.add_argument(
+            "--wait-timeout",
+            type=float,
+            default=120,
+            help="Seconds a shopper waits to be admitted (default: 120).",
+        )
+        parser.add_argument(
+            "--fail-on-issues",
+            action="store_true",
+            help="Raise an error on lock errors, errors or correctness issues.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            raise CommandError("This command is only available when DEBUG=True.")
+        for name in ("shoppers", "workers", "adds", "burst"):
+            if options[name] <= 0:
+                raise CommandError(f"--{name} must be greater than 0")
+
+        library_settings = LibrarySetting.objects.first()
+        if library_settings is None or not library_settings.is_shop_open:
+            raise CommandError("The shop is closed, run openshop first.")
+        if not library_settings.is_accepting_donations:
+            raise CommandError("Checkout needs the shop to accept donations.")
+
+        url = options["url"]
+        if url:
+            transport_factory = partial(loadtest.HttpTransport, url)
+        else:
+            transport_factory = loadtest.ClientTransport
+
+        try:
+            shoppers = loadtest.prepare(
+                options["shoppers"], options["adds"], options["seed"]
+            )
+        except loadtest.ShopperError as e:
+            raise CommandError(str(e)) from e
+
+        self.stdout.write(
+            f"Running {len(shoppers)} shoppers on {options['workers']} workers "
+            f"against {url or 'the test client'}..."
+        )
+        report = loadtest.run(
+            shoppers,
+            transport_factory,
+            workers=options["workers"],
+            burst=options["burst"],
+            poll=options["poll"],
+            wait_timeout=options["wait_timeout"],
+        )
+        self.write_report(report)
+
+        summary = (
+            f"Load test completed. {report.lock_errors} lock error(s), "
+            f"{len(report.errors)} error(s), {len(report.issues)} issue(s)."
+        )
+        if not report.ok and options["fail_on_issues"]:
+            raise CommandError(summary)
+        style = self.style.SUCCESS if report.ok else self.style.WARNING
+        self.stdout.write(style(summary))
+
+    def write_report(self, report):
+        ranks = "".join(f"{f'p{rank}':>9}" for rank in loadtest.PERCENTILES)
+        self.stdout.write(f"{'step':<16}{'requests':>9}{ranks}{'max':>9}  (ms)")
+        for stats in report.steps:
+            values = "".join(
+                f"{stats.percentiles[rank]:>9.1f}" for rank in loadtest.PERCENTILES
+            )
+            self.stdout.write(
+                f"{stats.step:<16}{stats.count:>9}{values}{stats.max:>9.1f}"
+            )
+        self.stdout.write(
+            f"{report.requests} requests in {report.seconds:.2f}s: "
+            f"{report.throughput:.1f} requests/s, "
+            f"{report.orders} orders ({report.orders_per_second:.1f}/s), "
+            f"{report.refused} add(s) refused by the cart limit."
+        )
+        for title, lines in (("Errors", report.errors), ("Issues", report.issues)):
+            if not lines:
+                continue
+            self.stdout.write(self.style.WARNING(f"{title}:"))
+            for line in lines[:MAX_LISTED]:
+                self.stdout.write(self.style.WARNING(f"  - {line}"))
+            if len(lines) > MAX_LISTED:
+                self.stdout.write(f"  ... and {len(lines) - MAX_LISTED} more.")
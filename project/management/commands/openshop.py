@@ -2,6 +2,7 @@
 
 from django.core.management.base import BaseCommand
 
+from project import admission, cache_versions
 from project.models import LibrarySetting
 
 
@@ -12,7 +13,9 @@ class Command(BaseCommand):
     so customers can place items in the cart. Behavior:
     - Retrieves or creates the LibrarySetting for the "is_shop_open" key.
     - If the setting already indicates the shop is open, writes a warning and exits without making changes.
-    - Otherwise sets is_shop_open to True, saves the setting, and writes a success message.
+    - Otherwise sets is_shop_open to True, saves the setting, empties the waiting room
+      queue of an earlier opening, and writes a success message.
+    - Warns when the shop capacity is set without a shared cache to apply it.
 
     Side effects:
     - May create a LibrarySetting record.
@@ -32,4 +35,12 @@ class Command(BaseCommand):
             return
         setting.is_shop_open = True
         setting.save()
+        admission.reset()
+        if setting.shop_capacity and not cache_versions.is_shared():
+            self.stdout.write(
+                self.style.WARNING(
+                    "The shop capacity is not applied without a shared cache, "
+                    "set CACHE_URL."
+                )
+            )
         self.stdout.write(self.style.SUCCESS("Shop has been opened successfully."))
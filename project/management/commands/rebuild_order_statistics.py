@@ -0,0 +1,34 @@
+# Rebuild the order statistics rollups read by the admin statistics pages.
+# Usage: python manage.py rebuild_order_statistics
+# Run it to backfill the rollups, after changing orders with tools that bypass
+# the model save() and delete() methods, or after an "Order statistics not
+# updated" error in the logs. Close the shop first (python manage.py closeshop)
+# and run it when no order is being edited, the orders committed during the
+# rebuild may otherwise be counted twice. Open the shop again afterwards.
+
+from django.core.management.base import BaseCommand
+
+from project import order_statistics
+
+
+class Command(BaseCommand):
+    """Management command to rebuild the order statistics rollups.
+
+    The rollups by year and status, by customer location and by plant profile are
+    normally updated as orders are placed, edited or deleted. This command recounts
+    them from every order and order item.
+
+    Usage:
+        python manage.py rebuild_order_statistics
+    """
+
+    help = "Rebuild the order statistics rollups read by the admin statistics pages"
+
+    def handle(self, *args, **options):
+        years, locations, plants = order_statistics.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Order statistics rebuilt: {years} year/status rows, "
+                f"{locations} location rows, {plants} plant rows"
+            )
+        )
@@ -0,0 +1,36 @@
+# Rebuild the stored search keys used by the plant catalogue search.
+# Usage: python manage.py rebuild_search_index
+# Run it after importing data with tools that bypass the model save() methods.
+
+from django.core.management.base import BaseCommand
+
+from project.models import NonNativeSpecies, PlantProfile, PlantSearchDocument
+
+
+class Command(BaseCommand):
+    """Management command to rebuild the plant search keys.
+
+    The accent-folded search keys are normally maintained when a plant profile or a
+    non-native species is saved. This command recomputes them for every plant profile,
+    active or not, and every non-native species, and only writes the rows whose key is stale.
+    It then recreates the full-text search documents of every plant profile.
+
+    Usage:
+        python manage.py rebuild_search_index
+    """
+
+    help = "Rebuild the accent-folded search keys used by the plant catalogue search"
+
+    def handle(self, *args, **options):
+        updated = PlantProfile.rebuild_search_names()
+        self.stdout.write(
+            self.style.SUCCESS(f"Plant profile search names updated: {updated}")
+        )
+        updated = NonNativeSpecies.rebuild_search_names()
+        self.stdout.write(
+            self.style.SUCCESS(f"Non-native species search names updated: {updated}")
+        )
+        indexed = PlantSearchDocument.rebuild()
+        self.stdout.write(
+            self.style.SUCCESS(f"Plant full-text search documents rebuilt: {indexed}")
+        )
@@ -0,0 +1,48 @@
+# Pre-render the public catalogue pages to static files.
+# Usage: python manage.py render_public_site [--plant ID ...] [--no-listings]
+# The files are written under settings.PUBLIC_SITE_ROOT, one per page and language.
+
+from django.core.management.base import BaseCommand
+
+from project import public_site
+
+
+class Command(BaseCommand):
+    """Management command to pre-render the public catalogue pages.
+
+    Every public plant profile page and the catalogue listing pages are rendered as
+    an anonymous visitor in each language, and written under PUBLIC_SITE_ROOT for the
+    web server to serve. The pages of inactive plant profiles are removed.
+
+    With --plant, only the profile pages of the given plants are rendered, along
+    with the listing pages unless --no-listings is given.
+
+    Usage:
+        python manage.py render_public_site
+        python manage.py render_public_site --plant 12 --plant 40
+    """
+
+    help = "Pre-render the public catalogue pages to static files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--plant",
+            action="append",
+            type=int,
+            dest="plant_ids",
+            help="Id of a plant profile to render again, may be repeated.",
+        )
+        parser.add_argument(
+            "--no-listings",
+            action="store_false",
+            dest="listings",
+            help="Do not render the catalogue listing pages.",
+        )
+
+    def handle(self, *args, **options):
+        written, removed = public_site.render_pages(
+            options["plant_ids"], listings=options["listings"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"Public pages written: {written}, removed: {removed}")
+        )
@@ -0,0 +1,261 @@
+"""Runtime metrics in the Prometheus text format.
+
+Every gunicorn worker and Celery worker process counts in memory:
+
+- the requests per URL name, method and status, their latency and SQL queries,
+  recorded by MetricsMiddleware,
+- the hits and misses of the application caches, reported with cache_lookup(),
+- the duration and final state of the Celery tasks, SUCCESS, FAILURE or RETRY,
+  from the Celery task signals.
+
+Each process writes its counts to its own file in settings.METRICS_DIR, at most
+every FLUSH_INTERVAL seconds, and the /metrics/ view adds up the files of every
+process, so the numbers cover all the workers without an external service. The
+files of stopped processes are kept, their counts stay in the totals; empty the
+directory when the application starts.
+
+Nothing is counted unless settings.METRICS_ENABLED is set. The /metrics/ view
+only answers the clients sending "Authorization: Bearer <METRICS_TOKEN>", it is
+not found without a token, also from the loopback of a reverse proxy.
+"""
+
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from celery.signals import task_postrun, task_prerun
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+
+from project import query_budget
+
+PREFIX = "seedlibrary"
+FLUSH_INTERVAL = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TASK_BUCKETS = (0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# name: (type, help)
+METRICS = {
+    "http_requests_total": ("counter", "HTTP requests by URL name and status."),
+    "http_request_duration_seconds": ("histogram", "HTTP request latency."),
+    "http_db_queries_total": ("counter", "SQL queries run by the HTTP requests."),
+    "cache_requests_total": ("counter", "Application cache lookups by result."),
+    "celery_tasks_total": ("counter", "Celery tasks run by final state."),
+    "celery_task_duration_seconds": ("histogram", "Celery task run time."),
+}
+
+_lock = threading.Lock()
+# (name, labels) -> value
+_counters = defaultdict(float)
+# (name, labels) -> [bucket counts..., sum, count]
+_histograms = {}
+_buckets = {
+    "http_request_duration_seconds": LATENCY_BUCKETS,
+    "celery_task_duration_seconds": TASK_BUCKETS,
+}
+_last_flush = 0.0
+_task_starts = {}
+
+
+def enabled() -> bool:
+    return getattr(settings, "METRICS_ENABLED", False)
+
+
+def _labels(labels: dict) -> tuple:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, labels, amount=1):
+    """Add amount to the counter name with labels."""
+    if not enabled():
+        return
+    with _lock:
+        _counters[(name, _labels(labels))] += amount
+
+
+def observe(name, labels, value):
+    """Record value in the histogram name with labels."""
+    if not enabled():
+        return
+    buckets = _buckets[name]
+    with _lock:
+        key = (name, _labels(labels))
+        histogram = _histograms.setdefault(key, [0] * (len(buckets) + 2))
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram[i] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+def cache_lookup(cache_name, hit):
+    """Count a lookup of an application cache."""
+    inc(
+        "cache_requests_total",
+        {"cache": cache_name, "result": "hit" if hit else "miss"},
+    )
+
+
+def _directory() -> Path:
+    return Path(settings.METRICS_DIR)
+
+
+def flush(force=False):
+    """Write the counts of this process, at most every FLUSH_INTERVAL seconds."""
+    global _last_flush
+    now = time.monotonic()
+    if not enabled() or (not force and now - _last_flush < FLUSH_INTERVAL):
+        return
+    with _lock:
+        _last_flush = now
+        data = {
+            "counters": [
+                [name, labels, value] for (name, labels), value in _counters.items()
+            ],
+            "histograms": [
+                [name, labels, values] for (name, labels), values in _histograms.items()
+            ],
+        }
+    directory = _directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    descriptor, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(descriptor, "w") as tmp_file:
+        json.dump(data, tmp_file)
+    os.replace(tmp_name, directory / f"{os.getpid()}.json")
+
+
+def collect() -> tuple[dict, dict]:
+    """Return the counters and histograms added up over every process file."""
+    counters = defaultdict(float)
+    histograms = {}
+    for path in _directory().glob("*.json"):
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            # Being replaced, or removed since listed
+            continue
+        for name, labels, value in data["counters"]:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, values in data["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return counters, histograms
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render() -> str:
+    """Return every metric in the Prometheus text exposition format."""
+    counters, histograms = collect()
+    lines = []
+    for name, (metric_type, help_text) in METRICS.items():
+        full_name = f"{PREFIX}_{name}"
+        lines += [
+            f"# HELP {full_name} {help_text}",
+            f"# TYPE {full_name} {metric_type}",
+        ]
+        if metric_type == "counter":
+            for (sample_name, labels), value in sorted(counters.items()):
+                if sample_name == name:
+                    lines.append(
+                        f"{full_name}{_format_labels(labels)} {_format_value(value)}"
+                    )
+            continue
+        buckets = _buckets[name]
+        for (sample_name, labels), values in sorted(histograms.items()):
+            if sample_name != name:
+                continue
+            for bound, count in zip(buckets, values):
+                bucket_labels = labels + (("le", repr(bound)),)
+                lines.append(
+                    f"{full_name}_bucket{_format_labels(bucket_labels)} {count}"
+                )
+            lines.append(
+                f"{full_name}_bucket{_format_labels(labels + (('le', '+Inf'),))} "
+                f"{values[-1]}"
+            )
+            lines.append(
+                f"{full_name}_sum{_format_labels(labels)} {_format_value(values[-2])}"
+            )
+            lines.append(f"{full_name}_count{_format_labels(labels)} {values[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+def _allowed(request) -> bool:
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if not token:
+        return False
+    authorization = request.headers.get("Authorization", "")
+    return hmac.compare_digest(authorization.encode(), f"Bearer {token}".encode())
+
+
+def metrics_view(request):
+    """Serve the metrics of every process, to the token holding clients."""
+    if not enabled() or not _allowed(request):
+        raise Http404
+    flush(force=True)
+    return HttpResponse(render(), content_type="text/plain; version=0.0.4")
+
+
+class MetricsMiddleware:
+    """Middleware counting the requests, their latency and SQL queries."""
+
+    def __init__(self, get_response):
+        if not enabled():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with query_budget.record() as stats:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match and match.view_name else "unresolved"
+        inc(
+            "http_requests_total",
+            {"view": view, "method": request.method, "status": response.status_code},
+        )
+        observe("http_request_duration_seconds", {"view": view}, elapsed)
+        inc("http_db_queries_total", {"view": view}, stats.count)
+        flush()
+        return response
+
+
+@task_prerun.connect
+def _task_started(task_id=None, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _task_finished(task_id=None, task=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is not None:
+        observe(
+            "celery_task_duration_seconds",
+            {"task": task.name},
+            time.perf_counter() - start,
+        )
+    inc("celery_tasks_total", {"task": task.name, "state": state or "UNKNOWN"})
+    flush()
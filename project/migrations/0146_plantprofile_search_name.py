@@ -0,0 +1,38 @@
+# Generated by Django 6.0.7 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+from project.normalize import build_search_key
+
+
+def populate_search_name(apps, schema_editor):
+    PlantProfile = apps.get_model("project", "PlantProfile")
+
+    plants = list(
+        PlantProfile._base_manager.only(
+            "id", "latin_name", "english_name", "french_name"
+        )
+    )
+    for plant in plants:
+        plant.search_name = build_search_key(
+            plant.latin_name, plant.english_name, plant.french_name
+        )
+    PlantProfile._base_manager.bulk_update(plants, ["search_name"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0145_alter_order_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="plantprofile",
+            name="search_name",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(populate_search_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 6.0.7 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+from project.normalize import build_search_key
+
+
+def populate_search_name(apps, schema_editor):
+    NonNativeSpecies = apps.get_model("project", "NonNativeSpecies")
+
+    species_list = list(NonNativeSpecies._base_manager.all())
+    for species in species_list:
+        names = dict.fromkeys(
+            [
+                species.latin_name,
+                species.english_name,
+                species.english_name_en,
+                species.english_name_fr,
+            ]
+        )
+        species.search_name = build_search_key(*names)
+    NonNativeSpecies._base_manager.bulk_update(
+        species_list, ["search_name"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0146_plantprofile_search_name"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="nonnativespecies",
+            name="search_name",
+            field=models.CharField(
+                blank=True, db_index=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.RunPython(populate_search_name, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,142 @@
+# Generated by Django 6.0.7 on 2026-10-18 16:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from project.normalize import fold_text
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE project_plantsearchindex USING fts5(
+        names, synonyms, narrative,
+        content='project_plantsearchdocument',
+        content_rowid='plant_profile_id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    "CREATE VIRTUAL TABLE project_plantsearchvocab "
+    "USING fts5vocab(project_plantsearchindex, row)",
+    """
+    CREATE TRIGGER project_plantsearchdocument_ai
+    AFTER INSERT ON project_plantsearchdocument BEGIN
+        INSERT INTO project_plantsearchindex(rowid, names, synonyms, narrative)
+        VALUES (new.plant_profile_id, new.names, new.synonyms, new.narrative);
+    END
+    """,
+    """
+    CREATE TRIGGER project_plantsearchdocument_ad
+    AFTER DELETE ON project_plantsearchdocument BEGIN
+        INSERT INTO project_plantsearchindex(
+            project_plantsearchindex, rowid, names, synonyms, narrative
+        )
+        VALUES ('delete', old.plant_profile_id, old.names, old.synonyms, old.narrative);
+    END
+    """,
+    """
+    CREATE TRIGGER project_plantsearchdocument_au
+    AFTER UPDATE ON project_plantsearchdocument BEGIN
+        INSERT INTO project_plantsearchindex(
+            project_plantsearchindex, rowid, names, synonyms, narrative
+        )
+        VALUES ('delete', old.plant_profile_id, old.names, old.synonyms, old.narrative);
+        INSERT INTO project_plantsearchindex(rowid, names, synonyms, narrative)
+        VALUES (new.plant_profile_id, new.names, new.synonyms, new.narrative);
+    END
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS project_plantsearchdocument_au",
+    "DROP TRIGGER IF EXISTS project_plantsearchdocument_ad",
+    "DROP TRIGGER IF EXISTS project_plantsearchdocument_ai",
+    "DROP TABLE IF EXISTS project_plantsearchvocab",
+    "DROP TABLE IF EXISTS project_plantsearchindex",
+]
+
+POSTGRES_INSTALL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX project_plantsearchdocument_names_trgm "
+    "ON project_plantsearchdocument USING gin (names gin_trgm_ops)",
+    "CREATE INDEX project_plantsearchdocument_synonyms_trgm "
+    "ON project_plantsearchdocument USING gin (synonyms gin_trgm_ops)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP INDEX IF EXISTS project_plantsearchdocument_synonyms_trgm",
+    "DROP INDEX IF EXISTS project_plantsearchdocument_names_trgm",
+]
+
+
+def install_search_index(apps, schema_editor):
+    statements = {
+        "sqlite": SQLITE_INSTALL,
+        "postgresql": POSTGRES_INSTALL,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def uninstall_search_index(apps, schema_editor):
+    statements = {
+        "sqlite": SQLITE_UNINSTALL,
+        "postgresql": POSTGRES_UNINSTALL,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def populate_search_documents(apps, schema_editor):
+    PlantProfile = apps.get_model("project", "PlantProfile")
+    PlantSearchDocument = apps.get_model("project", "PlantSearchDocument")
+
+    documents = []
+    plants = PlantProfile._base_manager.prefetch_related("obsolete_names", "narratives")
+    for plant in plants:
+        names = [plant.latin_name, plant.english_name, plant.french_name]
+        documents.append(
+            PlantSearchDocument(
+                plant_profile=plant,
+                names="\n".join(fold_text(name) for name in names if name),
+                synonyms="\n".join(
+                    fold_text(obsolete.obsolete_name)
+                    for obsolete in plant.obsolete_names.all()
+                    if obsolete.obsolete_name
+                ),
+                narrative="\n".join(
+                    fold_text(narrative.description)
+                    for narrative in plant.narratives.all()
+                    if narrative.published and narrative.description
+                ),
+            )
+        )
+    PlantSearchDocument._base_manager.bulk_create(documents, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0147_nonnativespecies_search_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlantSearchDocument",
+            fields=[
+                (
+                    "plant_profile",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="project.plantprofile",
+                    ),
+                ),
+                ("names", models.TextField(blank=True, default="")),
+                ("synonyms", models.TextField(blank=True, default="")),
+                ("narrative", models.TextField(blank=True, default="")),
+            ],
+        ),
+        migrations.RunPython(install_search_index, uninstall_search_index),
+        migrations.RunPython(populate_search_documents, migrations.RunPython.noop),
+    ]
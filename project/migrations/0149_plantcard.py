@@ -0,0 +1,83 @@
+# Generated by Django 6.0.7 on 2026-10-18 16:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_plant_cards(apps, schema_editor):
+    PlantProfile = apps.get_model("project", "PlantProfile")
+    PlantImage = apps.get_model("project", "PlantImage")
+    PlantCard = apps.get_model("project", "PlantCard")
+
+    first_images = {}
+    images = PlantImage._base_manager.order_by("plant_profile__latin_name", "title")
+    for image in images:
+        first_images.setdefault(image.plant_profile_id, image)
+
+    cards = []
+    for plant in PlantProfile._base_manager.select_related("growth_habit"):
+        image = first_images.get(plant.id)
+        cards.append(
+            PlantCard(
+                plant_profile=plant,
+                latin_name=plant.latin_name,
+                english_name=plant.english_name or "",
+                french_name=plant.french_name or "",
+                growth_habit_slug=(
+                    plant.growth_habit.growth_habit_en or ""
+                    if plant.growth_habit
+                    else ""
+                ),
+                image_url=image.image.url if image and image.image else "",
+                image_author=image.photo_author if image else "",
+                is_active=plant.is_active,
+                seed_availability=plant.seed_availability,
+            )
+        )
+    PlantCard._base_manager.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0148_plantsearchdocument"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlantCard",
+            fields=[
+                (
+                    "plant_profile",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="project.plantprofile",
+                    ),
+                ),
+                ("latin_name", models.CharField(db_index=True, max_length=75)),
+                (
+                    "english_name",
+                    models.CharField(blank=True, default="", max_length=75),
+                ),
+                (
+                    "french_name",
+                    models.CharField(blank=True, default="", max_length=75),
+                ),
+                (
+                    "growth_habit_slug",
+                    models.CharField(blank=True, default="", max_length=50),
+                ),
+                ("image_url", models.CharField(blank=True, default="", max_length=255)),
+                (
+                    "image_author",
+                    models.CharField(blank=True, default="", max_length=125),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                ("seed_availability", models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(populate_plant_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.0.7 on 2026-10-18 17:10
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_order_totals(apps, schema_editor):
+    Order = apps.get_model("project", "Order")
+    OrderItem = apps.get_model("project", "OrderItem")
+
+    totals = OrderItem.objects.values("order").annotate(
+        item_count=Count("id"), seed_quantity=Sum("quantity")
+    )
+    orders = []
+    for row in totals:
+        orders.append(
+            Order(
+                pk=row["order"],
+                item_count=row["item_count"],
+                seed_quantity=row["seed_quantity"] or 0,
+            )
+        )
+    Order.objects.bulk_update(orders, ["item_count", "seed_quantity"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0149_plantcard"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="item_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Items"),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="seed_quantity",
+            field=models.PositiveIntegerField(default=0, verbose_name="Seed Quantity"),
+        ),
+        migrations.RunPython(populate_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 6.0.7 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0150_order_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="librarysetting",
+            name="shop_capacity",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Most customers using the cart and checkout at once, the others wait their turn in a waiting room. 0 for no limit.",
+                verbose_name="Shop Capacity",
+            ),
+        ),
+        migrations.AddField(
+            model_name="librarysetting",
+            name="shop_idle_minutes",
+            field=models.PositiveIntegerField(
+                default=15,
+                help_text="Minutes without a cart or checkout request after which a customer gives their place to the next one waiting.",
+                verbose_name="Shop Idle Minutes",
+            ),
+        ),
+    ]
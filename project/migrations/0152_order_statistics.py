@@ -0,0 +1,147 @@
+# Generated by Django 6.0.7 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractYear
+
+
+def populate_order_statistics(apps, schema_editor):
+    Order = apps.get_model("project", "Order")
+    OrderItem = apps.get_model("project", "OrderItem")
+    OrderYearStatistic = apps.get_model("project", "OrderYearStatistic")
+    OrderLocationStatistic = apps.get_model("project", "OrderLocationStatistic")
+    PlantOrderStatistic = apps.get_model("project", "PlantOrderStatistic")
+
+    years = (
+        Order.objects.annotate(year=ExtractYear("order_date"))
+        .values("year", "status")
+        .annotate(order_count=Count("id"), donation_amount=Sum("donation_amount"))
+        .order_by()
+    )
+    OrderYearStatistic.objects.bulk_create(
+        [OrderYearStatistic(**row) for row in years], batch_size=500
+    )
+
+    locations = (
+        Order.objects.values(
+            "customer__province", "customer__city", "customer__postal_code"
+        )
+        .annotate(order_count=Count("id"), donation_amount=Sum("donation_amount"))
+        .order_by()
+    )
+    OrderLocationStatistic.objects.bulk_create(
+        [
+            OrderLocationStatistic(
+                province=row["customer__province"],
+                city=row["customer__city"],
+                postal_code=row["customer__postal_code"],
+                order_count=row["order_count"],
+                donation_amount=row["donation_amount"],
+            )
+            for row in locations
+        ],
+        batch_size=500,
+    )
+
+    plants = (
+        OrderItem.objects.values("plant_profile_id")
+        .annotate(order_count=Count("id"), seed_quantity=Sum("quantity"))
+        .order_by()
+    )
+    PlantOrderStatistic.objects.bulk_create(
+        [PlantOrderStatistic(**row) for row in plants], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0151_librarysetting_shop_capacity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderLocationStatistic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order_count", models.IntegerField(default=0, verbose_name="Orders")),
+                (
+                    "donation_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Donation Amount",
+                    ),
+                ),
+                ("province", models.CharField(max_length=100, verbose_name="Province")),
+                ("city", models.CharField(max_length=100, verbose_name="City")),
+                (
+                    "postal_code",
+                    models.CharField(max_length=20, verbose_name="Postal Code"),
+                ),
+            ],
+            options={
+                "unique_together": {("province", "city", "postal_code")},
+            },
+        ),
+        migrations.CreateModel(
+            name="OrderYearStatistic",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order_count", models.IntegerField(default=0, verbose_name="Orders")),
+                (
+                    "donation_amount",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Donation Amount",
+                    ),
+                ),
+                ("year", models.PositiveIntegerField(verbose_name="Year")),
+                ("status", models.CharField(max_length=20, verbose_name="Status")),
+            ],
+            options={
+                "unique_together": {("year", "status")},
+            },
+        ),
+        migrations.CreateModel(
+            name="PlantOrderStatistic",
+            fields=[
+                (
+                    "plant_profile",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="order_statistic",
+                        serialize=False,
+                        to="project.plantprofile",
+                    ),
+                ),
+                ("order_count", models.IntegerField(default=0, verbose_name="Orders")),
+                (
+                    "seed_quantity",
+                    models.IntegerField(default=0, verbose_name="Seed Quantity"),
+                ),
+            ],
+        ),
+        migrations.RunPython(populate_order_statistics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0.7 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("project", "0152_order_statistics"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="nonnativespecies",
+            name="search_name",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.AlterField(
+            model_name="plantprofile",
+            name="search_name",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=255
+            ),
+        ),
+    ]
@@ -1,11 +1,15 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models.functions import Coalesce
 from django.urls import reverse
 from django.utils.dates import MONTHS
 from django.utils.translation import gettext_lazy as _
 from PIL import Image, ImageOps
 
+from project import search_backends
+from project.normalize import build_search_key, fold_text
+
 
 class LibrarySetting(models.Model):
     """A model representing miscellaneous boolean settings for the plant library.
@@ -24,6 +28,23 @@ class LibrarySetting(models.Model):
     is_accepting_donations = models.BooleanField(
         default=False, verbose_name=_("Accepting Donations")
     )
+    # Admission control of the cart and checkout, see project/admission.py
+    shop_capacity = models.PositiveIntegerField(
+        default=0,
+        verbose_name=_("Shop Capacity"),
+        help_text=_(
+            "Most customers using the cart and checkout at once, the others wait "
+            "their turn in a waiting room. 0 for no limit."
+        ),
+    )
+    shop_idle_minutes = models.PositiveIntegerField(
+        default=15,
+        verbose_name=_("Shop Idle Minutes"),
+        help_text=_(
+            "Minutes without a cart or checkout request after which a customer "
+            "gives their place to the next one waiting."
+        ),
+    )
 
     def __str__(self) -> str:
         return str(_("Library Status"))
@@ -496,26 +517,28 @@ class ConservationStatus(Base):
 class PlantProfileQuerySet(models.QuerySet):
     def plant_name(self, query):
         """
-        Filter plants based on a search query across multiple name fields.
+        Filter plants based on a search query across their names and descriptions.
 
-        This method searches for plants where the query string matches partially
-        (case-insensitive) with either the Latin, English, or French name.
+        This method runs the query through the full-text search backend of the
+        database, see project.search_backends. Every word of the query matches as a
+        prefix, ignoring accents and case, of the Latin, English or French name, an
+        obsolete name or a published narrative. Misspelled words fall back on the
+        closest indexed terms.
 
         Args:
             query (str): The search string to filter plant names.
 
         Returns:
-            QuerySet: A filtered queryset containing plants matching the search criteria.
+            QuerySet: A filtered queryset containing plants matching the search criteria,
+            ordered by relevance. The queryset is unchanged when the query has no words.
 
         Example:
-            >>> Plant.objects.plant_name("rose")
-            <QuerySet [<Plant: Rosa gallica>, <Plant: Garden rose>, <Plant: Rose trémière>]>
+            >>> Plant.search_plant.plant_name("rose")
+            <QuerySet [<Plant: Rosa blanda>, <Plant: Rosa acicularis>, <Plant: Rubus odoratus>]>
         """
-        return self.filter(
-            models.Q(latin_name__icontains=query)
-            | models.Q(english_name__icontains=query)
-            | models.Q(french_name__icontains=query)
-        )
+        if not search_backends.query_words(query):
+            return self
+        return search_backends.rank_queryset(self, search_backends.search(query))
 
 
 class ToxicityIndicator(Base):
@@ -628,6 +651,7 @@ class NonNativeSpecies(models.Model):
     Attributes:
         latin_name (CharField): The scientific name of the non-native species, max length 75 characters, unique.
         english_name (CharField): The common name of the non-native species in English, max length 75 characters, can be blank.
+        search_name (CharField): Accent-folded latin and english names, including their translations.
     Returns:
         str: String representation of the non-native species, which is its Latin name.
     """
@@ -638,6 +662,9 @@ class NonNativeSpecies(models.Model):
     english_name = models.CharField(
         max_length=75, blank=True, verbose_name=_("English Name")
     )
+    search_name = models.CharField(
+        max_length=255, blank=True, default="", editable=False
+    )
 
     def __str__(self) -> str:
         return f"{self.latin_name} ({self.english_name})"
@@ -645,6 +672,47 @@ class NonNativeSpecies(models.Model):
     class Meta:
         unique_together = ("latin_name", "english_name")
 
+    # Fields folded into search_name, including the modeltranslation columns.
+    SEARCH_NAME_FIELDS = frozenset(
+        {"latin_name", "english_name", "english_name_en", "english_name_fr"}
+    )
+
+    def save(self, *args, **kwargs):
+        self.search_name = self.get_search_name()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.SEARCH_NAME_FIELDS & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "search_name"}
+        super().save(*args, **kwargs)
+
+    def get_search_name(self) -> str:
+        """Return the accent-folded search key built from the latin and english names."""
+        names = dict.fromkeys(
+            [
+                self.latin_name,
+                self.english_name,
+                getattr(self, "english_name_en", ""),
+                getattr(self, "english_name_fr", ""),
+            ]
+        )
+        return build_search_key(*names)
+
+    @classmethod
+    def rebuild_search_names(cls, batch_size=500) -> int:
+        """
+        Recompute the search_name of every non-native species.
+
+        Returns:
+            int: The number of non-native species that were updated.
+        """
+        stale = []
+        for species in cls.objects.all():
+            search_name = species.get_search_name()
+            if species.search_name != search_name:
+                species.search_name = search_name
+                stale.append(species)
+        cls.objects.bulk_update(stale, ["search_name"], batch_size=batch_size)
+        return len(stale)
+
 
 class Ecozone(Base):
     """A model representing ecozones where plants can thrive."""
@@ -747,6 +815,8 @@ class PlantProfile(Base):
         french_name (CharField): Common name in French (optional, max 75 chars)
         taxon (CharField): Taxonomic classification code (max 5 chars)
         inaturalist_taxon (CharField): iNaturalist taxonomic identifier (max 10 chars)
+        search_name (CharField): Accent-folded, lower-cased latin, english and french names
+            joined by a separator. Maintained on save and by rebuild_search_names().
 
     # Environmental Requirements
         ## Light Preferences
@@ -993,6 +1063,9 @@ class PlantProfile(Base):
     inaturalist_taxon = models.CharField(
         max_length=10, blank=True, verbose_name=_("iNaturalist Taxon")
     )
+    search_name = models.CharField(
+        max_length=255, blank=True, default="", editable=False
+    )
     #
     # Environmental requirements
     #
@@ -1377,6 +1450,9 @@ class PlantProfile(Base):
             f"{self.pk} | {self.latin_name} | {self.english_name} | {self.french_name}"
         )
 
+    # Fields folded into search_name.
+    SEARCH_NAME_FIELDS = frozenset({"latin_name", "english_name", "french_name"})
+
     class Meta:
         ordering = ["latin_name"]
 
@@ -1446,8 +1522,42 @@ class PlantProfile(Base):
             word.capitalize() for word in self.english_name.strip().split()
         )
         self.compare_blooming()
+        self.search_name = self.get_search_name()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and self.SEARCH_NAME_FIELDS & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "search_name"}
         super().save(*args, **kwargs)
 
+    def get_search_name(self) -> str:
+        """Return the accent-folded search key built from the plant names."""
+        return build_search_key(self.latin_name, self.english_name, self.french_name)
+
+    @classmethod
+    def rebuild_search_names(cls, queryset=None, batch_size=500) -> int:
+        """
+        Recompute the search_name of every plant in queryset.
+
+        Use after writes that bypass save(), such as QuerySet.update() during bulk imports.
+        Only the name columns are read and only stale rows are written back.
+
+        Args:
+            queryset: PlantProfile queryset to refresh. Defaults to all plant profiles.
+            batch_size: Number of rows written per UPDATE statement.
+
+        Returns:
+            int: The number of plant profiles that were updated.
+        """
+        if queryset is None:
+            queryset = cls.all_objects.all()
+        stale = []
+        for plant in queryset.only("id", "search_name", *cls.SEARCH_NAME_FIELDS):
+            search_name = plant.get_search_name()
+            if plant.search_name != search_name:
+                plant.search_name = search_name
+                stale.append(plant)
+        cls.all_objects.bulk_update(stale, ["search_name"], batch_size=batch_size)
+        return len(stale)
+
 
 class ProjectUser(AbstractUser):
     """A custom user model extending Django's AbstractUser.
@@ -1813,6 +1923,196 @@ class PlantNarrative(models.Model):
         return f"{self.plant_profile.latin_name} - {narrative_label}"
 
 
+class PlantSearchDocument(models.Model):
+    """The accent-folded text of a plant profile read by the full-text search backends.
+
+    One row per plant profile, active or not, holding its names, its obsolete names
+    and its published narratives. The rows are refreshed by the receivers in
+    project.signals once a change is committed. On SQLite an FTS5 index follows this
+    table through triggers, see project.search_backends.
+
+    Attributes:
+        plant_profile (OneToOneField): The indexed plant profile, also the primary key.
+        names (TextField): Latin, English and French names, one per line.
+        synonyms (TextField): Obsolete names, one per line.
+        narrative (TextField): Published narrative descriptions.
+    """
+
+    plant_profile = models.OneToOneField(
+        PlantProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="search_document",
+    )
+    names = models.TextField(blank=True, default="")
+    synonyms = models.TextField(blank=True, default="")
+    narrative = models.TextField(blank=True, default="")
+
+    def __str__(self) -> str:
+        return f"Search document {self.plant_profile_id}"
+
+    @staticmethod
+    def build_fields(plant):
+        """Return the document fields for a plant profile.
+
+        The obsolete names and narratives are read through plant.obsolete_names and
+        plant.narratives, prefetch them when building many documents.
+        """
+        return {
+            "names": "\n".join(
+                fold_text(name)
+                for name in (plant.latin_name, plant.english_name, plant.french_name)
+                if name
+            ),
+            "synonyms": "\n".join(
+                fold_text(obsolete.obsolete_name)
+                for obsolete in plant.obsolete_names.all()
+                if obsolete.obsolete_name
+            ),
+            "narrative": "\n".join(
+                fold_text(narrative.description)
+                for narrative in plant.narratives.all()
+                if narrative.published and narrative.description
+            ),
+        }
+
+    @classmethod
+    def refresh(cls, plant_ids):
+        """Bring the documents of the given plant profiles up to date.
+
+        Documents of plant profiles that no longer exist are deleted.
+        """
+        plant_ids = set(plant_ids)
+        plants = PlantProfile.all_objects.filter(id__in=plant_ids).prefetch_related(
+            "obsolete_names", "narratives"
+        )
+        found = set()
+        for plant in plants:
+            found.add(plant.id)
+            cls.objects.update_or_create(
+                plant_profile=plant, defaults=cls.build_fields(plant)
+            )
+        cls.objects.filter(plant_profile_id__in=plant_ids - found).delete()
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        """Recreate the document of every plant profile and return how many exist."""
+        plants = PlantProfile.all_objects.prefetch_related(
+            "obsolete_names", "narratives"
+        )
+        documents = [
+            cls(plant_profile=plant, **cls.build_fields(plant)) for plant in plants
+        ]
+        cls.objects.all().delete()
+        cls.objects.bulk_create(documents, batch_size=batch_size)
+        return len(documents)
+
+
+class PlantCard(models.Model):
+    """A narrow copy of the plant profile fields shown on the catalogue cards.
+
+    One row per plant profile, active or not, so a page of cards is read with a
+    single query instead of loading full plant profile rows and their images.
+    The rows are refreshed by the receivers in project.signals when a plant
+    profile, one of its images or a growth habit is saved.
+
+    Attributes:
+        plant_profile (OneToOneField): The plant profile, also the primary key.
+        latin_name, english_name, french_name (CharField): The plant names.
+        growth_habit_slug (CharField): English growth habit, used for the plant type icon.
+        image_url (CharField): URL of the first plant image, blank without image.
+        image_author (CharField): Author of that image.
+        is_active (BooleanField): Copy of PlantProfile.is_active.
+        seed_availability (BooleanField): Copy of PlantProfile.seed_availability.
+    """
+
+    # PlantProfile fields copied on the cards
+    PLANT_FIELDS = frozenset(
+        {
+            "latin_name",
+            "english_name",
+            "french_name",
+            "growth_habit",
+            "is_active",
+            "seed_availability",
+        }
+    )
+
+    plant_profile = models.OneToOneField(
+        PlantProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="card",
+    )
+    latin_name = models.CharField(max_length=75, db_index=True)
+    english_name = models.CharField(max_length=75, blank=True, default="")
+    french_name = models.CharField(max_length=75, blank=True, default="")
+    growth_habit_slug = models.CharField(max_length=50, blank=True, default="")
+    image_url = models.CharField(max_length=255, blank=True, default="")
+    image_author = models.CharField(max_length=125, blank=True, default="")
+    is_active = models.BooleanField(default=True)
+    seed_availability = models.BooleanField(default=False)
+
+    def __str__(self) -> str:
+        return self.latin_name
+
+    def get_absolute_url(self):
+        return reverse("plant-profile-page", kwargs={"pk": self.pk})
+
+    @staticmethod
+    def build_fields(plant):
+        """Return the card fields for a plant profile.
+
+        The image is read through plant.images, prefetch it and the growth habit
+        when building many cards.
+        """
+        image = next(iter(plant.images.all()), None)
+        return {
+            "latin_name": plant.latin_name,
+            "english_name": plant.english_name or "",
+            "french_name": plant.french_name or "",
+            "growth_habit_slug": (
+                plant.growth_habit.growth_habit_en or "" if plant.growth_habit else ""
+            ),
+            "image_url": image.image.url if image and image.image else "",
+            "image_author": image.photo_author if image else "",
+            "is_active": plant.is_active,
+            "seed_availability": plant.seed_availability,
+        }
+
+    @classmethod
+    def _plants(cls):
+        return PlantProfile.all_objects.select_related("growth_habit").prefetch_related(
+            "images"
+        )
+
+    @classmethod
+    def refresh(cls, plant_ids):
+        """Bring the cards of the given plant profiles up to date.
+
+        Cards of plant profiles that no longer exist are deleted.
+        """
+        plant_ids = set(plant_ids)
+        found = set()
+        for plant in cls._plants().filter(id__in=plant_ids):
+            found.add(plant.id)
+            cls.objects.update_or_create(
+                plant_profile=plant, defaults=cls.build_fields(plant)
+            )
+        cls.objects.filter(plant_profile_id__in=plant_ids - found).delete()
+
+    @classmethod
+    def rebuild(cls, batch_size=500):
+        """Recreate the card of every plant profile and return how many exist."""
+        cards = [
+            cls(plant_profile=plant, **cls.build_fields(plant))
+            for plant in cls._plants()
+        ]
+        cls.objects.all().delete()
+        cls.objects.bulk_create(cards, batch_size=batch_size)
+        return len(cards)
+
+
 class Customer(Base):
     """
     A model representing a customer.
@@ -1937,6 +2237,8 @@ class Order(Base):
         status (CharField): Current status of the order (pending, completed, cancelled, etc.).
         donation_amount (DecimalField): Optional donation amount made with the order.
         notes (TextField): Optional notes about the order.
+        item_count (PositiveIntegerField): Number of items of the order.
+        seed_quantity (PositiveIntegerField): Seed packets over all the items.
 
     Returns:
         str: String representation of the order in the format "Order #ID - Customer - Date".
@@ -1969,10 +2271,24 @@ class Order(Base):
         help_text=_("Optional donation amount in addition to seed order."),
     )
     customer_note = models.TextField(blank=True, verbose_name=_("Customer Notes"))
+    # Set when the order is placed and updated with its items, see update_totals
+    item_count = models.PositiveIntegerField(default=0, verbose_name=_("Items"))
+    seed_quantity = models.PositiveIntegerField(
+        default=0, verbose_name=_("Seed Quantity")
+    )
 
     def __str__(self) -> str:
         return f"Order #{self.id} - {self.customer.first_name} {self.customer.last_name} - {self.order_date.strftime('%Y-%m-%d')}"
 
+    @classmethod
+    def update_totals(cls, order_id):
+        """Count again the items and seed packets of an order, after an item edit."""
+        totals = OrderItem.objects.filter(order_id=order_id).aggregate(
+            item_count=models.Count("id"),
+            seed_quantity=Coalesce(models.Sum("quantity"), 0),
+        )
+        cls.objects.filter(pk=order_id).update(**totals)
+
     class Meta:
         ordering = ["-order_date"]
 
@@ -2014,6 +2330,116 @@ class OrderItem(Base):
         unique_together = ("order", "plant_profile")
 
 
+class OrderRollup(models.Model):
+    """Orders and donations of a group of orders, for the admin statistics pages.
+
+    The rows are kept up to date by project.order_statistics.
+
+    Attributes:
+        order_count (IntegerField): Number of orders of the group.
+        donation_amount (DecimalField): Donations of those orders.
+    """
+
+    order_count = models.IntegerField(default=0, verbose_name=_("Orders"))
+    donation_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name=_("Donation Amount"),
+    )
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def add(cls, key, order_count, donation_amount):
+        """Add to the row of the group key, a dict of its fields, created if missing."""
+        rows = cls.objects.filter(**key)
+        changes = {
+            "order_count": models.F("order_count") + order_count,
+            "donation_amount": models.F("donation_amount") + donation_amount,
+        }
+        if not rows.update(**changes):
+            # Created once, also when two orders of a new group are added at once
+            cls.objects.bulk_create([cls(**key)], ignore_conflicts=True)
+            rows.update(**changes)
+
+
+class OrderYearStatistic(OrderRollup):
+    """Orders and donations by year of the order date and order status."""
+
+    year = models.PositiveIntegerField(verbose_name=_("Year"))
+    status = models.CharField(max_length=20, verbose_name=_("Status"))
+
+    def __str__(self) -> str:
+        return f"{self.year} {self.status}: {self.order_count}"
+
+    class Meta:
+        unique_together = ("year", "status")
+
+
+class OrderLocationStatistic(OrderRollup):
+    """Orders and donations by province, city and postal code of the customer."""
+
+    province = models.CharField(max_length=100, verbose_name=_("Province"))
+    city = models.CharField(max_length=100, verbose_name=_("City"))
+    postal_code = models.CharField(max_length=20, verbose_name=_("Postal Code"))
+
+    def __str__(self) -> str:
+        return f"{self.city} {self.postal_code}: {self.order_count}"
+
+    class Meta:
+        unique_together = ("province", "city", "postal_code")
+
+
+class PlantOrderStatistic(models.Model):
+    """Orders and seed packets ordered by plant profile.
+
+    Attributes:
+        plant_profile (OneToOneField): The plant profile, also the primary key.
+        order_count (IntegerField): Number of orders with the plant.
+        seed_quantity (IntegerField): Seed packets ordered over those orders.
+    """
+
+    plant_profile = models.OneToOneField(
+        PlantProfile,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="order_statistic",
+    )
+    order_count = models.IntegerField(default=0, verbose_name=_("Orders"))
+    seed_quantity = models.IntegerField(default=0, verbose_name=_("Seed Quantity"))
+
+    def __str__(self) -> str:
+        return f"Plant {self.plant_profile_id}: {self.seed_quantity}"
+
+    @classmethod
+    def add(cls, quantities, sign=1):
+        """Add an order and its packets to each plant of quantities, subtract them
+        with sign -1.
+
+        quantities maps plant ids to seed packets. The rows are changed in two
+        queries, whatever the number of plants.
+        """
+        if not quantities:
+            return
+        cls.objects.bulk_create(
+            [cls(plant_profile_id=plant_id) for plant_id in quantities],
+            ignore_conflicts=True,
+        )
+        cls.objects.filter(plant_profile_id__in=quantities).update(
+            order_count=models.F("order_count") + sign,
+            seed_quantity=models.F("seed_quantity")
+            + models.Case(
+                *[
+                    models.When(plant_profile_id=plant_id, then=sign * quantity)
+                    for plant_id, quantity in quantities.items()
+                ],
+                default=0,
+            ),
+        )
+
+
 class StripeWebhookEvent(Base):
     """Track Stripe webhook events for idempotent processing."""
 
@@ -0,0 +1,29 @@
+"""Text normalization helpers used by the plant search features.
+
+This module must not import project.models since the models use these helpers
+to maintain their stored search keys.
+"""
+
+from unicodedata import normalize
+
+# Separator used when several folded names are stored in a single search key.
+# It cannot appear in a folded name, so a search term never matches across two names.
+SEARCH_KEY_SEPARATOR = "|"
+
+
+def fold_text(value: str | None) -> str:
+    """Return value decomposed with NFKD, stripped of non-ASCII characters and lower-cased.
+
+    Example:
+        >>> fold_text("Érable à sucre")
+        'erable a sucre'
+    """
+    if not value:
+        return ""
+    return normalize("NFKD", value).encode("ASCII", "ignore").decode("ASCII").lower()
+
+
+def build_search_key(*values: str | None) -> str:
+    """Fold each value and join the non-empty results into a single search key."""
+    folded = (fold_text(value).replace(SEARCH_KEY_SEPARATOR, " ") for value in values)
+    return SEARCH_KEY_SEPARATOR.join(value for value in folded if value)
@@ -0,0 +1,229 @@
+"""Rollups of the order statistics shown on the admin dashboards.
+
+The statistics pages read three small tables instead of scanning every order:
+
+- OrderYearStatistic: orders and donations by year and order status
+- OrderLocationStatistic: orders and donations by province, city and postal code
+- PlantOrderStatistic: orders and seed packets by plant profile
+
+The receivers in project.signals add the change of an order, an order item or the
+address of a customer to the rollups, as a difference, once it is committed. The
+rollup rows are changed outside the transaction of the order, so the checkouts of
+the shop opening do not wait on each other for the same row.
+
+Orders placed from a cart insert their items in bulk, without signals, and add
+them with items_added(). Changes made with a queryset update() or in SQL are not
+seen, run the rebuild_order_statistics command after them.
+
+A difference that fails once its order is committed, e.g. on a database error, is
+logged and the rollups drift from the orders, without failing the request that
+committed it. Close the shop, so no order is placed or changed meanwhile, and run
+the rebuild_order_statistics command to count them again from the orders.
+"""
+
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, ExtractYear
+from django.utils import timezone
+
+from project.models import (
+    Order,
+    OrderItem,
+    OrderLocationStatistic,
+    OrderYearStatistic,
+    PlantOrderStatistic,
+)
+
+logger = logging.getLogger(__name__)
+
+LOCATION_FIELDS = ("province", "city", "postal_code")
+
+
+@dataclass(frozen=True)
+class OrderFacts:
+    """What an order adds to the rollups."""
+
+    year: int
+    status: str
+    donation_amount: Decimal
+    province: str
+    city: str
+    postal_code: str
+
+    @property
+    def location(self) -> dict:
+        return {name: getattr(self, name) for name in LOCATION_FIELDS}
+
+
+def _year(order_date) -> int:
+    # The year in the current time zone, as ExtractYear
+    if timezone.is_aware(order_date):
+        order_date = timezone.localtime(order_date)
+    return order_date.year
+
+
+def order_facts(order) -> OrderFacts:
+    """Return the facts of an order, reading its customer when not loaded."""
+    customer = order.customer
+    return OrderFacts(
+        year=_year(order.order_date),
+        status=order.status,
+        donation_amount=Decimal(str(order.donation_amount or 0)),
+        province=customer.province,
+        city=customer.city,
+        postal_code=customer.postal_code,
+    )
+
+
+def stored_order_facts(order_id):
+    """Return the facts of the stored row of an order, None when not stored."""
+    row = (
+        Order.objects.filter(pk=order_id)
+        .values(
+            "order_date",
+            "status",
+            "donation_amount",
+            *(f"customer__{name}" for name in LOCATION_FIELDS),
+        )
+        .first()
+    )
+    if row is None:
+        return None
+    return OrderFacts(
+        year=_year(row["order_date"]),
+        status=row["status"],
+        donation_amount=row["donation_amount"],
+        **{name: row[f"customer__{name}"] for name in LOCATION_FIELDS},
+    )
+
+
+def _add_order(facts, sign):
+    amounts = {"order_count": sign, "donation_amount": sign * facts.donation_amount}
+    OrderYearStatistic.add({"year": facts.year, "status": facts.status}, **amounts)
+    OrderLocationStatistic.add(facts.location, **amounts)
+
+
+def apply_order_change(old, new):
+    """Move an order from its old facts to the new ones, None for no order."""
+    if old == new:
+        return
+    if old is not None:
+        _add_order(old, -1)
+    if new is not None:
+        _add_order(new, 1)
+
+
+def apply_items_change(old, new):
+    """Move the items of an order from old to new {plant id: quantity} dicts."""
+    if old == new:
+        return
+    PlantOrderStatistic.add(old, -1)
+    PlantOrderStatistic.add(new)
+
+
+def apply_customer_move(customer_id, old, new):
+    """Move the orders of a customer from the old location dict to the new one."""
+    if old == new:
+        return
+    totals = Order.objects.filter(customer_id=customer_id).aggregate(
+        order_count=Count("id"),
+        donation_amount=Coalesce(Sum("donation_amount"), Decimal(0)),
+    )
+    if not totals["order_count"]:
+        return
+    OrderLocationStatistic.add(
+        old,
+        order_count=-totals["order_count"],
+        donation_amount=-totals["donation_amount"],
+    )
+    OrderLocationStatistic.add(new, **totals)
+
+
+def _on_commit(apply, *args):
+    """Call apply(*args) once committed, a failure is logged and not raised.
+
+    The request that committed the order does not fail.
+    """
+
+    def callback():
+        try:
+            apply(*args)
+        except Exception:
+            logger.exception(
+                "Order statistics not updated by %s, run the "
+                "rebuild_order_statistics command with the shop closed",
+                apply.__name__,
+            )
+
+    transaction.on_commit(callback)
+
+
+def record_order(old, new):
+    """Apply the change of an order from old to new facts once committed."""
+    _on_commit(apply_order_change, old, new)
+
+
+def record_items(old, new):
+    """Apply the change of order items from old to new quantities once committed."""
+    _on_commit(apply_items_change, old, new)
+
+
+def record_customer_move(customer_id, old, new):
+    """Apply the move of a customer to another location once committed."""
+    _on_commit(apply_customer_move, customer_id, old, new)
+
+
+def items_added(items):
+    """Record order items inserted in bulk, bypassing the signals."""
+    quantities = Counter()
+    for item in items:
+        quantities[item.plant_profile_id] += item.quantity
+    record_items({}, dict(quantities))
+
+
+@transaction.atomic
+def rebuild(batch_size=500) -> tuple[int, int, int]:
+    """Recount the rollups from every order, return their numbers of rows.
+
+    Run it with the shop closed and no order being edited. The difference of an
+    order committed while the rollups are recounted is added after its commit, to
+    the new counts which may already include it.
+    """
+    years = [
+        OrderYearStatistic(**row)
+        for row in Order.objects.annotate(year=ExtractYear("order_date"))
+        .values("year", "status")
+        .annotate(order_count=Count("id"), donation_amount=Sum("donation_amount"))
+        .order_by()
+    ]
+    locations = [
+        OrderLocationStatistic(
+            order_count=row["order_count"],
+            donation_amount=row["donation_amount"],
+            **{name: row[f"customer__{name}"] for name in LOCATION_FIELDS},
+        )
+        for row in Order.objects.values(
+            *(f"customer__{name}" for name in LOCATION_FIELDS)
+        )
+        .annotate(order_count=Count("id"), donation_amount=Sum("donation_amount"))
+        .order_by()
+    ]
+    plants = [
+        PlantOrderStatistic(**row)
+        for row in OrderItem.objects.values("plant_profile_id")
+        .annotate(order_count=Count("id"), seed_quantity=Sum("quantity"))
+        .order_by()
+    ]
+    for model, rows in (
+        (OrderYearStatistic, years),
+        (OrderLocationStatistic, locations),
+        (PlantOrderStatistic, plants),
+    ):
+        model.objects.all().delete()
+        model.objects.bulk_create(rows, batch_size=batch_size)
+    return len(years), len(locations), len(plants)
@@ -0,0 +1,66 @@
+"""Keyset pagination for the infinite-scroll plant catalogue.
+
+A page after the first one starts from a cursor naming the last plant already
+shown, (latin_name, pk), instead of an OFFSET.
+
+keys_page() pages through a precomputed list of (latin_name, pk) keys, such as the
+cached search results of project.result_cache, finds the cursor in it by bisection
+and only queries the objects of the page. Every page costs the same whatever its
+depth.
+"""
+
+import base64
+import binascii
+import bisect
+import json
+from dataclasses import dataclass
+
+ORDERING = ("latin_name", "pk")
+
+
+def _encode_key(latin_name, pk) -> str:
+    data = json.dumps([latin_name, pk]).encode()
+    return base64.urlsafe_b64encode(data).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """Return (latin_name, pk) from a cursor, raise ValueError when it is invalid."""
+    try:
+        latin_name, plant_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, TypeError, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    if not isinstance(latin_name, str) or not isinstance(plant_id, int):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+    return latin_name, plant_id
+
+
+@dataclass
+class KeysetPage:
+    object_list: list
+    has_next: bool
+    next_cursor: str | None
+    total: int
+
+
+def keys_page(keys, queryset, cursor=None, per_page=24) -> KeysetPage:
+    """Return the page of keys following cursor, with its objects read from queryset.
+
+    keys is the ordered list of (latin_name, pk) of every object, queryset holds
+    plant profiles or plant cards. An invalid cursor starts again from the first
+    page.
+    """
+    start = 0
+    if cursor:
+        try:
+            key = decode_cursor(cursor)
+        except ValueError:
+            pass
+        else:
+            # Right after the plant, or after its place when it left the results
+            start = bisect.bisect_right(keys, key)
+    page_keys = keys[start : start + per_page]
+    has_next = start + per_page < len(keys)
+    objects = queryset.in_bulk([pk for _latin_name, pk in page_keys])
+    object_list = [objects[pk] for _latin_name, pk in page_keys if pk in objects]
+    next_cursor = _encode_key(*page_keys[-1]) if has_next else None
+    return KeysetPage(object_list, has_next, next_cursor, len(keys))
@@ -0,0 +1,93 @@
+"""Loader of a plant profile with everything its pages show.
+
+load() reads the profile with every foreign key joined, then prefetches its
+narratives, images, obsolete names, complementary plants and many-to-many
+relations, one query each. The plant profile page, the label PDFs and the API
+share it, so a page view costs the same fixed number of queries whatever the
+templates touch.
+"""
+
+from dataclasses import dataclass
+
+from django.db.models import Prefetch
+
+from project import models
+
+# Element of the morphology aspect of the preferred profile image
+PRIMARY_IMAGE_ELEMENT = "plant"
+
+PREFETCHES = (
+    Prefetch(
+        "narratives",
+        queryset=models.PlantNarrative.objects.select_related("narrative_type"),
+    ),
+    Prefetch(
+        "images",
+        queryset=models.PlantImage.objects.select_related("morphology_aspect"),
+    ),
+    "obsolete_names",
+    Prefetch(
+        "plant",
+        queryset=models.PlantComplementary.objects.select_related("complement"),
+    ),
+    "ecozones",
+    "bees",
+    "butterflies",
+    "substitute_for_non_native",
+)
+
+
+def related_fields() -> list[str]:
+    """Return the names of the foreign keys of PlantProfile."""
+    return [
+        field.name
+        for field in models.PlantProfile._meta.get_fields()
+        if field.many_to_one and field.concrete
+    ]
+
+
+def plant_profiles(authenticated: bool):
+    """Return the plant profiles visible to the user, ready to be bundled.
+
+    Authenticated users also see the inactive profiles.
+    """
+    manager = (
+        models.PlantProfile.all_objects
+        if authenticated
+        else models.PlantProfile.objects
+    )
+    return manager.select_related(*related_fields()).prefetch_related(*PREFETCHES)
+
+
+def primary_image(images):
+    """Return the first image showing the whole plant, else the first image."""
+    for image in images:
+        if (image.morphology_aspect.element or "").lower() == PRIMARY_IMAGE_ELEMENT:
+            return image
+    return images[0] if images else None
+
+
+@dataclass
+class PlantProfileBundle:
+    plant: models.PlantProfile
+    narratives: list
+    images: list
+    primary_image: models.PlantImage | None
+
+    @property
+    def image_count(self) -> int:
+        return len(self.images)
+
+
+def load(pk, authenticated: bool = False) -> PlantProfileBundle | None:
+    """Return the bundle of the plant profile pk, None when it is not visible."""
+    plant = plant_profiles(authenticated).filter(pk=pk).first()
+    if plant is None:
+        return None
+    images = list(plant.images.all())
+    return PlantProfileBundle(
+        plant=plant,
+        narratives=list(plant.narratives.all()),
+        images=images,
+        primary_image=primary_image(images),
+    )
@@ -0,0 +1,115 @@
+"""Cached HTML of the plant profile page body.
+
+The body of plant-profile-page, everything below the update links and messages,
+only depends on the plant profile and the rows it displays, so it is rendered once
+per plant and language and kept in the Django cache.
+
+A change to one of those rows evicts the bodies of the plant profiles showing it,
+and only those: the receivers in project.signals map a saved or deleted row to
+the profiles referencing it with plants_using(), e.g. a SeedStorage edit evicts
+the profiles whose seed_storage is that row. Evictions wait for the commit, so a
+concurrent page view cannot cache the old rows again. They also refresh the static
+copies of those pages, see project.public_site.
+
+An eviction only reaches the other workers through a shared cache. Without one,
+see cache_versions.is_shared(), the bodies are not cached and every page view
+renders its body.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.safestring import mark_safe
+from django.utils.translation import get_language
+
+from project import cache_versions, metrics, models, public_site
+
+BODY_TEMPLATE = "project/plant_profile/_profile_body.html"
+
+_KEY_PREFIX = "plant-profile-body"
+TIMEOUT = 60 * 60 * 24 * 7
+
+# Rows of a plant profile, evicted through their plant_profile foreign key
+PLANT_ROWS = (
+    models.ObsoleteNames,
+    models.PlantComplementary,
+    models.PlantImage,
+    models.PlantNarrative,
+)
+
+
+def _key(plant_id, language) -> str:
+    return f"{_KEY_PREFIX}:{plant_id}:{language}"
+
+
+def _language() -> str:
+    """Return the active language as listed in settings.LANGUAGES, e.g. "en"."""
+    return (get_language() or settings.LANGUAGE_CODE).split("-")[0]
+
+
+def get_body(plant_id):
+    """Return the cached body of plant_id in the active language, or None."""
+    if not cache_versions.is_shared():
+        return None
+    body = cache.get(_key(plant_id, _language()))
+    metrics.cache_lookup("plant-profile-body", body is not None)
+    return mark_safe(body) if body is not None else None
+
+
+def set_body(plant_id, body):
+    """Cache the body of plant_id rendered in the active language."""
+    if cache_versions.is_shared():
+        cache.set(_key(plant_id, _language()), str(body), TIMEOUT)
+    return mark_safe(body)
+
+
+def evict(plant_ids):
+    """Drop the cached bodies of plant_ids in every language."""
+    languages = [code for code, _name in settings.LANGUAGES]
+    cache.delete_many(
+        [_key(plant_id, language) for plant_id in plant_ids for language in languages]
+    )
+
+
+def _changed(plant_ids):
+    evict(plant_ids)
+    public_site.refresh(plant_ids)
+
+
+def evict_on_commit(plant_ids):
+    plant_ids = list(plant_ids)
+    if plant_ids:
+        transaction.on_commit(lambda: _changed(plant_ids))
+
+
+def dependencies() -> dict:
+    """Return {model: lookup from PlantProfile} of the lookup rows a body shows."""
+    lookups = {
+        models.NarrativeType: "narratives__narrative_type",
+        models.PlantMorphology: "images__morphology_aspect",
+    }
+    for field in models.PlantProfile._meta.get_fields():
+        if field.concrete and (field.many_to_one or field.many_to_many):
+            lookups[field.related_model] = field.name
+    return lookups
+
+
+def plants_using(instance) -> list[int]:
+    """Return the ids of the plant profiles whose body shows instance."""
+    if isinstance(instance, models.PlantProfile):
+        # Its own page, and the pages listing it as a complementary plant
+        return [instance.pk] + list(
+            models.PlantComplementary.objects.filter(complement=instance).values_list(
+                "plant_profile_id", flat=True
+            )
+        )
+    if isinstance(instance, PLANT_ROWS):
+        return [instance.plant_profile_id]
+    lookup = dependencies().get(type(instance))
+    if lookup is None:
+        return []
+    return list(
+        models.PlantProfile.all_objects.filter(**{lookup: instance})
+        .values_list("id", flat=True)
+        .distinct()
+    )
@@ -0,0 +1,96 @@
+"""On-demand profiling of a request, for the library managers.
+
+Adding ?_profile=1 to a URL, as a member of the Library Manager group, runs the
+request under cProfile and returns a plain text report instead of the page: the
+total time, the SQL queries with their time, the template rendering time and the
+functions taking the most time. Without the parameter, or for other users,
+RequestProfilerMiddleware only looks up the query string.
+"""
+
+import cProfile
+import io
+import pstats
+import textwrap
+import time
+
+from django.http import HttpResponse
+from django.utils import timezone
+
+from project import acl_handler, query_budget
+
+PROFILE_PARAMETER = "_profile"
+PROFILER_GROUP = "Library Manager"
+# Functions listed in the report, by cumulative time
+FUNCTION_LIMIT = 40
+STATEMENT_LIMIT = 10
+STATEMENT_WIDTH = 200
+
+
+def _template_time(stats: pstats.Stats) -> float:
+    """Return the time spent in the outermost Template.render calls."""
+    return max(
+        (
+            cumulative
+            for (filename, _line, name), (_cc, _nc, _tt, cumulative, _callers) in (
+                stats.stats.items()
+            )
+            if name == "render" and filename.endswith("django/template/base.py")
+        ),
+        default=0.0,
+    )
+
+
+def report(request, response, elapsed, sql, profile) -> str:
+    """Return the text report of a profiled request."""
+    stats = pstats.Stats(profile)
+    match = request.resolver_match
+    lines = [
+        f"{request.method} {request.get_full_path()}",
+        f"View: {match.view_name if match else '-'}",
+        f"Status: {response.status_code}",
+        f"Total time: {elapsed * 1000:.1f} ms",
+        f"Template rendering: {_template_time(stats) * 1000:.1f} ms",
+        f"SQL: {query_budget.describe(sql)}",
+        "",
+        "Slowest SQL statements:",
+    ]
+    lines += [
+        f"  {duration * 1000:8.1f} ms {sql.statements[statement]:4d}x "
+        f"{textwrap.shorten(statement, STATEMENT_WIDTH, placeholder=' ...')}"
+        for statement, duration in sql.durations.most_common(STATEMENT_LIMIT)
+    ]
+    lines += ["", f"Functions by cumulative time (top {FUNCTION_LIMIT}):"]
+    output = io.StringIO()
+    stats.stream = output
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(FUNCTION_LIMIT)
+    lines.append(output.getvalue())
+    return "\n".join(lines)
+
+
+class RequestProfilerMiddleware:
+    """Middleware returning a profile report for the requests asking for one."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.GET.get(PROFILE_PARAMETER) != "1" or not acl_handler._is_in_group(
+            request, PROFILER_GROUP
+        ):
+            return self.get_response(request)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        with query_budget.record() as sql:
+            response = profile.runcall(self.get_response, request)
+            # Lazy responses are rendered in the profile too
+            if hasattr(response, "render") and not response.is_rendered:
+                profile.runcall(response.render)
+        elapsed = time.perf_counter() - start
+
+        filename = f"profile-{timezone.now():%Y%m%d-%H%M%S}.txt"
+        return HttpResponse(
+            report(request, response, elapsed, sql, profile),
+            content_type="text/plain; charset=utf-8",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
@@ -0,0 +1,194 @@
+"""Static copies of the public catalogue pages.
+
+The plant profile pages and the catalogue listing pages look the same to every
+anonymous visitor, so they are rendered once per language into
+settings.PUBLIC_SITE_ROOT, under their own URL path:
+
+    <PUBLIC_SITE_ROOT>/en/plant-profile-page/12/index.html
+
+The web server can then answer the visitors without a session cookie from those
+files, and a traffic spike on the catalogue never reaches Django.
+
+The pages are rendered by the request handler of the site, with its middleware,
+as an anonymous HTTPS request. A page that fails is logged and skipped, its
+previous file is kept.
+
+render_site() renders every page, it is run by the render_public_site command.
+After an edit, refresh() only renders again the profile pages of the plants
+affected, as found by project.profile_fragments, and the listing pages. Every
+page shows the shop and donation links of the library settings, so refresh_site()
+renders them all again after a change of the settings. Both run in a Celery task
+when settings.PUBLIC_SITE_RENDER is set.
+"""
+
+import logging
+import os
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import reverse
+from django.utils import translation
+
+from project import models
+
+logger = logging.getLogger(__name__)
+
+# Pages listing the catalogue, rendered again after any plant change
+LISTING_PAGES = (
+    "index",
+    "blooming-calendar",
+    "bee-supporting-plants",
+    "butterfly-supporting-plants",
+)
+PROFILE_PAGE = "plant-profile-page"
+
+
+def _languages() -> list[str]:
+    return [code for code, _name in settings.LANGUAGES]
+
+
+def _host() -> str:
+    hosts = [host for host in settings.ALLOWED_HOSTS if "*" not in host]
+    return hosts[0].lstrip(".") if hosts else "localhost"
+
+
+def _path(url_name, language, *args) -> str:
+    with translation.override(language):
+        return reverse(url_name, args=args)
+
+
+def _file(path) -> Path:
+    return Path(settings.PUBLIC_SITE_ROOT) / path.strip("/") / "index.html"
+
+
+def _write(path, content):
+    """Write the page of path, replacing the previous file in one step."""
+    target = _file(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, tmp_name = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as tmp_file:
+        tmp_file.write(content)
+    os.chmod(tmp_name, 0o644)
+    os.replace(tmp_name, target)
+
+
+def _remove(path) -> bool:
+    target = _file(path)
+    try:
+        target.unlink()
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def _handler() -> BaseHandler:
+    handler = BaseHandler()
+    handler.load_middleware()
+    return handler
+
+
+def _request(path) -> WSGIRequest:
+    """Return the anonymous HTTPS GET request of path, as the web server sends it."""
+    host = _host()
+    return WSGIRequest(
+        {
+            "REQUEST_METHOD": "GET",
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": "",
+            "SERVER_NAME": host,
+            "SERVER_PORT": "443",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": host,
+            "wsgi.url_scheme": "https",
+            "wsgi.input": BytesIO(),
+        }
+    )
+
+
+def _render(handler, path) -> bool:
+    """Render path as an anonymous visitor and write it, return True on success."""
+    try:
+        response = handler.get_response(_request(path))
+        try:
+            if response.status_code != 200:
+                logger.warning(
+                    "Public page %s not rendered, status %s",
+                    path,
+                    response.status_code,
+                )
+                return False
+            _write(path, response.content)
+        finally:
+            response.close()
+    except Exception:
+        logger.exception("Public page %s not rendered", path)
+        return False
+    return True
+
+
+def render_pages(plant_ids=None, listings=True) -> tuple[int, int]:
+    """Render the profile pages of plant_ids and the listing pages.
+
+    plant_ids None renders every public plant profile. The pages of plants that
+    are no longer public are removed. Return (pages written, pages removed).
+    """
+    public = models.PlantProfile.objects.all()
+    if plant_ids is not None:
+        public = public.filter(id__in=plant_ids)
+    public_ids = set(public.values_list("id", flat=True))
+    if plant_ids is None:
+        hidden_ids = set(
+            models.PlantProfile.all_objects.exclude(id__in=public_ids).values_list(
+                "id", flat=True
+            )
+        )
+    else:
+        hidden_ids = set(plant_ids) - public_ids
+
+    handler = _handler()
+    written = removed = 0
+    for language in _languages():
+        # LocaleMiddleware leaves the language of the last page active in the thread
+        with translation.override(language):
+            if listings:
+                for url_name in LISTING_PAGES:
+                    written += _render(handler, _path(url_name, language))
+            for plant_id in sorted(public_ids):
+                written += _render(handler, _path(PROFILE_PAGE, language, plant_id))
+            for plant_id in sorted(hidden_ids):
+                removed += _remove(_path(PROFILE_PAGE, language, plant_id))
+    return written, removed
+
+
+def render_site() -> tuple[int, int]:
+    """Render every public page, return (pages written, pages removed)."""
+    return render_pages()
+
+
+def refresh(plant_ids):
+    """Queue the rendering of the pages showing plant_ids, when enabled.
+
+    Call it once the change is committed, the task reads the new rows.
+    """
+    if not settings.PUBLIC_SITE_RENDER:
+        return
+    from project.tasks import render_public_pages_task
+
+    render_public_pages_task.delay(sorted(set(plant_ids)))
+
+
+def refresh_site():
+    """Queue the rendering of every page, when enabled.
+
+    Call it once a change of the library settings is committed.
+    """
+    if not settings.PUBLIC_SITE_RENDER:
+        return
+    from project.tasks import render_public_pages_task
+
+    render_public_pages_task.delay(None)
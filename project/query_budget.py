@@ -0,0 +1,157 @@
+"""SQL query budgets of the views.
+
+record() counts the queries run on every database connection, the repeated ones and
+their time. QueryBudgetMiddleware records each request when
+settings.QUERY_BUDGET_ENABLED is set, and logs the views going over their budget
+or repeating a query more than settings.QUERY_BUDGET_DUPLICATES times, the usual
+sign of an N+1 loop. The counts include the middleware queries, e.g. the session.
+
+A view declares its budget with the query_budget decorator, the views without one
+use settings.QUERY_BUDGET_DEFAULT:
+
+    @query_budget(6)
+    def blooming_calendar(request):
+        ...
+
+The test suite enforces the budgets with assert_within_budget(), or the
+within_query_budget pytest fixture of project/conftest.py.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import resolve
+
+logger = logging.getLogger(__name__)
+
+# Literal values, so the same query with other parameters counts as a repeat
+_LITERALS_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+@dataclass
+class QueryStats:
+    """Queries run while recording."""
+
+    count: int = 0
+    time: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+    # Seconds spent on each statement
+    durations: Counter = field(default_factory=Counter)
+
+    @property
+    def duplicates(self) -> int:
+        """Return the number of queries repeating a previous statement."""
+        return sum(count - 1 for count in self.statements.values())
+
+    def most_repeated(self, limit=3) -> list[tuple[str, int]]:
+        """Return the most repeated statements with their count."""
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common(limit)
+            if count > 1
+        ]
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            statement = _LITERALS_RE.sub("?", sql)
+            self.time += duration
+            self.count += 1
+            self.statements[statement] += 1
+            self.durations[statement] += duration
+
+
+@contextmanager
+def record():
+    """Record the queries run on every database connection."""
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield stats
+
+
+def query_budget(max_queries):
+    """Declare the most queries a view may run, middleware included."""
+
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+
+    return decorator
+
+
+def budget_for(view_func) -> int | None:
+    """Return the query budget of a view, or the default budget."""
+    return getattr(
+        view_func, "query_budget", getattr(settings, "QUERY_BUDGET_DEFAULT", None)
+    )
+
+
+def describe(stats: QueryStats) -> str:
+    lines = [
+        f"{stats.count} queries, {stats.duplicates} repeated, "
+        f"{stats.time * 1000:.1f} ms"
+    ]
+    lines += [f"  {count}x {sql}" for sql, count in stats.most_repeated()]
+    return "\n".join(lines)
+
+
+def assert_within_budget(client, path, budget=None, method="get", **kwargs):
+    """Request path with the test client and fail when it goes over its budget.
+
+    budget defaults to the budget declared by the view of path. Return the response.
+    """
+    if budget is None:
+        budget = budget_for(resolve(path).func)
+    with record() as stats:
+        response = getattr(client, method)(path, **kwargs)
+    if budget is not None and stats.count > budget:
+        raise AssertionError(
+            f"{path} ran over its budget of {budget} queries: {describe(stats)}"
+        )
+    return response
+
+
+class QueryBudgetMiddleware:
+    """Middleware logging the views going over their query budget."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_BUDGET_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with record() as stats:
+            response = self.get_response(request)
+        request.query_stats = stats
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = budget_for(match.func)
+        over_budget = budget is not None and stats.count > budget
+        repeated = stats.duplicates > settings.QUERY_BUDGET_DUPLICATES
+        log = logger.warning if over_budget or repeated else logger.debug
+        log(
+            "%s %s (%s, budget %s): %s",
+            request.method,
+            request.path,
+            match.view_name,
+            budget,
+            describe(stats),
+        )
+        response["Server-Timing"] = (
+            f'db;dur={stats.time * 1000:.1f};desc="{stats.count} queries"'
+        )
+        return response
@@ -0,0 +1,87 @@
+"""Shared cache of the plant catalogue search results.
+
+The ordered (latin_name, id) keys of the plants matched by a PlantProfileFilter,
+and their sidebar facet counts, are kept in the Django cache so a repeated search
+only queries the cards of the page shown. Entries are keyed by:
+
+- the canonical form of the filter parameters: only the filter names, empty values
+  dropped, names and values sorted, so pagination and unrelated parameters share
+  one entry;
+- the visibility split, authenticated users also see the inactive plants;
+- the catalogue and lookup version stamps, bumped on every plant profile write
+  (see project.cache_versions), so stale entries are never read again.
+
+The stamps are only seen by every process with a shared cache, see
+cache_versions.is_shared(), otherwise every search is run again.
+
+The keys are sorted in Python rather than by the database collation, so they are
+in the order project.pagination bisects them in.
+"""
+
+import hashlib
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+from project import cache_versions, facets, metrics, pagination
+
+_KEY_PREFIX = "plant-results"
+# Stale entries are never read again once the stamps move on, let them expire.
+TIMEOUT = 60 * 60
+
+
+def canonical_params(filterset) -> str:
+    """Return the filter parameters of filterset in canonical form."""
+    data = filterset.data
+    getlist = getattr(data, "getlist", None)
+    params = []
+    for name in sorted(filterset.filters):
+        values = getlist(name) if getlist else [data.get(name)]
+        values = {str(value).strip() for value in values if value is not None}
+        params.extend((name, value) for value in sorted(values) if value)
+    return urlencode(params)
+
+
+def _key(kind, filterset, authenticated):
+    visibility = "all" if authenticated else "public"
+    digest = hashlib.sha256(canonical_params(filterset).encode()).hexdigest()
+    return ":".join(
+        [
+            _KEY_PREFIX,
+            kind,
+            str(cache_versions.get_version(cache_versions.CATALOGUE)),
+            str(cache_versions.get_version(cache_versions.LOOKUPS)),
+            visibility,
+            digest,
+        ]
+    )
+
+
+def _query_keys(filterset):
+    return sorted(filterset.qs.order_by().values_list(*pagination.ORDERING))
+
+
+def result_keys(filterset, authenticated) -> list[tuple[str, int]]:
+    """Return the (latin_name, id) of the plants matched by filterset, in order."""
+    if not cache_versions.is_shared():
+        return _query_keys(filterset)
+    key = _key("keys", filterset, authenticated)
+    keys = cache.get(key)
+    metrics.cache_lookup("plant-results", keys is not None)
+    if keys is None:
+        keys = _query_keys(filterset)
+        cache.set(key, keys, TIMEOUT)
+    return keys
+
+
+def facet_counts(filterset, authenticated) -> dict[str, int]:
+    """Return the cached facet counts of filterset, see project.facets."""
+    if not cache_versions.is_shared():
+        return facets.facet_counts(filterset)
+    key = _key("facets", filterset, authenticated)
+    counts = cache.get(key)
+    metrics.cache_lookup("plant-facets", counts is not None)
+    if counts is None:
+        counts = facets.facet_counts(filterset)
+        cache.set(key, counts, TIMEOUT)
+    return counts
@@ -0,0 +1,204 @@
+"""Ranked full-text search over the plant catalogue.
+
+The searched text lives in PlantSearchDocument: names, obsolete names and published
+narratives, accent-folded. A backend returns plant profile ids ordered by
+relevance, with prefix matching on every word of the query and a fuzzy fallback
+for typos:
+
+- SQLiteSearchBackend uses the FTS5 index project_plantsearchindex, kept in sync
+  with the documents by triggers (see migration 0148). Misspelled words are
+  replaced by their closest indexed terms.
+- PostgresSearchBackend ranks a tsvector match and falls back on pg_trgm word
+  similarity.
+- SearchBackend, the default for other databases, matches the folded words with
+  icontains.
+
+get_backend() picks the backend for the default database, settings.PLANT_SEARCH_BACKEND
+can name another one by dotted path. search(names_only=True) leaves out the
+narratives, for the searches of a plant by its name.
+"""
+
+import difflib
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+from project.normalize import fold_text
+
+WORD_RE = re.compile(r"\w+")
+
+# Columns of the names and obsolete names, without the narratives
+NAME_COLUMNS = ("names", "synonyms")
+
+# Weights of the names, synonyms and narrative columns
+NAMES_WEIGHT = 10.0
+SYNONYMS_WEIGHT = 5.0
+NARRATIVE_WEIGHT = 1.0
+# Most plant ids ranked by rank_queryset(), one CASE branch each
+MAX_RANKED = 200
+
+
+def query_words(query):
+    """Return the accent-folded words of a search query."""
+    return WORD_RE.findall(fold_text(query or ""))
+
+
+class SearchBackend:
+    """Portable backend matching every word with icontains, names ranked first."""
+
+    def search(self, query, limit=None, names_only=False):
+        """Return the ids of the plant profiles matching query, best match first.
+
+        names_only matches the names and obsolete names, not the narratives.
+        """
+        words = query_words(query)
+        if not words:
+            return []
+        ids = self._search(words, names_only)
+        return ids[:limit] if limit else ids
+
+    def _search(self, words, names_only):
+        from project.models import PlantSearchDocument
+
+        columns = NAME_COLUMNS if names_only else NAME_COLUMNS + ("narrative",)
+        condition = Q()
+        for word in words:
+            word_condition = Q()
+            for column in columns:
+                word_condition |= Q(**{f"{column}__icontains": word})
+            condition &= word_condition
+        rank = Case(
+            When(names__icontains=words[0], then=Value(0)),
+            When(synonyms__icontains=words[0], then=Value(1)),
+            default=Value(2),
+            output_field=IntegerField(),
+        )
+        return list(
+            PlantSearchDocument.objects.filter(condition)
+            .annotate(search_rank=rank)
+            .order_by("search_rank", "names")
+            .values_list("plant_profile_id", flat=True)
+        )
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 backend ranked with bm25."""
+
+    table = "project_plantsearchindex"
+    vocabulary_table = "project_plantsearchvocab"
+    # Highest difflib ratio a replacement term must reach
+    fuzzy_cutoff = 0.75
+
+    def _search(self, words, names_only):
+        ids = self._match(" ".join(f'"{word}"*' for word in words), names_only)
+        if ids:
+            return ids
+        groups = []
+        for word in words:
+            terms = [word] + self._close_terms(word)
+            groups.append("(" + " OR ".join(f'"{term}"*' for term in terms) + ")")
+        return self._match(" AND ".join(groups), names_only)
+
+    def _match(self, expression, names_only):
+        if names_only:
+            # An FTS5 column filter
+            expression = f"{{{' '.join(NAME_COLUMNS)}}} : ({expression})"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+                f"ORDER BY bm25({self.table}, %s, %s, %s)",
+                [expression, NAMES_WEIGHT, SYNONYMS_WEIGHT, NARRATIVE_WEIGHT],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def _close_terms(self, word):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT term FROM {self.vocabulary_table} "
+                "WHERE length(term) BETWEEN %s AND %s",
+                [len(word) - 2, len(word) + 2],
+            )
+            terms = [row[0] for row in cursor.fetchall()]
+        return difflib.get_close_matches(word, terms, n=3, cutoff=self.fuzzy_cutoff)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector backend with a pg_trgm similarity fallback."""
+
+    # Lowest word similarity accepted for a fuzzy match
+    similarity_threshold = 0.3
+
+    def _search(self, words, names_only):
+        from django.contrib.postgres.search import (
+            SearchQuery,
+            SearchRank,
+            SearchVector,
+            TrigramWordSimilarity,
+        )
+
+        from project.models import PlantSearchDocument
+
+        vector = SearchVector("names", weight="A", config="simple")
+        vector += SearchVector("synonyms", weight="B", config="simple")
+        if not names_only:
+            vector += SearchVector("narrative", weight="C", config="simple")
+        search_query = SearchQuery(
+            " & ".join(f"{word}:*" for word in words),
+            search_type="raw",
+            config="simple",
+        )
+        text = " ".join(words)
+        return list(
+            PlantSearchDocument.objects.annotate(
+                rank=SearchRank(vector, search_query),
+                similarity=Greatest(
+                    TrigramWordSimilarity(text, "names"),
+                    TrigramWordSimilarity(text, "synonyms"),
+                ),
+            )
+            .filter(Q(rank__gt=0) | Q(similarity__gte=self.similarity_threshold))
+            .order_by(Greatest(F("rank"), F("similarity")).desc(), "names")
+            .values_list("plant_profile_id", flat=True)
+        )
+
+
+VENDOR_BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_backend():
+    """Return the search backend for the default database."""
+    backend_path = getattr(settings, "PLANT_SEARCH_BACKEND", None)
+    if backend_path:
+        return import_string(backend_path)()
+    return VENDOR_BACKENDS.get(connection.vendor, SearchBackend)()
+
+
+def search(query, limit=None, names_only=False):
+    """Return the ids of the plant profiles matching query, best match first."""
+    return get_backend().search(query, limit=limit, names_only=names_only)
+
+
+def rank_queryset(queryset, ids):
+    """Restrict a PlantProfile queryset to ids, ordered as in ids.
+
+    Only the first MAX_RANKED ids are ranked, the other matches follow them in
+    latin name order.
+    """
+    if not ids:
+        return queryset.none()
+    ranking = Case(
+        *[
+            When(id=plant_id, then=Value(rank))
+            for rank, plant_id in enumerate(ids[:MAX_RANKED])
+        ],
+        default=Value(MAX_RANKED),
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).order_by(ranking, "latin_name")
@@ -1,17 +1,63 @@
 """
 Django signals for the project app.
-Automatically sends emails when orders are created.
-This module is imported in the ready() method of ProjectConfig in apps.py.
-It is not really used anymore since we moved email sending to Celery tasks,
-but kept here for reference.
+This module is imported in the ready() method of ProjectConfig in apps.py, its
+receivers keep the derived data of the project in step with the edits.
+
+They bump the cache version stamps when the plant catalogue or the lookup tables
+of the filter sidebar change, evict the cached plant profile page bodies showing
+a changed row and the cached groups of the users whose groups change, reload the
+library settings of every worker after an edit and render the public pages
+again, and refresh the full-text search documents and catalogue cards of the
+edited plant profiles, the item totals of the orders whose items are edited, and
+the order statistics rollups of project.order_statistics.
+
+The order emails are sent by the Celery tasks of project.tasks, queued by the
+checkout. send_order_confirmation only logs the new orders.
 """
 
 import logging
 
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 
-from project.models import Order
+from project import (
+    acl_handler,
+    cache_versions,
+    librarysettings,
+    order_statistics,
+    profile_fragments,
+    public_site,
+)
+from project.models import (
+    BeeSpecies,
+    BloomColour,
+    ButterflySpecies,
+    Customer,
+    Ecozone,
+    GrowthHabit,
+    LibrarySetting,
+    NonNativeSpecies,
+    ObsoleteNames,
+    Order,
+    OrderItem,
+    PlantCard,
+    PlantComplementary,
+    PlantImage,
+    PlantLifespan,
+    PlantNarrative,
+    PlantProfile,
+    PlantSearchDocument,
+    ProjectUser,
+    StratificationDuration,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -34,3 +80,264 @@ def send_order_confirmation(sender, instance, created, **kwargs):
             instance.customer.first_name,
             instance.customer.last_name,
         )
+
+
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def update_order_totals(sender, instance, **kwargs):
+    # Orders placed from a cart get their totals with their items, in bulk
+    Order.update_totals(instance.order_id)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_statistics(sender, instance, **kwargs):
+    """Read what a changed order added to the statistics rollups before its save."""
+    if not instance._state.adding:
+        instance._stored_statistics = order_statistics.stored_order_facts(instance.pk)
+
+
+@receiver(post_save, sender=Order)
+def record_order_statistics(sender, instance, created, **kwargs):
+    """Add a new order to the statistics rollups, or move a changed one."""
+    old = None if created else getattr(instance, "_stored_statistics", None)
+    order_statistics.record_order(old, order_statistics.order_facts(instance))
+
+
+@receiver(post_delete, sender=Order)
+def record_order_statistics_on_delete(sender, instance, **kwargs):
+    order_statistics.record_order(order_statistics.order_facts(instance), None)
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_statistics(sender, instance, **kwargs):
+    """Read the plant and quantity of a changed order item before its save."""
+    if not instance._state.adding:
+        instance._stored_statistics = dict(
+            OrderItem.objects.filter(pk=instance.pk).values_list(
+                "plant_profile_id", "quantity"
+            )
+        )
+
+
+@receiver(post_save, sender=OrderItem)
+def record_item_statistics(sender, instance, created, **kwargs):
+    old = {} if created else getattr(instance, "_stored_statistics", {})
+    order_statistics.record_items(old, {instance.plant_profile_id: instance.quantity})
+
+
+@receiver(post_delete, sender=OrderItem)
+def record_item_statistics_on_delete(sender, instance, **kwargs):
+    order_statistics.record_items({instance.plant_profile_id: instance.quantity}, {})
+
+
+@receiver(pre_save, sender=Customer)
+def remember_customer_location(sender, instance, **kwargs):
+    """Read the stored address of a changed customer before its save."""
+    if not instance._state.adding:
+        instance._stored_location = (
+            Customer.objects.filter(pk=instance.pk)
+            .values(*order_statistics.LOCATION_FIELDS)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Customer)
+def record_customer_location(sender, instance, created, **kwargs):
+    """Move the orders of a customer whose address changed in the rollups."""
+    old = None if created else getattr(instance, "_stored_location", None)
+    if old is None:
+        return
+    new = {name: getattr(instance, name) for name in order_statistics.LOCATION_FIELDS}
+    if old != new:
+        order_statistics.record_customer_move(instance.pk, old, new)
+
+
+@receiver(post_save, sender=PlantProfile)
+@receiver(post_delete, sender=PlantProfile)
+@receiver(post_save, sender=PlantLifespan)
+@receiver(post_delete, sender=PlantLifespan)
+@receiver(post_save, sender=ObsoleteNames)
+@receiver(post_delete, sender=ObsoleteNames)
+@receiver(post_save, sender=NonNativeSpecies)
+@receiver(post_delete, sender=NonNativeSpecies)
+@receiver(post_save, sender=BeeSpecies)
+@receiver(post_delete, sender=BeeSpecies)
+@receiver(post_save, sender=ButterflySpecies)
+@receiver(post_delete, sender=ButterflySpecies)
+def bump_catalogue_version(sender, instance, **kwargs):
+    """Invalidate the per-process catalogue structures after a plant profile change."""
+    cache_versions.bump_version_on_commit(cache_versions.CATALOGUE)
+
+
+@receiver(m2m_changed, sender=PlantProfile.ecozones.through)
+@receiver(m2m_changed, sender=PlantProfile.bees.through)
+@receiver(m2m_changed, sender=PlantProfile.butterflies.through)
+@receiver(m2m_changed, sender=PlantProfile.substitute_for_non_native.through)
+def bump_catalogue_version_on_m2m_change(sender, instance, action, **kwargs):
+    """Invalidate the per-process catalogue structures after a relation change."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        cache_versions.bump_version_on_commit(cache_versions.CATALOGUE)
+
+
+@receiver(post_save, sender=Ecozone)
+@receiver(post_delete, sender=Ecozone)
+@receiver(post_save, sender=GrowthHabit)
+@receiver(post_delete, sender=GrowthHabit)
+@receiver(post_save, sender=BloomColour)
+@receiver(post_delete, sender=BloomColour)
+@receiver(post_save, sender=StratificationDuration)
+@receiver(post_delete, sender=StratificationDuration)
+def bump_lookups_version(sender, instance, **kwargs):
+    """Invalidate the cached filter sidebar schema after a lookup table change."""
+    cache_versions.bump_version_on_commit(cache_versions.LOOKUPS)
+
+
+@receiver(post_save, sender=PlantProfile)
+def refresh_plant_search_document(sender, instance, update_fields=None, **kwargs):
+    """Reindex a plant profile whose names may have changed."""
+    if update_fields is not None and not (
+        set(update_fields) & PlantProfile.SEARCH_NAME_FIELDS
+    ):
+        return
+    PlantSearchDocument.refresh([instance.pk])
+
+
+@receiver(post_save, sender=ObsoleteNames)
+@receiver(post_save, sender=PlantNarrative)
+def refresh_related_search_document(sender, instance, **kwargs):
+    """Reindex the plant profile of a saved obsolete name or narrative."""
+    PlantSearchDocument.refresh([instance.plant_profile_id])
+
+
+@receiver(post_delete, sender=ObsoleteNames)
+@receiver(post_delete, sender=PlantNarrative)
+def refresh_related_search_document_on_delete(sender, instance, **kwargs):
+    """Reindex the plant profile of a deleted obsolete name or narrative.
+
+    The refresh waits for the commit: when a plant profile is deleted with its
+    obsolete names, its document must not be recreated.
+    """
+    plant_id = instance.plant_profile_id
+    transaction.on_commit(lambda: PlantSearchDocument.refresh([plant_id]))
+
+
+@receiver(post_save, sender=PlantProfile)
+def refresh_plant_card(sender, instance, update_fields=None, **kwargs):
+    """Refresh the catalogue card of a plant profile whose card fields may have changed."""
+    if update_fields is not None and not set(update_fields) & PlantCard.PLANT_FIELDS:
+        return
+    PlantCard.refresh([instance.pk])
+
+
+@receiver(post_save, sender=PlantImage)
+def refresh_plant_card_image(sender, instance, **kwargs):
+    """Refresh the catalogue card showing the first image of a plant profile."""
+    PlantCard.refresh([instance.plant_profile_id])
+
+
+@receiver(post_delete, sender=PlantImage)
+def refresh_plant_card_image_on_delete(sender, instance, **kwargs):
+    """Refresh the catalogue card of a plant profile once its image deletion is committed."""
+    plant_id = instance.plant_profile_id
+    transaction.on_commit(lambda: PlantCard.refresh([plant_id]))
+
+
+@receiver(post_save, sender=GrowthHabit)
+def refresh_plant_card_growth_habit(sender, instance, **kwargs):
+    """Copy a renamed growth habit on the catalogue cards of its plant profiles."""
+    PlantCard.objects.filter(plant_profile__growth_habit=instance).update(
+        growth_habit_slug=instance.growth_habit_en or ""
+    )
+
+
+@receiver(post_save, sender=PlantProfile)
+@receiver(pre_delete, sender=PlantProfile)
+@receiver(post_save, sender=PlantImage)
+@receiver(pre_delete, sender=PlantImage)
+@receiver(post_save, sender=PlantNarrative)
+@receiver(pre_delete, sender=PlantNarrative)
+@receiver(post_save, sender=ObsoleteNames)
+@receiver(pre_delete, sender=ObsoleteNames)
+@receiver(post_save, sender=PlantComplementary)
+@receiver(pre_delete, sender=PlantComplementary)
+def evict_plant_profile_bodies(sender, instance, **kwargs):
+    """Evict the cached profile page bodies showing a changed row.
+
+    Deletions are handled before the rows go, while the profiles showing them can
+    still be found.
+    """
+    profile_fragments.evict_on_commit(profile_fragments.plants_using(instance))
+
+
+# The lookup rows shown on the profile pages: every foreign key and many-to-many
+# target of PlantProfile, the narrative types and the image morphology aspects.
+for lookup_model in profile_fragments.dependencies():
+    post_save.connect(
+        evict_plant_profile_bodies,
+        sender=lookup_model,
+        dispatch_uid=f"profile-bodies-save-{lookup_model._meta.label_lower}",
+    )
+    pre_delete.connect(
+        evict_plant_profile_bodies,
+        sender=lookup_model,
+        dispatch_uid=f"profile-bodies-delete-{lookup_model._meta.label_lower}",
+    )
+
+
+@receiver(m2m_changed, sender=PlantProfile.ecozones.through)
+@receiver(m2m_changed, sender=PlantProfile.bees.through)
+@receiver(m2m_changed, sender=PlantProfile.butterflies.through)
+@receiver(m2m_changed, sender=PlantProfile.substitute_for_non_native.through)
+def evict_plant_profile_bodies_on_m2m_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Evict the cached profile page bodies of the plants whose relations changed."""
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            profile_fragments.evict_on_commit([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        profile_fragments.evict_on_commit(pk_set)
+    elif action == "pre_clear":
+        # The related row is cleared from every plant, find them while linked
+        target = next(
+            field.name
+            for field in sender._meta.fields
+            if field.related_model is type(instance)
+        )
+        profile_fragments.evict_on_commit(
+            sender.objects.filter(**{target: instance}).values_list(
+                "plantprofile_id", flat=True
+            )
+        )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_groups_version(sender, instance, **kwargs):
+    """Invalidate every cached group membership after a group change."""
+    cache_versions.bump_version_on_commit(cache_versions.GROUPS)
+
+
+@receiver(m2m_changed, sender=ProjectUser.groups.through)
+def evict_user_groups_on_m2m_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    """Evict the cached groups of the users added to or removed from a group."""
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            acl_handler.evict_user_groups_on_commit([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        acl_handler.evict_user_groups_on_commit(pk_set)
+    elif action == "post_clear":
+        cache_versions.bump_version_on_commit(cache_versions.GROUPS)
+
+
+@receiver(post_save, sender=LibrarySetting)
+@receiver(post_delete, sender=LibrarySetting)
+def reload_library_settings(sender, instance, **kwargs):
+    """Make every worker reload the library settings once the change is committed.
+
+    The public pages show the settings in their navigation, render them again.
+    """
+    transaction.on_commit(librarysettings.invalidate)
+    transaction.on_commit(public_site.refresh_site)
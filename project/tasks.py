@@ -1,6 +1,7 @@
 from celery import shared_task
 from django.core.exceptions import ObjectDoesNotExist
 
+from project import public_site
 from project.models import Order
 from project.utils import send_donation_thank_you_email, send_order_confirmation_email
 
@@ -21,3 +22,9 @@ def send_donation_thank_you_task(order_id):
     except ObjectDoesNotExist:
         return False
     return send_donation_thank_you_email(order)
+
+
+@shared_task
+def render_public_pages_task(plant_ids):
+    written, removed = public_site.render_pages(plant_ids)
+    return {"written": written, "removed": removed}
@@ -0,0 +1,17 @@
+from django import template
+from django.utils.html import format_html
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def facet_count(context, *parts):
+    # Placeholder for the match count of a sidebar option, the search results
+    # replace it out of band, see project/filters/_facet_counts.html
+    facet_id = "".join(str(part) for part in parts)
+    count = (context.get("facet_counts") or {}).get(facet_id)
+    return format_html(
+        '<span id="facet-count-{}" class="facet-count">{}</span>',
+        facet_id,
+        "" if count is None else f"({count})",
+    )
@@ -1,8 +1,15 @@
 from django.db.models import QuerySet
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from project import bitmap_index, cache_versions, facets, filter_schema
 from project.filters import PlantProfileFilter
-from project.models import NonNativeSpecies, PlantProfile, StratificationDuration
+from project.models import (
+    Ecozone,
+    GrowthHabit,
+    NonNativeSpecies,
+    PlantProfile,
+    StratificationDuration,
+)
 
 
 class TestPlantProfileFilter(TestCase):
@@ -81,3 +88,186 @@ class TestPlantProfileFilter(TestCase):
         )
 
         self.assertNotIn(native_alternative, filtered)
+
+    def test_filter_normalized_plant_name_ignores_accents_and_case(self):
+        erable = PlantProfile.objects.create(
+            latin_name="Acer saccharum", french_name="Érable à sucre"
+        )
+        PlantProfile.objects.create(latin_name="Betula papyrifera")
+
+        filtered = self.filter.filter_normalized_plant_name(
+            self.queryset, "any_plant_name", "ERABLE a"
+        )
+
+        self.assertEqual(list(filtered), [erable])
+
+    def test_filter_normalized_plant_name_does_not_match_across_names(self):
+        PlantProfile.objects.create(
+            latin_name="Acer saccharum", english_name="Sugar Maple"
+        )
+
+        filtered = self.filter.filter_normalized_plant_name(
+            self.queryset, "any_plant_name", "saccharum sugar"
+        )
+
+        self.assertFalse(filtered.exists())
+
+    def test_filter_non_native_name_matches_translated_english_name(self):
+        native_alternative = PlantProfile.objects.create(latin_name="Cornus sericea")
+        PlantProfile.objects.create(latin_name="Betula papyrifera")
+        non_native = NonNativeSpecies.objects.create(
+            latin_name="Euonymus alatus",
+            english_name_en="Burning Bush",
+            english_name_fr="Fusain ailé",
+        )
+        native_alternative.substitute_for_non_native.add(non_native)
+
+        filtered = self.filter.filter_non_native_name(
+            self.queryset, "non_native_name", "FUSAIN AILE"
+        )
+
+        self.assertEqual(list(filtered), [native_alternative])
+
+
+@override_settings(PLANT_BITMAP_INDEX=True, CACHE_SHARED=True)
+class TestPlantProfileFilterBitmapIndex(TestCase):
+    def setUp(self):
+        self.ecozone = Ecozone.objects.create(ecozone="Mixedwood Plains")
+        self.sunny = PlantProfile.objects.create(
+            latin_name="Asclepias tuberosa", full_sun=True, moisture_dry=True
+        )
+        self.sunny_wet = PlantProfile.objects.create(
+            latin_name="Asclepias incarnata", full_sun=True, moisture_wet=True
+        )
+        self.shady = PlantProfile.objects.create(
+            latin_name="Asarum canadense", full_shade=True, produces_burs=True
+        )
+        self.sunny.ecozones.add(self.ecozone)
+        cache_versions.bump_version(cache_versions.CATALOGUE)
+        cache_versions.bump_version(cache_versions.LOOKUPS)
+
+    def search(self, data):
+        return list(
+            PlantProfileFilter(data, queryset=PlantProfile.objects.order_by("id")).qs
+        )
+
+    def test_boolean_facets_are_combined(self):
+        self.assertEqual(self.search({"full_sun": "on"}), [self.sunny, self.sunny_wet])
+        self.assertEqual(
+            self.search({"full_sun": "on", "moisture_wet": "on"}), [self.sunny_wet]
+        )
+
+    def test_excludes_and_ecozone_facets(self):
+        self.assertEqual(
+            self.search({"produces_burs": "on"}), [self.sunny, self.sunny_wet]
+        )
+        self.assertEqual(
+            self.search({f"ecozone_{self.ecozone.id}": self.ecozone.id}), [self.sunny]
+        )
+
+    def test_index_is_rebuilt_after_a_committed_edit(self):
+        self.assertEqual(self.search({"full_shade": "on"}), [self.shady])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sunny.full_shade = True
+            self.sunny.save()
+        self.assertEqual(self.search({"full_shade": "on"}), [self.sunny, self.shady])
+
+    def test_matches_database_filters(self):
+        data = {"full_sun": "on", "latin_name": "incarnata"}
+        with override_settings(PLANT_BITMAP_INDEX=False):
+            expected = self.search(data)
+        self.assertEqual(self.search(data), expected)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_index_is_not_used_without_a_shared_cache(self):
+        self.assertIsNone(bitmap_index.get_index())
+        self.assertEqual(self.search({"full_sun": "on"}), [self.sunny, self.sunny_wet])
+
+
+class TestPlantProfileFacetCounts(TestCase):
+    def setUp(self):
+        self.ecozone = Ecozone.objects.create(ecozone="Boreal Shield")
+        self.other_ecozone = Ecozone.objects.create(ecozone="Mixedwood Plains")
+        self.shrub = GrowthHabit.objects.create(growth_habit="Shrub")
+        sunny = PlantProfile.objects.create(
+            latin_name="Rhus typhina",
+            full_sun=True,
+            is_native_to_ON=True,
+            growth_habit=self.shrub,
+        )
+        sunny.ecozones.add(self.ecozone, self.other_ecozone)
+        PlantProfile.objects.create(
+            latin_name="Asarum canadense", full_shade=True, produces_burs=True
+        )
+        PlantProfile.objects.create(
+            latin_name="Asclepias tuberosa", full_sun=True, produces_burs=True
+        )
+        cache_versions.bump_version(cache_versions.LOOKUPS)
+
+    def counts(self, data):
+        return facets.facet_counts(
+            PlantProfileFilter(data, queryset=PlantProfile.objects.all())
+        )
+
+    def assert_counts(self):
+        counts = self.counts({"full_sun": "on"})
+        self.assertEqual(counts["full_sun"], 2)
+        self.assertEqual(counts["full_shade"], 0)
+        self.assertEqual(counts["produces_burs"], 1)
+        self.assertEqual(counts["is_native_to_ON"], 1)
+        self.assertEqual(counts[f"growth_habit_{self.shrub.id}"], 1)
+        self.assertEqual(counts[f"ecozone_{self.ecozone.id}"], 1)
+
+        # Filtering on an ecozone does not hide the plant's other ecozones
+        counts = self.counts({f"ecozone_{self.ecozone.id}": self.ecozone.id})
+        self.assertEqual(counts[f"ecozone_{self.other_ecozone.id}"], 1)
+        self.assertEqual(counts["full_sun"], 1)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_counts_from_aggregate_query(self):
+        filterset = PlantProfileFilter(
+            {"full_sun": "on"}, queryset=PlantProfile.objects.all()
+        )
+        # The facet lookup ids come from the cached filter schema, every count
+        # from one aggregate query
+        with self.assertNumQueries(1):
+            facets.facet_counts(filterset)
+        self.assert_counts()
+
+    @override_settings(PLANT_BITMAP_INDEX=True, CACHE_SHARED=True)
+    def test_counts_from_bitmap_index(self):
+        cache_versions.bump_version(cache_versions.CATALOGUE)
+        self.assert_counts()
+
+
+@override_settings(CACHE_SHARED=True)
+class TestFilterSchema(TestCase):
+    def setUp(self):
+        self.ecozone = Ecozone.objects.create(ecozone="Boreal Shield")
+        self.shrub = GrowthHabit.objects.create(growth_habit="Shrub")
+        cache_versions.bump_version(cache_versions.LOOKUPS)
+
+    def test_schema_is_cached(self):
+        schema = filter_schema.get_filter_schema()
+        self.assertEqual(schema.ecozone_ids, [self.ecozone.id])
+        self.assertIn(f"#growth_habit_{self.shrub.id}", schema.hx_include)
+        self.assertIn(f"#ecozone_{self.ecozone.id}", schema.hx_include)
+        with self.assertNumQueries(0):
+            cached = filter_schema.get_filter_schema()
+            PlantProfileFilter()
+        self.assertEqual(cached.ecozone_ids, schema.ecozone_ids)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_schema_is_not_cached_without_a_shared_cache(self):
+        filter_schema.get_filter_schema()
+        other = Ecozone.objects.create(ecozone="Atlantic Maritime")
+        schema = filter_schema.get_filter_schema()
+        self.assertEqual(schema.ecozone_ids, [other.id, self.ecozone.id])
+
+    def test_schema_is_rebuilt_after_a_lookup_change(self):
+        filter_schema.get_filter_schema()
+        with self.captureOnCommitCallbacks(execute=True):
+            other = Ecozone.objects.create(ecozone="Atlantic Maritime")
+        schema = filter_schema.get_filter_schema()
+        self.assertEqual(schema.ecozone_ids, [other.id, self.ecozone.id])
+        self.assertIn(f"ecozone_{other.id}", PlantProfileFilter().filters)
@@ -1,14 +1,24 @@
+import shutil
+import tempfile
 from io import StringIO
+from pathlib import Path
+from unittest.mock import patch
 
+from django.conf import settings
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from django.test import TestCase, override_settings
 
+from project import librarysettings, public_site, tasks
+from project.management.commands.create_dummy_orders import DEBUG_ORDER_NOTE
 from project.models import (
     Customer,
+    LibrarySetting,
     Order,
     OrderItem,
     OrderSeedApplication,
+    OrderYearStatistic,
+    PlantOrderStatistic,
     PlantProfile,
     StratificationDuration,
 )
@@ -203,3 +213,151 @@ class DeleteDebugOrdersCommandTest(TestCase):
             Order.objects.exclude(id=real_order.id).count(),
             0,
         )
+
+
+class LoadtestShopCommandTest(TestCase):
+    def setUp(self):
+        for i in range(10):
+            PlantProfile.objects.create(latin_name=f"Load Test Plant {i}")
+        LibrarySetting.objects.create(is_shop_open=True, is_accepting_donations=True)
+        librarysettings.invalidate()
+
+    @override_settings(DEBUG=True)
+    def test_shoppers_order_within_the_cart_limit(self):
+        stdout = StringIO()
+        # One worker runs the shoppers in the test transaction
+        call_command(
+            "loadtest_shop",
+            "--shoppers",
+            "4",
+            "--workers",
+            "1",
+            "--adds",
+            "10",
+            "--fail-on-issues",
+            stdout=stdout,
+        )
+
+        output = stdout.getvalue()
+        self.assertIn("0 lock error(s), 0 error(s), 0 issue(s)", output)
+        self.assertIn("add-to-cart", output)
+        orders = Order.objects.select_related("customer__application")
+        self.assertEqual(orders.count(), 4)
+        for order in orders:
+            self.assertEqual(order.customer_note, DEBUG_ORDER_NOTE)
+            if order.customer.application.priority != 1:
+                self.assertLessEqual(order.seed_quantity, 15)
+
+    @override_settings(DEBUG=True)
+    def test_closed_shop_is_not_tested(self):
+        LibrarySetting.objects.update(is_shop_open=False)
+        with self.assertRaisesMessage(CommandError, "run openshop first"):
+            call_command("loadtest_shop", "--shoppers", "1")
+
+
+class RebuildOrderStatisticsCommandTest(TestCase):
+    @override_settings(DEBUG=True)
+    def test_backfills_the_rollups(self):
+        for i in range(10):
+            PlantProfile.objects.create(latin_name=f"Rollup Plant {i}")
+        call_command("create_dummy_orders", "--count", "12", "--seed", "3")
+        OrderYearStatistic.objects.all().delete()
+        PlantOrderStatistic.objects.all().delete()
+
+        stdout = StringIO()
+        call_command("rebuild_order_statistics", stdout=stdout)
+
+        years = set(Order.objects.values_list("order_date__year", flat=True))
+        self.assertEqual(
+            set(OrderYearStatistic.objects.values_list("year", flat=True)), years
+        )
+        self.assertEqual(
+            sum(OrderYearStatistic.objects.values_list("order_count", flat=True)), 12
+        )
+        self.assertEqual(
+            sum(PlantOrderStatistic.objects.values_list("seed_quantity", flat=True)),
+            sum(OrderItem.objects.values_list("quantity", flat=True)),
+        )
+        self.assertIn("Order statistics rebuilt", stdout.getvalue())
+
+
+class RebuildSearchIndexCommandTest(TestCase):
+    def test_rebuilds_stale_search_names(self):
+        plant = PlantProfile.objects.create(
+            latin_name="Acer saccharum", french_name="Érable à sucre"
+        )
+        PlantProfile.objects.filter(pk=plant.pk).update(search_name="")
+
+        stdout = StringIO()
+        call_command("rebuild_search_index", stdout=stdout)
+
+        plant.refresh_from_db()
+        self.assertEqual(plant.search_name, "acer saccharum|erable a sucre")
+        self.assertIn("search names updated: 1", stdout.getvalue())
+
+
+class RenderPublicSiteCommandTest(TestCase):
+    def setUp(self):
+        self.public_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.public_root, ignore_errors=True)
+
+    def test_renders_public_profiles_and_removes_inactive_ones(self):
+        plant = PlantProfile.objects.create(latin_name="Acer saccharum")
+        inactive = PlantProfile.objects.create(
+            latin_name="Acer rubrum", is_active=False
+        )
+        stale = Path(self.public_root, "en", "plant-profile-page", str(inactive.pk))
+        stale.mkdir(parents=True)
+        (stale / "index.html").write_text("stale")
+
+        stdout = StringIO()
+        with override_settings(PUBLIC_SITE_ROOT=self.public_root):
+            call_command(
+                "render_public_site",
+                "--plant",
+                str(plant.pk),
+                "--plant",
+                str(inactive.pk),
+                "--no-listings",
+                stdout=stdout,
+            )
+
+        page = Path(
+            self.public_root, "en", "plant-profile-page", str(plant.pk), "index.html"
+        )
+        self.assertIn("Acer saccharum", page.read_text())
+        self.assertFalse((stale / "index.html").exists())
+        self.assertIn("removed: 1", stdout.getvalue())
+
+    def test_failing_page_is_skipped(self):
+        plants = [
+            PlantProfile.objects.create(latin_name=name)
+            for name in ("Acer saccharum", "Acer rubrum")
+        ]
+        write = public_site._write
+
+        def write_or_fail(path, content):
+            if path.endswith(f"/{plants[0].pk}"):
+                raise OSError("No space left on device")
+            write(path, content)
+
+        with (
+            override_settings(PUBLIC_SITE_ROOT=self.public_root),
+            patch.object(public_site, "_write", write_or_fail),
+            self.assertLogs("project.public_site", "ERROR"),
+        ):
+            written, removed = public_site.render_pages(
+                [plant.pk for plant in plants], listings=False
+            )
+        self.assertEqual((written, removed), (len(settings.LANGUAGES), 0))
+        page = Path(self.public_root, "en", "plant-profile-page", str(plants[1].pk))
+        self.assertTrue((page / "index.html").exists())
+
+    @override_settings(PUBLIC_SITE_RENDER=True)
+    def test_settings_change_renders_every_page(self):
+        library_settings = LibrarySetting.objects.create()
+        with patch.object(tasks.render_public_pages_task, "delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                library_settings.is_shop_open = True
+                library_settings.save()
+        delay.assert_called_once_with(None)
@@ -1,7 +1,19 @@
+from unittest.mock import patch
+
 from django.core.exceptions import ValidationError
 from django.test import TestCase
 
-from project.models import PlantProfile
+from project import search_backends
+
+from project.models import (
+    GrowthHabit,
+    NarrativeType,
+    ObsoleteNames,
+    PlantCard,
+    PlantNarrative,
+    PlantProfile,
+)
+from project.pagination import keys_page
 
 
 class PlantProfileHeightValidationTest(TestCase):
@@ -160,3 +172,142 @@ class PlantProfileSearchTest(TestCase):
         """Test searching with text that should return no results."""
         results = PlantProfile.search_plant.plant_name("Pinaceae")
         self.assertEqual(results.count(), 0)
+
+    def test_search_matches_word_prefixes(self):
+        """Test that every query word matches as a prefix, in any name."""
+        results = PlantProfile.search_plant.plant_name("sacch sug")
+        self.assertEqual(list(results), [self.plant3])
+
+    def test_search_tolerates_typos(self):
+        """Test that a misspelled word falls back on the closest indexed term."""
+        results = PlantProfile.search_plant.plant_name("Quercsu")
+        self.assertEqual(list(results), [self.plant2])
+
+    def test_search_obsolete_names_and_narratives(self):
+        """Test that obsolete names and published narratives are indexed."""
+        ObsoleteNames.objects.create(
+            plant_profile=self.plant2, obsolete_name="Quercus candida"
+        )
+        narrative_type = NarrativeType.objects.create(narrative_type="Overview")
+        PlantNarrative.objects.create(
+            plant_profile=self.plant1,
+            narrative_type=narrative_type,
+            description="Brilliant scarlet foliage in autumn.",
+            published=True,
+        )
+        PlantNarrative.objects.create(
+            plant_profile=self.plant3,
+            narrative_type=narrative_type,
+            description="Tapped for candy and syrup.",
+            published=False,
+        )
+
+        self.assertEqual(
+            list(PlantProfile.search_plant.plant_name("candida")), [self.plant2]
+        )
+        self.assertEqual(
+            list(PlantProfile.search_plant.plant_name("scarlet")), [self.plant1]
+        )
+        self.assertFalse(PlantProfile.search_plant.plant_name("syrup").exists())
+
+    def test_search_ranks_names_before_narratives(self):
+        """Test that a name match ranks above a narrative match."""
+        narrative_type = NarrativeType.objects.create(narrative_type="Overview")
+        PlantNarrative.objects.create(
+            plant_profile=self.plant2,
+            narrative_type=narrative_type,
+            description="Often planted next to a sugar maple.",
+            published=True,
+        )
+        results = list(PlantProfile.search_plant.plant_name("sugar"))
+        self.assertEqual(results, [self.plant3, self.plant2])
+
+    def test_search_names_only(self):
+        """Test that a search on the names leaves out the narratives."""
+        narrative_type = NarrativeType.objects.create(narrative_type="Overview")
+        PlantNarrative.objects.create(
+            plant_profile=self.plant2,
+            narrative_type=narrative_type,
+            description="Often planted next to a sugar maple.",
+            published=True,
+        )
+        ObsoleteNames.objects.create(
+            plant_profile=self.plant2, obsolete_name="Quercus candida"
+        )
+        self.assertEqual(
+            search_backends.search("sugar", names_only=True), [self.plant3.pk]
+        )
+        self.assertEqual(
+            search_backends.search("candida", names_only=True), [self.plant2.pk]
+        )
+
+    def test_search_ranks_a_limited_number_of_plants(self):
+        """Test that only the best MAX_RANKED matches are ranked, all are returned."""
+        plant_ids = search_backends.search("maple")
+        with patch.object(search_backends, "MAX_RANKED", 1):
+            results = list(PlantProfile.search_plant.plant_name("maple"))
+        self.assertEqual(len(results), len(plant_ids))
+        self.assertEqual(results[0].pk, plant_ids[0])
+
+    def test_search_index_follows_edits(self):
+        """Test that renaming or deleting records updates the index."""
+        self.plant2.english_name = "Eastern White Oak"
+        self.plant2.save()
+        self.assertIn(self.plant2, PlantProfile.search_plant.plant_name("eastern"))
+
+        obsolete = ObsoleteNames.objects.create(
+            plant_profile=self.plant1, obsolete_name="Rufacer rubrum"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            obsolete.delete()
+        self.assertFalse(PlantProfile.search_plant.plant_name("rufacer").exists())
+
+
+class PlantCardTest(TestCase):
+    """Test suite for the catalogue cards kept in sync with the plant profiles."""
+
+    def setUp(self):
+        self.shrub = GrowthHabit.objects.create(growth_habit="Shrub")
+        self.plant = PlantProfile.objects.create(
+            latin_name="Cornus sericea",
+            english_name="Red Osier Dogwood",
+            growth_habit=self.shrub,
+        )
+
+    def test_card_follows_plant_profile(self):
+        """Test that saving a plant profile creates and updates its card."""
+        card = PlantCard.objects.get(pk=self.plant.pk)
+        self.assertEqual(card.latin_name, "Cornus sericea")
+        self.assertEqual(card.growth_habit_slug, "Shrub")
+        self.assertEqual(card.image_url, "")
+
+        self.plant.french_name = "Cornouiller stolonifère"
+        self.plant.seed_availability = True
+        self.plant.save()
+        card.refresh_from_db()
+        self.assertEqual(card.french_name, "Cornouiller stolonifère")
+        self.assertTrue(card.seed_availability)
+
+    def test_card_follows_growth_habit(self):
+        """Test that renaming a growth habit updates the cards using it."""
+        self.shrub.growth_habit = "Small shrub"
+        self.shrub.save()
+        self.assertEqual(
+            PlantCard.objects.get(pk=self.plant.pk).growth_habit_slug, "Small shrub"
+        )
+
+    def test_card_page_is_one_query(self):
+        """Test that a page of cards and its continuation read no plant profile rows."""
+        for index in range(30):
+            PlantProfile.objects.create(latin_name=f"Carex {index:02}")
+        cards = PlantCard.objects.filter(
+            pk__in=PlantProfile.objects.filter(latin_name__startswith="Carex").values(
+                "id"
+            )
+        )
+        keys = list(cards.order_by("latin_name", "pk").values_list("latin_name", "pk"))
+        first = keys_page(keys, cards, per_page=24)
+        with self.assertNumQueries(1):
+            page = keys_page(keys, cards, first.next_cursor, per_page=24)
+            names = [card.latin_name for card in page.object_list]
+        self.assertEqual(names, [f"Carex {index:02}" for index in range(24, 30)])
@@ -1,10 +1,65 @@
+import json
+import shutil
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+from types import SimpleNamespace
 from unittest.mock import patch
 
-from django.test import Client, TestCase, override_settings
-from django.urls import reverse
+import pytest
+from celery.signals import task_postrun, task_prerun
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.http import Http404, HttpResponse, QueryDict
+from django.template import Context, Template
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
 from django.utils.translation import override
 
-from project.models import PlantNarrative, PlantProfile
+from project import (
+    acl_handler,
+    admission,
+    autocomplete,
+    cache_versions,
+    cart,
+    conditional,
+    forms,
+    librarysettings,
+    metrics,
+    order_statistics,
+    profile_bundle,
+    profile_fragments,
+    profiler,
+    query_budget,
+    result_cache,
+    tasks,
+    utils,
+    views,
+)
+from project.filters import PlantProfileFilter
+from project.models import (
+    BeeSpecies,
+    Customer,
+    Ecozone,
+    GrowthHabit,
+    LibrarySetting,
+    NonNativeSpecies,
+    ObsoleteNames,
+    Order,
+    OrderItem,
+    OrderLocationStatistic,
+    OrderSeedApplication,
+    OrderYearStatistic,
+    PlantNarrative,
+    PlantOrderStatistic,
+    PlantProfile,
+    SeedStorage,
+    ShoppingCart,
+)
+from project.pagination import keys_page
 
 
 class SearchPlantNameTest(TestCase):
@@ -52,6 +107,961 @@ class SearchPlantNameTest(TestCase):
         self.assertEqual(response.context["title"], "Plant Profile Filter")
 
 
+class CatalogueKeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.plants = [
+            PlantProfile.objects.create(latin_name=name)
+            for name in ("Carex", "Aster", "Betula", "Betula alba", "Dalea")
+        ]
+        self.queryset = PlantProfile.objects.all()
+
+    def keys(self):
+        return list(
+            self.queryset.order_by("latin_name", "pk").values_list("latin_name", "pk")
+        )
+
+    def test_pages_follow_latin_name_then_id(self):
+        keys = self.keys()
+        seen = []
+        page = keys_page(keys, self.queryset, per_page=2)
+        self.assertEqual(page.total, 5)
+        seen += page.object_list
+        while page.has_next:
+            with self.assertNumQueries(1):
+                page = keys_page(keys, self.queryset, page.next_cursor, per_page=2)
+            seen += page.object_list
+        expected = sorted(self.plants, key=lambda plant: (plant.latin_name, plant.id))
+        self.assertEqual(seen, expected)
+        self.assertIsNone(page.next_cursor)
+
+    def test_invalid_cursor_restarts_from_first_page(self):
+        page = keys_page(self.keys(), self.queryset, "not-a-cursor", per_page=2)
+        self.assertEqual(page.total, 5)
+        self.assertEqual(page.object_list[0].latin_name, "Aster")
+
+    def test_keys_page_resumes_after_a_removed_plant(self):
+        keys = self.keys()
+        page = keys_page(keys, self.queryset, per_page=2)
+        betula = keys.pop(1)
+        self.assertEqual(betula[0], "Betula")
+        page = keys_page(keys, self.queryset, page.next_cursor, per_page=2)
+        self.assertEqual(
+            [plant.latin_name for plant in page.object_list], ["Betula alba", "Carex"]
+        )
+
+
+@override_settings(CACHE_SHARED=True)
+class CatalogueResultCacheTest(TestCase):
+    def setUp(self):
+        self.sunny = PlantProfile.objects.create(
+            latin_name="Rhus typhina", full_sun=True
+        )
+        self.hidden = PlantProfile.objects.create(
+            latin_name="Rhus hidden", full_sun=True, is_active=False
+        )
+        cache_versions.bump_version(cache_versions.CATALOGUE)
+
+    def filterset(self, query, queryset=None):
+        return PlantProfileFilter(
+            QueryDict(query), queryset=queryset or PlantProfile.objects.all()
+        )
+
+    def test_canonical_params(self):
+        self.assertEqual(
+            result_cache.canonical_params(
+                self.filterset("full_sun=on&bee_host=on&cursor=abc&any_plant_name=")
+            ),
+            result_cache.canonical_params(self.filterset("bee_host=on&full_sun=on")),
+        )
+        self.assertNotEqual(
+            result_cache.canonical_params(self.filterset("full_sun=on")),
+            result_cache.canonical_params(self.filterset("full_shade=on")),
+        )
+
+    def test_repeated_search_is_read_from_the_cache(self):
+        keys = result_cache.result_keys(self.filterset("full_sun=on"), False)
+        self.assertEqual(keys, [("Rhus typhina", self.sunny.id)])
+        with self.assertNumQueries(0):
+            cached = result_cache.result_keys(
+                self.filterset("full_sun=on&cursor=abc"), False
+            )
+        self.assertEqual(cached, keys)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_results_are_not_cached_without_a_shared_cache(self):
+        result_cache.result_keys(self.filterset("full_sun=on"), False)
+        with self.assertNumQueries(1):
+            result_cache.result_keys(self.filterset("full_sun=on"), False)
+
+    def test_keys_are_in_the_order_of_the_pagination(self):
+        lower = PlantProfile.objects.create(latin_name="rhus glabra", full_sun=True)
+        keys = result_cache.result_keys(self.filterset("full_sun=on"), False)
+        self.assertEqual(keys, sorted(keys))
+        self.assertEqual(keys[-1], ("rhus glabra", lower.id))
+
+    def test_visibility_split(self):
+        result_cache.result_keys(self.filterset("full_sun=on"), False)
+        keys = result_cache.result_keys(
+            self.filterset("full_sun=on", PlantProfile.all_objects.all()), True
+        )
+        self.assertEqual(
+            keys, [("Rhus hidden", self.hidden.id), ("Rhus typhina", self.sunny.id)]
+        )
+
+    def test_plant_profile_write_invalidates_the_results(self):
+        result_cache.result_keys(self.filterset("full_sun=on"), False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.sunny.full_sun = False
+            self.sunny.save()
+        self.assertEqual(
+            result_cache.result_keys(self.filterset("full_sun=on"), False), []
+        )
+
+
+class PlantNameAutocompleteTest(TestCase):
+    def setUp(self):
+        self.milkweed = PlantProfile.objects.create(
+            latin_name="Asclepias syriaca",
+            english_name="Common Milkweed",
+            french_name="Asclépiade commune",
+        )
+        PlantProfile.objects.create(
+            latin_name="Asclepias hidden", english_name="Milky", is_active=False
+        )
+        ObsoleteNames.objects.create(
+            plant_profile=self.milkweed, obsolete_name="Asclepias cornuti"
+        )
+        NonNativeSpecies.objects.create(
+            latin_name="Vincetoxicum rossicum", english_name="Dog-strangling vine"
+        )
+        cache_versions.bump_version(cache_versions.CATALOGUE)
+
+    def labels(self, prefix, limit=autocomplete.MAX_SUGGESTIONS):
+        return [suggestion.label for suggestion in autocomplete.suggest(prefix, limit)]
+
+    def test_prefix_of_any_word_matches(self):
+        self.assertEqual(self.labels("milk"), ["Common Milkweed"])
+        self.assertEqual(self.labels("common  mi"), ["Common Milkweed"])
+        self.assertEqual(self.labels("ASCLEPIADE"), ["Asclépiade commune"])
+        self.assertEqual(self.labels("strang"), ["Dog-strangling vine"])
+        self.assertEqual(self.labels("xyz"), [])
+        self.assertEqual(self.labels(" "), [])
+
+    def test_current_names_rank_before_obsolete_names(self):
+        self.assertEqual(
+            self.labels("asclepias"), ["Asclepias syriaca", "Asclepias cornuti"]
+        )
+        self.assertEqual(self.labels("asclepias", limit=1), ["Asclepias syriaca"])
+        synonym = autocomplete.suggest("cornuti")[0]
+        self.assertEqual(synonym.kind, autocomplete.SYNONYM)
+        self.assertEqual(synonym.plant_id, self.milkweed.id)
+        self.assertEqual(synonym.latin_name, "Asclepias syriaca")
+
+    def test_lookup_does_not_query_the_database(self):
+        autocomplete.suggest("a")
+        with self.assertNumQueries(0):
+            autocomplete.suggest("asc")
+
+    def test_trie_is_rebuilt_after_a_committed_edit(self):
+        self.assertEqual(self.labels("butterfly"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            PlantProfile.objects.create(
+                latin_name="Asclepias tuberosa", english_name="Butterfly Milkweed"
+            )
+        self.assertEqual(self.labels("butterfly"), ["Butterfly Milkweed"])
+
+    @override_settings(CACHE_SHARED=False)
+    def test_trie_is_rebuilt_after_an_interval_without_a_shared_cache(self):
+        self.assertEqual(self.labels("butterfly"), [])
+        # Saved by another process, its stamp bump is not seen here
+        PlantProfile.objects.create(
+            latin_name="Asclepias tuberosa", english_name="Butterfly Milkweed"
+        )
+        self.assertEqual(self.labels("butterfly"), [])
+        with patch.object(autocomplete, "REBUILD_INTERVAL", 0):
+            self.assertEqual(self.labels("butterfly"), ["Butterfly Milkweed"])
+
+
+@override_settings(CACHE_SHARED=True)
+class PlantProfileFragmentTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.storage = SeedStorage.objects.create(seed_storage="Keep cold and dry.")
+        self.stored = PlantProfile.objects.create(
+            latin_name="Asclepias syriaca", seed_storage=self.storage
+        )
+        self.other = PlantProfile.objects.create(latin_name="Betula papyrifera")
+        for plant in (self.stored, self.other):
+            profile_fragments.set_body(plant.pk, f"<p>{plant.latin_name}</p>")
+
+    def cached(self):
+        return {
+            plant.latin_name
+            for plant in (self.stored, self.other)
+            if profile_fragments.get_body(plant.pk) is not None
+        }
+
+    def test_lookup_edit_only_evicts_the_profiles_showing_it(self):
+        self.assertEqual(profile_fragments.plants_using(self.storage), [self.stored.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.seed_storage = "Keep in the fridge."
+            self.storage.save()
+        self.assertEqual(self.cached(), {"Betula papyrifera"})
+
+    def test_profile_rows_and_relations_evict_their_profile(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            PlantNarrative.objects.create(plant_profile=self.other, description="Birch")
+        self.assertEqual(self.cached(), {"Asclepias syriaca"})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stored.ecozones.add(Ecozone.objects.create(ecozone="Boreal Shield"))
+        self.assertEqual(self.cached(), set())
+
+    def test_body_is_evicted_in_every_language(self):
+        with override("fr"):
+            profile_fragments.set_body(self.stored.pk, "<p>Asclépiade</p>")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stored.save()
+        with override("fr"):
+            self.assertIsNone(profile_fragments.get_body(self.stored.pk))
+        self.assertIsNone(profile_fragments.get_body(self.stored.pk))
+
+    @override_settings(CACHE_SHARED=False)
+    def test_bodies_are_not_cached_without_a_shared_cache(self):
+        profile_fragments.set_body(self.other.pk, "<p>Betula papyrifera</p>")
+        self.assertIsNone(profile_fragments.get_body(self.other.pk))
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        PlantProfile.objects.create(latin_name="Asclepias syriaca")
+        self.rendered = 0
+
+    def view(self, request):
+        self.rendered += 1
+        return HttpResponse("page")
+
+    def get(self, user=None, library_settings=None, cart_item_count=None, **headers):
+        request = self.factory.get("/blooming-calendar/", headers=headers)
+        request.user = user or AnonymousUser()
+        request.library_settings = library_settings or LibrarySetting()
+        if cart_item_count is not None:
+            request.cart_item_count = cart_item_count
+        view = conditional.condition(self.validators)(self.view)
+        return view(request)
+
+    def validators(self, request):
+        latest_change, rows = conditional.table_state(PlantProfile.objects.all())
+        return conditional.validators(
+            request, latest_change, rows, last_modified=latest_change
+        )
+
+    def test_unchanged_page_is_not_rendered_again(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+        self.assertIn("private", response["Cache-Control"])
+        response = self.get(if_none_match=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.rendered, 1)
+
+    def test_new_or_deleted_rows_change_the_etag(self):
+        etag = self.get()["ETag"]
+        plant = PlantProfile.objects.create(latin_name="Betula papyrifera")
+        self.assertNotEqual(self.get(if_none_match=etag).status_code, 304)
+        etag = self.get()["ETag"]
+        plant.delete()
+        self.assertNotEqual(self.get()["ETag"], etag)
+
+    def test_etag_varies_on_the_user(self):
+        user = get_user_model().objects.create_user(
+            username="gardener", password="secret"
+        )
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(user, if_none_match=etag).status_code, 200)
+
+    def test_etag_varies_on_the_navigation(self):
+        user = get_user_model().objects.create_user(
+            username="gardener", password="secret"
+        )
+        etag = self.get(user)["ETag"]
+        user.groups.add(Group.objects.create(name="Library Manager"))
+        user = get_user_model().objects.get(pk=user.pk)
+        self.assertEqual(self.get(user, if_none_match=etag).status_code, 200)
+
+        etag = self.get()["ETag"]
+        for navigation in (
+            {"library_settings": LibrarySetting(is_shop_open=False)},
+            {"library_settings": LibrarySetting(is_accepting_donations=True)},
+            {"cart_item_count": 2},
+        ):
+            response = self.get(if_none_match=etag, **navigation)
+            self.assertEqual(response.status_code, 200)
+
+    def species_page(self, **headers):
+        return self.client.get(reverse("bee-supporting-plants"), headers=headers)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_catalogue_version_is_a_validator_with_a_shared_cache(self):
+        etag = self.species_page()["ETag"]
+        self.assertEqual(self.species_page(if_none_match=etag).status_code, 304)
+        cache_versions.bump_version(cache_versions.CATALOGUE)
+        self.assertEqual(self.species_page(if_none_match=etag).status_code, 200)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_no_catalogue_version_validator_without_a_shared_cache(self):
+        self.assertNotIn("ETag", self.species_page())
+
+
+@override_settings(CACHE_SHARED=True)
+class GroupMembershipCacheTest(TestCase):
+    def setUp(self):
+        cache_versions.bump_version(cache_versions.GROUPS)
+        self.factory = RequestFactory()
+        self.group = Group.objects.create(name="Library Manager")
+        Group.objects.create(name="Image Manager")
+        self.user = get_user_model().objects.create_user(
+            username="gardener", password="secret"
+        )
+        self.middleware = acl_handler.UserAdminCheckMiddleware(
+            lambda request: HttpResponse("page")
+        )
+
+    def request(self, user):
+        request = self.factory.get("/")
+        request.user = user
+        self.middleware(request)
+        return request
+
+    def fresh_user(self):
+        return get_user_model().objects.get(pk=self.user.pk)
+
+    def test_membership_is_cached_across_requests(self):
+        self.user.groups.add(self.group)
+        request = self.request(self.fresh_user())
+        self.assertTrue(request.user.is_library_manager)
+        self.assertFalse(request.user.is_image_manager)
+
+        user = self.fresh_user()
+        with self.assertNumQueries(0):
+            request = self.request(user)
+            self.assertTrue(acl_handler._is_in_group(request, "Library Manager"))
+        self.assertTrue(request.user.is_library_manager)
+
+    def test_group_changes_evict_the_cached_membership(self):
+        self.assertFalse(self.request(self.fresh_user()).user.is_library_manager)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.groups.add(self.group)
+        self.assertTrue(self.request(self.fresh_user()).user.is_library_manager)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.group.user_set.remove(self.user)
+        self.assertFalse(self.request(self.fresh_user()).user.is_library_manager)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Group.objects.create(name="Shop Manager")
+        self.assertFalse(self.request(self.fresh_user()).user.is_shop_manager)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_membership_is_read_per_request_without_a_shared_cache(self):
+        self.assertFalse(self.request(self.fresh_user()).user.is_library_manager)
+        # Added on another worker, whose eviction does not reach this one
+        self.user.groups.add(self.group)
+        self.assertTrue(self.request(self.fresh_user()).user.is_library_manager)
+
+    def test_anonymous_requests_do_not_query_the_groups(self):
+        with self.assertNumQueries(0):
+            request = self.request(AnonymousUser())
+        self.assertFalse(hasattr(request.user, "is_library_manager"))
+
+
+class LibrarySettingsMiddlewareTest(TestCase):
+    def setUp(self):
+        librarysettings.invalidate()
+        self.factory = RequestFactory()
+        self.middleware = librarysettings.LibrarySettingsMiddleware(
+            lambda request: HttpResponse("page")
+        )
+        self.customer = Customer.objects.create(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            address="1 Test St",
+            city="City",
+            province="State",
+            postal_code="00000",
+            application=OrderSeedApplication.objects.create(
+                seed_application="Garden", priority=5
+            ),
+        )
+        self.plant = PlantProfile.objects.create(latin_name="Asclepias syriaca")
+
+    def request(self, session=None):
+        request = self.factory.get("/")
+        request.session = {} if session is None else session
+        self.middleware(request)
+        return request
+
+    def test_settings_are_held_by_the_worker(self):
+        self.request()
+        with self.assertNumQueries(0):
+            request = self.request()
+        self.assertTrue(request.library_settings.is_shop_open)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_changes_reach_the_workers(self):
+        library_settings = self.request().library_settings
+        library_settings = LibrarySetting.objects.get(pk=library_settings.pk)
+        library_settings.is_shop_open = False
+        with self.captureOnCommitCallbacks(execute=True):
+            library_settings.save()
+        self.assertFalse(self.request().library_settings.is_shop_open)
+
+        # Another worker only sees the new version stamp once its copy is checked
+        LibrarySetting.objects.update(is_shop_open=True)
+        cache_versions.bump_version(cache_versions.LIBRARY_SETTINGS)
+        self.assertFalse(self.request().library_settings.is_shop_open)
+        with patch.object(librarysettings, "CHECK_INTERVAL", 0):
+            self.assertTrue(self.request().library_settings.is_shop_open)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_changes_of_other_processes_are_read_without_a_shared_cache(self):
+        self.request()
+        # openshop in another process, its stamp bump is not seen here
+        LibrarySetting.objects.update(is_shop_open=False)
+        self.assertTrue(self.request().library_settings.is_shop_open)
+        with patch.object(librarysettings, "CHECK_INTERVAL", 0):
+            self.assertFalse(self.request().library_settings.is_shop_open)
+
+    def test_cart_count_follows_the_cart_changes(self):
+        ShoppingCart.objects.create(
+            customer=self.customer, plant_profile=self.plant, quantity=2
+        )
+        session = {"customer_id": self.customer.pk}
+        self.assertEqual(self.request(session).cart_item_count, 2)
+
+        request = self.request(session)
+        utils.update_cart_item(request, self.plant, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.request(session).cart_item_count, 5)
+        utils.remove_from_cart(request, self.plant)
+        self.assertEqual(self.request(session).cart_item_count, 0)
+
+
+class CartContextTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        application = OrderSeedApplication.objects.create(
+            seed_application="Garden", priority=5
+        )
+        self.customer = Customer.objects.create(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            address="1 Test St",
+            city="City",
+            province="State",
+            postal_code="00000",
+            application=application,
+        )
+        self.plants = [
+            PlantProfile.objects.create(latin_name=f"Plant {i}") for i in range(4)
+        ]
+        for plant in self.plants[:3]:
+            ShoppingCart.objects.create(
+                customer=self.customer, plant_profile=plant, quantity=1
+            )
+
+    def request(self):
+        request = self.factory.post("/")
+        request.session = {"customer_id": self.customer.pk}
+        cart.CartContextMiddleware(lambda request: HttpResponse())(request)
+        return request
+
+    def test_add_to_cart_does_not_read_the_lines(self):
+        request = self.request()
+        # Customer with application, then for each change the savepoint, customer
+        # lock, cart and line totals, write and savepoint release
+        with self.assertNumQueries(6):
+            change = utils.add_to_cart(request, self.plants[3], 2)
+            self.assertEqual((change.quantity, change.total), (2, 5))
+            self.assertEqual(utils.get_cart_total(request), 5)
+            utils.get_or_create_customer_from_session(request)
+        with self.assertNumQueries(5):
+            change = utils.add_to_cart(request, self.plants[0], 1)
+        self.assertEqual((change.quantity, change.total), (2, 6))
+        self.assertEqual(request.session[cart.CART_COUNT_SESSION_KEY], 6)
+        self.assertEqual(
+            ShoppingCart.objects.get(plant_profile=self.plants[0]).quantity, 2
+        )
+
+    def test_cart_limit_applies_to_the_stored_total(self):
+        request = self.request()
+        self.assertIsNone(
+            utils.add_to_cart(request, self.plants[3], cart.MAX_NON_PRIORITY_CART_ITEMS)
+        )
+        self.assertEqual(utils.get_cart_total(request), 3)
+
+        # Lines added by another request count against the limit
+        other = self.request()
+        utils.update_cart_item(other, self.plants[0], 10)
+        self.assertIsNone(utils.add_to_cart(request, self.plants[1], 4))
+        self.assertEqual(utils.add_to_cart(request, self.plants[1], 3).total, 15)
+        # Lowering a quantity is always allowed
+        self.assertEqual(utils.update_cart_item(request, self.plants[0], 9).total, 14)
+        self.assertIsNone(utils.update_cart_item(request, self.plants[3], 1))
+
+        self.assertEqual(utils.clear_cart(request), 3)
+        self.assertEqual(utils.get_cart_items(request), [])
+
+    def test_memoized_lines_follow_the_changes(self):
+        request = self.request()
+        self.assertEqual(len(utils.get_cart_items(request)), 3)
+        utils.add_to_cart(request, self.plants[3], 2)
+        utils.update_cart_item(request, self.plants[0], 4)
+        self.assertTrue(utils.remove_from_cart(request, self.plants[1]))
+        with self.assertNumQueries(0):
+            quantities = {
+                line.plant_profile.latin_name: line.quantity
+                for line in utils.get_cart_items(request)
+            }
+        self.assertEqual(quantities, {"Plant 0": 4, "Plant 2": 1, "Plant 3": 2})
+        self.assertEqual(utils.get_cart_total(request), 7)
+
+    def test_order_is_placed_with_its_totals_in_bulk(self):
+        request = self.request()
+        # Customer, savepoint, customer lock, cart lines, order, items, cart lines
+        # deletion and savepoint release, whatever the number of lines
+        with self.assertNumQueries(8):
+            order = utils.create_order_from_cart(request)
+        self.assertEqual((order.item_count, order.seed_quantity), (3, 3))
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(utils.get_cart_total(request), 0)
+
+        item = order.items.first()
+        item.quantity = 4
+        item.save()
+        order.items.exclude(pk=item.pk).first().delete()
+        order.refresh_from_db()
+        self.assertEqual((order.item_count, order.seed_quantity), (2, 5))
+
+    def test_order_holds_the_stored_lines(self):
+        request = self.request()
+        self.assertEqual(len(utils.get_cart_items(request)), 3)
+        # Changed by another request of the customer after this one read the cart
+        ShoppingCart.objects.filter(plant_profile=self.plants[0]).update(quantity=3)
+        ShoppingCart.objects.filter(plant_profile=self.plants[1]).delete()
+        order = utils.create_order_from_cart(request)
+        self.assertEqual((order.item_count, order.seed_quantity), (2, 4))
+        self.assertFalse(ShoppingCart.objects.filter(customer=self.customer).exists())
+
+
+class OrderStatisticsTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Test",
+            last_name="User",
+            email="test@example.com",
+            address="1 Test St",
+            city="Ottawa",
+            province="Ontario",
+            postal_code="K1A 0A1",
+            application=OrderSeedApplication.objects.create(
+                seed_application="Garden", priority=5
+            ),
+        )
+        self.plants = [
+            PlantProfile.objects.create(latin_name=f"Plant {i}") for i in range(2)
+        ]
+
+    def place_order(self, **fields):
+        # As checkout, with the items inserted in bulk
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(customer=self.customer, **fields)
+            items = OrderItem.objects.bulk_create(
+                [
+                    OrderItem(order=order, plant_profile=plant, quantity=2)
+                    for plant in self.plants
+                ]
+            )
+            order_statistics.items_added(items)
+        return order
+
+    def rollups(self):
+        return (
+            sorted(
+                OrderYearStatistic.objects.filter(order_count__gt=0).values_list(
+                    "year", "status", "order_count", "donation_amount"
+                )
+            ),
+            sorted(
+                OrderLocationStatistic.objects.filter(order_count__gt=0).values_list(
+                    "city", "order_count", "donation_amount"
+                )
+            ),
+            sorted(
+                PlantOrderStatistic.objects.filter(order_count__gt=0).values_list(
+                    "plant_profile_id", "order_count", "seed_quantity"
+                )
+            ),
+        )
+
+    def test_statistics_are_read_from_the_rollups(self):
+        self.place_order(donation_amount=5)
+        self.place_order(status="completed")
+
+        with self.assertNumQueries(1):
+            stats = list(utils.get_order_statistics())
+        self.assertEqual(
+            stats,
+            [
+                {
+                    "year": timezone.now().year,
+                    "total_orders": 2,
+                    "pending_orders": 1,
+                    "completed_orders": 1,
+                    "cancelled_orders": 0,
+                    "shipped_orders": 0,
+                    "total_donations": Decimal("5"),
+                }
+            ],
+        )
+        location = utils.get_order_statistics_by_location().get()
+        self.assertEqual(
+            (location["city"], location["number_of_orders"]), ("Ottawa", 2)
+        )
+        seeds = list(utils.get_most_ordered_seeds())
+        self.assertEqual(
+            [(seed["order_count"], seed["order_item_count"]) for seed in seeds],
+            [(2, 4), (2, 4)],
+        )
+
+    def test_changes_are_added_as_rebuilt(self):
+        order = self.place_order(donation_amount=5)
+        self.place_order()
+        with self.captureOnCommitCallbacks(execute=True):
+            order.status = "cancelled"
+            order.save()
+            item = order.items.order_by("pk").first()
+            item.quantity = 5
+            item.save()
+            order.items.order_by("pk").last().delete()
+            self.customer.city = "Kingston"
+            self.customer.save()
+        incremental = self.rollups()
+        self.assertEqual(incremental[1], [("Kingston", 2, Decimal("5"))])
+
+        order_statistics.rebuild()
+        self.assertEqual(self.rollups(), incremental)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.delete()
+        self.assertEqual(
+            self.rollups()[2], [(self.plants[0].pk, 1, 2), (self.plants[1].pk, 1, 2)]
+        )
+
+    def test_failing_difference_does_not_fail_the_order(self):
+        with (
+            patch.object(PlantOrderStatistic, "add", side_effect=DatabaseError),
+            self.assertLogs("project.order_statistics", "ERROR"),
+        ):
+            order = self.place_order()
+        self.assertEqual(order.items.count(), 2)
+        self.assertEqual(self.rollups()[2], [])
+
+
+class QueryBudgetTest(TestCase):
+    def setUp(self):
+        PlantProfile.objects.create(latin_name="Asclepias syriaca")
+
+    def test_record_counts_repeated_queries(self):
+        with query_budget.record() as stats:
+            for plant_id in range(3):
+                PlantProfile.objects.filter(pk=plant_id).exists()
+            PlantProfile.objects.count()
+        self.assertEqual(stats.count, 4)
+        self.assertEqual(stats.duplicates, 2)
+        self.assertEqual(stats.most_repeated()[0][1], 3)
+
+    def test_views_declare_their_budget(self):
+        self.assertEqual(query_budget.budget_for(views.blooming_calendar), 6)
+        with override_settings(QUERY_BUDGET_DEFAULT=30):
+            self.assertEqual(query_budget.budget_for(views.plant_ecozones), 30)
+
+    @override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_DUPLICATES=0)
+    def test_middleware_logs_the_offenders(self):
+        def view(request):
+            request.resolver_match = resolve(reverse("blooming-calendar"))
+            for plant in PlantProfile.objects.all():
+                list(plant.ecozones.all())
+                list(plant.ecozones.all())
+            return HttpResponse("page")
+
+        request = RequestFactory().get("/")
+        with self.assertLogs("project.query_budget", "WARNING") as logs:
+            response = query_budget.QueryBudgetMiddleware(view)(request)
+        self.assertEqual(request.query_stats.count, 3)
+        self.assertIn("blooming-calendar", logs.output[0])
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "url_name",
+    [
+        "index",
+        "blooming-calendar",
+        "bee-supporting-plants",
+        "butterfly-supporting-plants",
+    ],
+)
+def test_catalogue_pages_stay_within_their_query_budget(within_query_budget, url_name):
+    bees = [BeeSpecies.objects.create(latin_name=f"Bombus {i}") for i in range(3)]
+    for i in range(10):
+        plant = PlantProfile.objects.create(latin_name=f"Plant {i}", bloom_start=5)
+        plant.bees.set(bees)
+    within_query_budget(reverse(url_name))
+
+
+class RequestProfilerTest(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = get_user_model().objects.create_user(
+            username="manager", password="secret"
+        )
+        cache_versions.bump_version(cache_versions.GROUPS)
+        self.middleware = profiler.RequestProfilerMiddleware(self.view)
+
+    def view(self, request):
+        plants = list(PlantProfile.objects.all())
+        return HttpResponse(
+            Template("{{ plants|length }}").render(Context({"plants": plants}))
+        )
+
+    def get(self, path, user):
+        request = self.factory.get(path)
+        request.user = user
+        return self.middleware(request)
+
+    def test_library_managers_get_a_report(self):
+        self.user.groups.add(Group.objects.create(name="Library Manager"))
+        response = self.get("/?_profile=1", self.user)
+        self.assertIn("attachment", response["Content-Disposition"])
+        report = response.content.decode()
+        self.assertIn("SQL: 1 queries", report)
+        self.assertIn("Template rendering:", report)
+        self.assertIn("Functions by cumulative time", report)
+
+    def test_other_requests_are_not_profiled(self):
+        self.assertEqual(self.get("/?_profile=1", self.user).content, b"0")
+        self.user.groups.add(Group.objects.create(name="Library Manager"))
+        self.assertEqual(self.get("/", self.user).content, b"0")
+        self.assertEqual(self.get("/?_profile=1", AnonymousUser()).content, b"0")
+
+
+@override_settings(CACHE_SHARED=True)
+class AdmissionTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.library_settings = LibrarySetting(shop_capacity=2, shop_idle_minutes=15)
+
+    def request(self, session=None, path="/", **headers):
+        request = self.factory.get(path, headers=headers)
+        request.session = {} if session is None else session
+        request.library_settings = self.library_settings
+        return request
+
+    def test_visitors_over_capacity_wait_their_turn(self):
+        sessions = [{} for _ in range(4)]
+        positions = [admission.admit(self.request(session)) for session in sessions]
+        self.assertEqual(positions, [0, 0, 1, 2])
+        # Admitted visitors keep their place, waiting ones their position
+        self.assertEqual(admission.admit(self.request(sessions[0])), 0)
+        self.assertEqual(admission.admit(self.request(sessions[3])), 2)
+
+        admission.release(self.request(sessions[0]))
+        self.assertEqual(admission.admit(self.request(sessions[3])), 2)
+        self.assertEqual(admission.admit(self.request(sessions[2])), 0)
+        self.assertEqual(admission.admit(self.request(sessions[3])), 1)
+
+    def test_idle_visitors_lose_their_place(self):
+        sessions = [{} for _ in range(4)]
+        now = 1_000_000.0
+        with patch("time.time", return_value=now):
+            for session in sessions:
+                admission.admit(self.request(session))
+        # The third visitor stopped polling, the first stopped shopping
+        with patch("time.time", return_value=now + 20 * 60):
+            admission.admit(self.request(sessions[1]))
+            self.assertEqual(admission.admit(self.request(sessions[3])), 0)
+            self.assertEqual(admission.admit(self.request(sessions[2])), 1)
+
+    def test_views_send_the_visitors_over_capacity_to_the_waiting_room(self):
+        self.library_settings.shop_capacity = 1
+        admission.admit(self.request())
+        view = admission.admission_required(lambda request: HttpResponse("cart"))
+        session = {}
+
+        response = view(self.request(session, "/en/shopping-cart/"))
+        waiting_room = reverse("shop-waiting-room")
+        self.assertEqual(response.url, f"{waiting_room}?next=%2Fen%2Fshopping-cart%2F")
+        response = view(
+            self.request(
+                session,
+                HX_Request="true",
+                Referer="https://evil.example.com/",
+            )
+        )
+        self.assertTrue(response["HX-Redirect"].startswith(waiting_room))
+        self.assertNotIn("evil", response["HX-Redirect"])
+
+        request = self.request(
+            session, f"{waiting_room}?next=/en/shopping-cart/", HX_Request="true"
+        )
+        response = admission.waiting_room(request)
+        self.assertContains(response, 'hx-trigger="every 5s"')
+        self.assertContains(response, "next=/en/shopping-cart/")
+
+        self.library_settings.shop_capacity = 2
+        response = admission.waiting_room(
+            self.request(
+                session, f"{waiting_room}?next=/en/shopping-cart/", HX_Request="true"
+            )
+        )
+        self.assertEqual(response["HX-Redirect"], "/en/shopping-cart/")
+        self.assertEqual(view(self.request(session)).content, b"cart")
+
+    def test_places_are_taken_once(self):
+        self.library_settings.shop_capacity = 1
+        sessions = [{} for _ in range(2)]
+        # Another visitor took the free place between the reads and the taking
+        with patch.object(admission, "_take_place", return_value=False):
+            self.assertEqual(admission.admit(self.request(sessions[0])), 1)
+        self.assertEqual(admission.admit(self.request(sessions[1])), 2)
+        self.assertEqual(admission.admit(self.request(sessions[0])), 0)
+        self.assertEqual(admission.admit(self.request(sessions[1])), 1)
+
+    def test_queue_reads_a_window_of_tickets(self):
+        self.library_settings.shop_capacity = 1
+        admission.admit(self.request())
+        sessions = [{} for _ in range(4)]
+        with patch.object(admission, "QUEUE_WINDOW", 2):
+            positions = [admission.admit(self.request(s)) for s in sessions]
+            self.assertEqual(positions, [1, 2, 3, 4])
+            # The two first visitors left, the others move up as the head does
+            cache.delete_many(
+                [admission._ticket_key(admission._prefix(), n) for n in (2, 3)]
+            )
+            self.assertEqual(admission.admit(self.request(sessions[3])), 2)
+            self.assertEqual(admission.admit(self.request(sessions[3])), 2)
+            self.assertEqual(admission.admit(self.request(sessions[2])), 1)
+
+    def test_reset_empties_the_shop_and_the_queue(self):
+        sessions = [{} for _ in range(3)]
+        for session in sessions:
+            admission.admit(self.request(session))
+        admission.reset()
+        self.assertEqual(admission.admit(self.request(sessions[2])), 0)
+
+    @override_settings(CACHE_SHARED=False)
+    def test_capacity_needs_a_shared_cache(self):
+        sessions = [{} for _ in range(3)]
+        positions = [admission.admit(self.request(session)) for session in sessions]
+        self.assertEqual(positions, [0, 0, 0])
+        form = forms.AdminLibrarySettingForm(
+            {"shop_capacity": 2, "shop_idle_minutes": 15}
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn("shop_capacity", form.errors)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings_override = override_settings(
+            METRICS_ENABLED=True, METRICS_DIR=self.metrics_dir, METRICS_TOKEN="secret"
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        metrics._counters.clear()
+        metrics._histograms.clear()
+        self.factory = RequestFactory()
+
+    def scrape(self, **extra):
+        extra.setdefault("HTTP_AUTHORIZATION", "Bearer secret")
+        response = metrics.metrics_view(self.factory.get("/metrics/", **extra))
+        return response.content.decode()
+
+    def test_requests_are_counted_by_url_name(self):
+        def view(request):
+            request.resolver_match = resolve(reverse("blooming-calendar"))
+            PlantProfile.objects.count()
+            return HttpResponse("page", status=201)
+
+        metrics.MetricsMiddleware(view)(self.factory.get("/"))
+        text = self.scrape()
+        self.assertIn(
+            'seedlibrary_http_requests_total{method="GET",status="201",'
+            'view="blooming-calendar"} 1.0',
+            text,
+        )
+        self.assertIn(
+            'seedlibrary_http_db_queries_total{view="blooming-calendar"} 1.0', text
+        )
+        self.assertIn(
+            'seedlibrary_http_request_duration_seconds_count{view="blooming-calendar"} 1',
+            text,
+        )
+
+    def test_processes_are_added_up(self):
+        metrics.cache_lookup("plant-results", True)
+        metrics.flush(force=True)
+        other_process = Path(self.metrics_dir, "1.json")
+        other_process.write_text(
+            json.dumps(
+                {
+                    "counters": [
+                        [
+                            "cache_requests_total",
+                            [["cache", "plant-results"], ["result", "hit"]],
+                            2,
+                        ]
+                    ],
+                    "histograms": [],
+                }
+            )
+        )
+        self.assertIn(
+            'seedlibrary_cache_requests_total{cache="plant-results",result="hit"} 3.0',
+            self.scrape(),
+        )
+
+    def test_celery_tasks_are_timed(self):
+        task = tasks.send_order_confirmation_task
+        task_prerun.send(sender=task, task_id="1", task=task)
+        task_postrun.send(sender=task, task_id="1", task=task, state="FAILURE")
+        text = self.scrape()
+        self.assertIn(
+            f'seedlibrary_celery_tasks_total{{state="FAILURE",task="{task.name}"}} 1.0',
+            text,
+        )
+        self.assertIn(
+            f'seedlibrary_celery_task_duration_seconds_count{{task="{task.name}"}} 1',
+            text,
+        )
+
+    def test_endpoint_needs_the_token(self):
+        self.assertIn("# TYPE seedlibrary_http_requests_total counter", self.scrape())
+        with self.assertRaises(Http404):
+            self.scrape(HTTP_AUTHORIZATION="Bearer guess")
+        with override_settings(METRICS_TOKEN=""):
+            # Also from the loopback address of a reverse proxy
+            with self.assertRaises(Http404):
+                self.scrape(REMOTE_ADDR="127.0.0.1", HTTP_AUTHORIZATION="Bearer ")
+
+
 class DonationViewsTest(TestCase):
     def setUp(self):
         self.client = Client(headers={"host": "localhost"})
@@ -149,3 +1159,47 @@ class PlantProfilePageContextTest(TestCase):
         self.assertIn("plant_narratives", response.context)
         narratives = response.context["plant_narratives"]
         self.assertIn(self.narrative, narratives)
+
+
+class PlantProfileBundleTest(TestCase):
+    def setUp(self):
+        self.plant = PlantProfile.objects.create(
+            latin_name="Asclepias syriaca",
+            growth_habit=GrowthHabit.objects.create(growth_habit="Forb"),
+        )
+        self.plant.ecozones.add(Ecozone.objects.create(ecozone="Boreal Shield"))
+        ObsoleteNames.objects.create(
+            plant_profile=self.plant, obsolete_name="Asclepias cornuti"
+        )
+        self.narrative = PlantNarrative.objects.create(
+            plant_profile=self.plant, description="Milkweed.", published=True
+        )
+        self.hidden = PlantProfile.objects.create(
+            latin_name="Asclepias hidden", is_active=False
+        )
+
+    def test_bundle_is_loaded_in_a_fixed_number_of_queries(self):
+        # The profile with its foreign keys, then one query per prefetch
+        with self.assertNumQueries(1 + len(profile_bundle.PREFETCHES)):
+            bundle = profile_bundle.load(self.plant.pk)
+            plant = bundle.plant
+            self.assertEqual(plant.growth_habit.growth_habit, "Forb")
+            self.assertIsNone(plant.conservation_status)
+            self.assertEqual(len(plant.ecozones.all()), 1)
+            self.assertTrue(plant.obsolete_names.exists())
+            self.assertEqual(list(plant.plant.all()), [])
+        self.assertEqual(bundle.narratives, [self.narrative])
+        self.assertEqual(bundle.image_count, 0)
+        self.assertIsNone(bundle.primary_image)
+
+    def test_inactive_profile_is_only_loaded_for_authenticated_users(self):
+        self.assertIsNone(profile_bundle.load(self.hidden.pk))
+        self.assertEqual(profile_bundle.load(self.hidden.pk, True).plant, self.hidden)
+        self.assertIsNone(profile_bundle.load(0, True))
+
+    def test_primary_image_prefers_the_whole_plant(self):
+        leaf = SimpleNamespace(morphology_aspect=SimpleNamespace(element="Leaf"))
+        plant = SimpleNamespace(morphology_aspect=SimpleNamespace(element="Plant"))
+        self.assertIs(profile_bundle.primary_image([leaf, plant]), plant)
+        self.assertIs(profile_bundle.primary_image([leaf]), leaf)
+        self.assertIsNone(profile_bundle.primary_image([]))
@@ -8,8 +8,8 @@ from typing import Literal, TypedDict
 import qrcode
 import requests
 from django.conf import settings
-from django.db.models import Count, Q, Sum
-from django.db.models.functions import ExtractYear
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
 from django.http import HttpRequest
 from exif import Image
 from PIL import Image as PILImage
@@ -25,7 +25,16 @@ from reportlab.platypus import (
     TableStyle,
 )
 
-from project.models import Order, PlantImage, PlantProfile
+from project import order_statistics
+from project.cart import get_cart
+from project.models import (
+    Order,
+    OrderLocationStatistic,
+    OrderYearStatistic,
+    PlantImage,
+    PlantOrderStatistic,
+    PlantProfile,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -45,8 +54,6 @@ MONTHS = {
     12: "Dec",
 }
 
-MAX_NON_PRIORITY_CART_ITEMS = 15
-
 LABEL_FONT_ROMAN = "Times-Roman"
 LABEL_FONT_BOLD = "Times-Bold"
 LABEL_FONT_ITALIC = "Times-Italic"
@@ -394,22 +401,16 @@ def get_or_create_customer_from_session(request):
     Get the Customer object associated with the current session.
     If no customer_id in session, returns None.
 
+    The customer is read once per request, with their seed application, see
+    project.cart.
+
     Args:
         request: Django request object
 
     Returns:
         Customer object or None
     """
-    from project.models import Customer
-
-    customer_id = request.session.get("customer_id")
-    if not customer_id:
-        return None
-
-    try:
-        return Customer.objects.get(id=customer_id)
-    except Customer.DoesNotExist:
-        return None
+    return get_cart(request).customer
 
 
 def set_customer_in_session(request, customer):
@@ -424,50 +425,53 @@ def set_customer_in_session(request, customer):
         request.session["customer_id"] = customer
     else:
         request.session["customer_id"] = customer.id
+    # Counted again for the new customer by LibrarySettingsMiddleware
+    get_cart(request).reset()
     request.session.modified = True
 
 
+def get_cart_count(request):
+    """
+    Get the item count in the cart from the session counter.
+
+    The counter is kept up to date by the cart functions below. It is counted from
+    the database when missing, e.g. for a session started before it existed.
+
+    Args:
+        request: Django request object
+
+    Returns:
+        Integer count of items in cart
+    """
+    return get_cart(request).count()
+
+
 def add_to_cart(request, plant_profile, quantity=1):
     """
     Add a plant to the shopping cart or update quantity if already exists.
 
+    The cart limit is checked and the line written in one transaction, see
+    CartContext.add.
+
     Args:
         request: Django request object
         plant_profile: PlantProfile object or ID
         quantity: Quantity to add (default 1)
 
     Returns:
-        ShoppingCart object or None if customer not in session
+        CartChange with the new line quantity and cart total, or None if customer
+        not in session or the cart limit is reached
     """
     from project.models import PlantProfile as PlantProfileModel
-    from project.models import ShoppingCart
 
-    customer = get_or_create_customer_from_session(request)
-    if not customer:
+    cart = get_cart(request)
+    if not cart.customer:
         return None
 
-    max_items = (
-        None
-        if customer.application and customer.application.priority == 1
-        else MAX_NON_PRIORITY_CART_ITEMS
-    )
-    if max_items is not None:
-        current_total = get_cart_total(request)
-        if current_total + quantity > max_items:
-            return None
-
     if isinstance(plant_profile, int):
         plant_profile = PlantProfileModel.objects.get(id=plant_profile)
 
-    cart_item, created = ShoppingCart.objects.get_or_create(
-        customer=customer, plant_profile=plant_profile, defaults={"quantity": quantity}
-    )
-
-    if not created:
-        cart_item.quantity += quantity
-        cart_item.save()
-
-    return cart_item
+    return cart.add(plant_profile, quantity) or None
 
 
 def update_cart_item(request, plant_profile, quantity):
@@ -480,43 +484,18 @@ def update_cart_item(request, plant_profile, quantity):
         quantity: New quantity (0 or negative removes the item)
 
     Returns:
-        ShoppingCart object or None
+        CartChange or None if the item is removed, not in the cart or over the
+        cart limit
     """
-    from project.models import PlantProfile as PlantProfileModel
-    from project.models import ShoppingCart
-
-    customer = get_or_create_customer_from_session(request)
-    if not customer:
+    cart = get_cart(request)
+    if not cart.customer:
         return None
 
-    if isinstance(plant_profile, int):
-        plant_profile = PlantProfileModel.objects.get(id=plant_profile)
-
-    try:
-        cart_item = ShoppingCart.objects.get(
-            customer=customer, plant_profile=plant_profile
-        )
-
-        if quantity <= 0:
-            cart_item.delete()
-            return None
-
-        max_items = (
-            None
-            if customer.application and customer.application.priority == 1
-            else MAX_NON_PRIORITY_CART_ITEMS
-        )
-        if max_items is not None:
-            current_total = get_cart_total(request)
-            desired_total = current_total - cart_item.quantity + quantity
-            if desired_total > max_items:
-                return None
-
-        cart_item.quantity = quantity
-        cart_item.save()
-        return cart_item
-    except ShoppingCart.DoesNotExist:
+    plant_id = plant_profile if isinstance(plant_profile, int) else plant_profile.id
+    change = cart.set_quantity(plant_id, quantity)
+    if not change or not change.quantity:
         return None
+    return change
 
 
 def remove_from_cart(request, plant_profile):
@@ -530,24 +509,12 @@ def remove_from_cart(request, plant_profile):
     Returns:
         Boolean indicating if item was removed
     """
-    from project.models import PlantProfile as PlantProfileModel
-    from project.models import ShoppingCart
-
-    customer = get_or_create_customer_from_session(request)
-    if not customer:
+    cart = get_cart(request)
+    if not cart.customer:
         return False
 
-    if isinstance(plant_profile, int):
-        plant_profile = PlantProfileModel.objects.get(id=plant_profile)
-
-    try:
-        cart_item = ShoppingCart.objects.get(
-            customer=customer, plant_profile=plant_profile
-        )
-        cart_item.delete()
-        return True
-    except ShoppingCart.DoesNotExist:
-        return False
+    plant_id = plant_profile if isinstance(plant_profile, int) else plant_profile.id
+    return cart.remove(plant_id).accepted
 
 
 def get_cart_items(request):
@@ -558,17 +525,9 @@ def get_cart_items(request):
         request: Django request object
 
     Returns:
-        QuerySet of ShoppingCart items or empty QuerySet
+        List of ShoppingCart items, with their plant profiles
     """
-    from project.models import ShoppingCart
-
-    customer = get_or_create_customer_from_session(request)
-    if not customer:
-        return ShoppingCart.objects.none()
-
-    return ShoppingCart.objects.filter(customer=customer).select_related(
-        "plant_profile"
-    )
+    return get_cart(request).lines
 
 
 def get_cart_total(request):
@@ -582,8 +541,7 @@ def get_cart_total(request):
     Returns:
         Integer count of items in cart
     """
-    cart_items = get_cart_items(request)
-    return sum(item.quantity for item in cart_items)
+    return get_cart(request).total
 
 
 def create_order_from_cart(request, donation_amount=0, customer_note=""):
@@ -601,16 +559,13 @@ def create_order_from_cart(request, donation_amount=0, customer_note=""):
     """
     from decimal import Decimal
 
-    from project.models import Order, OrderItem
+    from project.models import Order, OrderItem, ShoppingCart
 
-    customer = get_or_create_customer_from_session(request)
+    cart = get_cart(request)
+    customer = cart.customer
     if not customer:
         return None
 
-    cart_items = get_cart_items(request)
-    if not cart_items.exists():
-        return None
-
     # Ensure donation_amount is a Decimal
     if not isinstance(donation_amount, Decimal):
         donation_amount = Decimal(str(donation_amount))
@@ -622,23 +577,38 @@ def create_order_from_cart(request, donation_amount=0, customer_note=""):
     # Create the order and items inside an atomic transaction, and
     # enqueue email tasks after the transaction commits to avoid races.
     with transaction.atomic():
+        # Read under the customer lock, other requests may have changed the cart
+        cart_items = cart.locked_lines()
+        if not cart_items:
+            return None
+
         order = Order.objects.create(
             customer=customer,
             donation_amount=donation_amount,
             customer_note=customer_note,
             status="pending",
+            item_count=len(cart_items),
+            seed_quantity=sum(cart_item.quantity for cart_item in cart_items),
         )
 
-        # Create OrderItems from cart items (seeds are free)
-        for cart_item in cart_items:
-            OrderItem.objects.create(
-                order=order,
-                plant_profile=cart_item.plant_profile,
-                quantity=cart_item.quantity,
-            )
+        # Create OrderItems from the cart lines in one insert (seeds are free)
+        items = OrderItem.objects.bulk_create(
+            [
+                OrderItem(
+                    order=order,
+                    plant_profile_id=cart_item.plant_profile_id,
+                    quantity=cart_item.quantity,
+                )
+                for cart_item in cart_items
+            ]
+        )
+        order_statistics.items_added(items)
 
         # Clear the shopping cart
-        cart_items.delete()
+        ShoppingCart.objects.filter(
+            id__in=[cart_item.id for cart_item in cart_items]
+        ).delete()
+        cart.drop_lines()
 
         # Schedule Celery tasks to run after successful commit
         transaction.on_commit(lambda: send_order_confirmation_task.delay(order.id))
@@ -658,8 +628,13 @@ def clear_cart(request):
     Returns:
         Number of items deleted
     """
-    cart_items = get_cart_items(request)
-    count, _ = cart_items.delete()
+    from project.models import ShoppingCart
+
+    cart = get_cart(request)
+    if not cart.customer:
+        return 0
+    count, _ = ShoppingCart.objects.filter(customer=cart.customer).delete()
+    cart.drop_lines()
     return count
 
 
@@ -672,6 +647,7 @@ def clear_session(request):
     """
     if "customer_id" in request.session:
         del request.session["customer_id"]
+    get_cart(request).reset()
     request.session.modified = True
 
 
@@ -858,22 +834,28 @@ def get_order_statistics():
     """Get order statistics for dashboard display.
     Returns the following totals by year:
         total orders, pending orders, completed orders, cancelled orders and shipped orders, and total donations by year.
+    Read from the rollups of project.order_statistics.
     """
 
-    orders = (
-        Order.objects.annotate(year=ExtractYear("order_date"))
-        .values("year")
+    def orders(status=None):
+        return Coalesce(
+            Sum("order_count", filter=Q(status=status) if status else None), 0
+        )
+
+    stats = (
+        OrderYearStatistic.objects.values("year")
         .annotate(
-            total_orders=Count("id"),
-            pending_orders=Count("id", filter=Q(status="pending")),
-            completed_orders=Count("id", filter=Q(status="completed")),
-            cancelled_orders=Count("id", filter=Q(status="cancelled")),
-            shipped_orders=Count("id", filter=Q(status="shipped")),
+            total_orders=orders(),
+            pending_orders=orders("pending"),
+            completed_orders=orders("completed"),
+            cancelled_orders=orders("cancelled"),
+            shipped_orders=orders("shipped"),
             total_donations=Sum("donation_amount"),
         )
+        .filter(total_orders__gt=0)
         .order_by("-year")
     )
-    return orders
+    return stats
 
 
 def get_most_ordered_seeds(top_n=10):
@@ -883,35 +865,36 @@ def get_most_ordered_seeds(top_n=10):
         top_n: Number of top ordered seeds to return (default 10)
 
     Returns:
-        QuerySet of OrderItem with annotated order_count
+        QuerySet of the PlantOrderStatistic rollup rows, with the plant names
     """
-    from project.models import OrderItem
-
     most_ordered = (
-        OrderItem.objects.values(
-            "plant_profile__english_name", "plant_profile__latin_name"
+        PlantOrderStatistic.objects.filter(seed_quantity__gt=0)
+        .values(
+            "plant_profile__english_name",
+            "plant_profile__latin_name",
+            "order_count",
+            order_item_count=F("seed_quantity"),
         )
-        .annotate(order_item_count=Sum("quantity"), order_count=Count("order"))
-        .filter(order_item_count__gt=0)
-        .order_by("-order_item_count")[:top_n]
+        .order_by("-seed_quantity")[:top_n]
     )
     return most_ordered
 
 
 # order statistics by cities and postal codes.  The view should display a table with the following columns: city, postal code, number of orders, total donation amount.
 def get_order_statistics_by_location():
-    """Get order statistics by city and postal code."""
-    orders = (
-        Order.objects.values(
-            "customer__province", "customer__city", "customer__postal_code"
-        )
-        .annotate(
-            number_of_orders=Count("id"),
-            total_donation_amount=Sum("donation_amount"),
+    """Get order statistics by city and postal code, from the rollups."""
+    stats = (
+        OrderLocationStatistic.objects.filter(order_count__gt=0)
+        .values(
+            "province",
+            "city",
+            "postal_code",
+            number_of_orders=F("order_count"),
+            total_donation_amount=F("donation_amount"),
         )
-        .order_by("customer__province", "customer__city", "customer__postal_code")
+        .order_by("province", "city", "postal_code")
     )
-    return orders
+    return stats
 
 
 # ============================================================================
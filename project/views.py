@@ -1,8 +1,10 @@
 import csv
+import hashlib
 import io
 import json
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
+from functools import partial
 
 from django.conf import settings
 from django.contrib import messages
@@ -11,10 +13,11 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import Group, Permission
 from django.core.paginator import Paginator
 from django.db import IntegrityError
-from django.db.models import Count, RestrictedError, Sum
+from django.db.models import Count, F, RestrictedError
 from django.db.utils import IntegrityError as DbIntegrityError
 from django.http import FileResponse, HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.html import format_html
@@ -30,12 +33,29 @@ try:
 except ImportError:  # pragma: no cover - dependency should be available in runtime
     stripe = None
 
-from project import filters, forms, models, utils, vascan
+from project import (
+    admission,
+    cache_versions,
+    conditional,
+    filter_schema,
+    filters,
+    forms,
+    models,
+    pagination,
+    profile_bundle,
+    profile_fragments,
+    result_cache,
+    utils,
+    vascan,
+)
 from project.acl_handler import group_required
+from project.admission import admission_required
 from project.models import ProjectUser
+from project.query_budget import query_budget
 
 
 # Create your views here.
+@query_budget(5)
 def index(request):
     return render(request, "project/plant-catalogue-intro.html")
 
@@ -91,14 +111,71 @@ def toggle_plant_accepted(request, pk):
     return JsonResponse(context)
 
 
+def _plant_profile_page_validators(request, pk):
+    # Only the cached bodies have validators, see project.profile_fragments
+    body = profile_fragments.get_body(pk)
+    if body is None:
+        return None
+    plant = (
+        models.PlantProfile.all_objects.filter(pk=pk)
+        .values("modified", "is_active", "toxicity_indicator__modified")
+        .first()
+    )
+    if not plant or not (plant["is_active"] or request.user.is_authenticated):
+        return None
+    return conditional.validators(
+        request,
+        "plant-profile-page",
+        pk,
+        plant["modified"],
+        plant["toxicity_indicator__modified"],
+        hashlib.sha256(body.encode()).hexdigest(),
+    )
+
+
+@query_budget(12)
+@conditional.condition(_plant_profile_page_validators)
 def plant_profile_page(request, pk):
-    plant: models.PlantProfile = utils.single_plant(pk, request)
-    if not plant:
-        return render(request, "core/404.html", status=404)
+    authenticated = request.user.is_authenticated
+    # The page body is cached per plant and language, see project.profile_fragments
+    profile_body = profile_fragments.get_body(pk)
+    if profile_body is None:
+        bundle = profile_bundle.load(pk, authenticated)
+        if not bundle:
+            return render(request, "core/404.html", status=404)
+        plant: models.PlantProfile = bundle.plant
+        profile_body = profile_fragments.set_body(
+            plant.pk,
+            render_to_string(
+                profile_fragments.BODY_TEMPLATE, _plant_profile_body_context(bundle)
+            ),
+        )
+    else:
+        # Only the header, the update links and messages, is rendered
+        plants = (
+            models.PlantProfile.all_objects
+            if authenticated
+            else models.PlantProfile.objects
+        )
+        plant = plants.select_related("toxicity_indicator").filter(pk=pk).first()
+        if not plant:
+            return render(request, "core/404.html", status=404)
+
+    context = {
+        "plant": plant,
+        "title": plant.latin_name,
+        "is_toxic": utils.is_plant_toxic(plant),
+        "profile_body": profile_body,
+    }
+    return render(request, "project/plant_profile/plant-profile-page.html", context)
 
-    plant_narratives = models.PlantNarrative.objects.filter(plant_profile=plant)
 
-    image_count = plant.images.all().count()
+def _plant_profile_body_context(bundle: profile_bundle.PlantProfileBundle):
+    plant = bundle.plant
+
+    plant_narratives = bundle.narratives
+
+    image_count = bundle.image_count
 
     is_row_garden = plant.boulevard_garden_tolerant and plant.max_height <= 2
     landscape_use = (
@@ -161,13 +238,12 @@ def plant_profile_page(request, pk):
     if not is_valid_video_url:
         plant.harvesting_video_link = ""
 
-    # Keep primary image selection logic centralized in utils for consistency.
-    plant_image = utils.plant_primary_image(plant)
+    # Picked from the prefetched images, as utils.plant_primary_image does.
+    plant_image = bundle.primary_image
 
     context = {
         "plant": plant,
         "image_count": image_count,
-        "title": plant.latin_name,
         "bloom_start": bloom_start,
         "bloom_end": bloom_end,
         "landscape_use": landscape_use,
@@ -183,7 +259,7 @@ def plant_profile_page(request, pk):
         "plant_image": plant_image,
         "plant_narratives": plant_narratives,
     }
-    return render(request, "project/plant_profile/plant-profile-page.html", context)
+    return context
 
 
 @group_required("NA")
@@ -285,9 +361,34 @@ def plant_catalogue_intro(request):
     return render(request, "project/plant_catalogue_intro.html", context)
 
 
+def _species_supporting_plants_validators(request, species_model):
+    # The species and their plants have no modified column, the catalogue version
+    # stamp is bumped when they change, each process bumps its own without a
+    # shared cache
+    if not cache_versions.is_shared():
+        return None
+    return conditional.validators(
+        request,
+        species_model.__name__,
+        conditional.table_state(models.PlantProfile.objects.all()),
+        species_model.objects.count(),
+        cache_versions.get_version(cache_versions.CATALOGUE),
+    )
+
+
+@query_budget(8)
+@conditional.condition(
+    partial(
+        _species_supporting_plants_validators, species_model=models.ButterflySpecies
+    )
+)
 def butterfly_supporting_plants(request):
     # This view is used to display a list of butterflies with the plants that support them
-    butterflies = models.ButterflySpecies.objects.all().order_by("latin_name")
+    butterflies = (
+        models.ButterflySpecies.objects.all()
+        .order_by("latin_name")
+        .prefetch_related("plants")
+    )
     context = {
         "title": _("Butterfly Supporting Plants"),
         "url_name": "butterfly-supporting-plants",
@@ -296,9 +397,17 @@ def butterfly_supporting_plants(request):
     return render(request, "project/butterfly_supporting_plants.html", context)
 
 
+@query_budget(8)
+@conditional.condition(
+    partial(_species_supporting_plants_validators, species_model=models.BeeSpecies)
+)
 def bee_supporting_plants(request):
     # This view is used to display a list of bees with the plants that support them
-    bees = models.BeeSpecies.objects.all().order_by("latin_name")
+    bees = (
+        models.BeeSpecies.objects.all()
+        .order_by("latin_name")
+        .prefetch_related("plants")
+    )
     context = {
         "title": _("Bee Supporting Plants"),
         "url_name": "bee-supporting-plants",
@@ -307,6 +416,20 @@ def bee_supporting_plants(request):
     return render(request, "project/bee_supporting_plants.html", context)
 
 
+def _blooming_calendar_validators(request):
+    plants = conditional.table_state(models.PlantProfile.objects.all())
+    bloom_colours = conditional.table_state(models.BloomColour.objects.all())
+    return conditional.validators(
+        request,
+        "blooming-calendar",
+        plants,
+        bloom_colours,
+        last_modified=conditional.latest(plants[0], bloom_colours[0]),
+    )
+
+
+@query_budget(6)
+@conditional.condition(_blooming_calendar_validators)
 def blooming_calendar(request):
     # This view is used to display a blooming calendar
     plants = models.PlantProfile.objects.all().order_by(
@@ -344,14 +467,16 @@ def plants_needing_seeds_csv(request):
 
 def search_plant_images(request):
     # Similar to search_plant_name but for images. Using the plant name from the htmx request to filter images.
+    # The plant name is read in the same query, through the one plant profile join
+    images = models.PlantImage.objects.select_related("morphology_aspect").annotate(
+        plant_latin_name=F("plant_profile__latin_name")
+    )
     if not request.GET:
         data = models.PlantImage.objects.none()
     elif request.user.is_authenticated:
-        data = models.PlantImage.objects.all().order_by("plant_profile__latin_name")
+        data = images.order_by("plant_latin_name")
     else:
-        data = models.PlantImage.objects.filter(plant_profile__is_active=True).order_by(
-            "plant_profile__latin_name"
-        )
+        data = images.filter(plant_profile__is_active=True).order_by("plant_latin_name")
     object_list = filters.PlantImageFilter(request.GET, queryset=data)
     context = {"object_list": object_list.qs}
     template = (
@@ -364,205 +489,75 @@ def search_plant_images(request):
     return render(request, "project/admin/admin-images-page.html", context)
 
 
+@query_budget(12)
 def search_plant_name(request):
     if not request.GET:
         data = models.PlantProfile.objects.none()
     elif request.user.is_authenticated:
-        data = models.PlantProfile.all_objects.all().order_by("latin_name")
+        data = models.PlantProfile.all_objects.all()
     else:
-        data = models.PlantProfile.objects.all().order_by("latin_name")
+        data = models.PlantProfile.objects.all()
 
     object_list = filters.PlantProfileFilter(request.GET, queryset=data)
-    paginator = Paginator(object_list.qs, 24)  # Show 24 plants per page
-    page_number = request.GET.get("page")
-    page_obj = paginator.get_page(page_number)
-
-    ecozones = models.Ecozone.objects.all().order_by("ecozone")
-    growth_habits = models.GrowthHabit.objects.all().order_by("growth_habit")
-    bloom_colours = models.BloomColour.objects.all().order_by("bloom_colour")
+    authenticated = request.user.is_authenticated
+    # Keyset pagination over the cached ordered results, the continuation
+    # requests carry the cursor of the last plant shown. Only the narrow
+    # catalogue cards of the page are read from the database.
+    cursor = request.GET.get("cursor")
+    keys = result_cache.result_keys(object_list, authenticated) if request.GET else []
+    page_obj = pagination.keys_page(
+        keys, models.PlantCard.objects.all(), cursor, per_page=24
+    )
+    if page_obj.has_next:
+        next_query = request.GET.copy()
+        next_query["cursor"] = page_obj.next_cursor
+        next_query = next_query.urlencode()
+    else:
+        next_query = None
 
     # get a list of favourite plants for the logged in user that are contained in the object_list
-    if request.user.is_authenticated:
+    if authenticated:
         favourite_plants = models.PlantCollection.objects.filter(
-            owner=request.user, plants__in=page_obj.object_list
+            owner=request.user, plants__in=[card.pk for card in page_obj.object_list]
         ).values_list("plants__id", flat=True)
     else:
         favourite_plants = None
 
-    # Create lists of different filter categories
-    sun_filters = [
-        "#full_sun",
-        "#part_shade",
-        "#full_shade",
-    ]
-    moisture_filters = [
-        "#moisture_dry",
-        "#moisture_medium",
-        "#moisture_wet",
-    ]
-    growth_habit_filters = [f"#growth_habit_{habit.id}" for habit in growth_habits]
-    growth_habit_filters.append("#growth_habit_reset")
-    physical_attributes_filters = [
-        "#max_height",
-        "#max_width",
-    ]
-    lifecycle_filters = [
-        "#annual",
-        "#biennial",
-        "#perennial",
-        "#spring_ephemeral",
-        "#self_seeding",
-    ]
-    bloom_period_filters = [
-        "#bloom_start",
-        "#bloom_end",
-    ]
-    bloom_colour_filters = [f"#bloom_colour_{color.id}" for color in bloom_colours]
-
-    soil_tolerance_filters = [
-        "#limestone_tolerant",
-        "#sand_tolerant",
-        "#acidic_soil_tolerant",
-    ]
-
-    harvesting_start_filters = [f"#harvesting_start_{month}" for month in range(4, 13)]
-    seed_sharing_filters = [
-        "#seed_availability",
-        "#accepting_seed",
-    ]
-    garden_suitability_filters = [
-        "#rock_garden",
-        "#rain_garden",
-        "#shoreline_rehab",
-        "#container_suitable",
-        "#school_garden",
-        "#woodland_garden",
-        "#wetland_garden",
-        "#boulevard_garden_tolerant",
-        "#row_garden",
-    ]
-    functional_use_filters = [
-        "#ground_cover",
-        "#hedge",
-        "#windbreak_edge",
-    ]
-    gardening_experience_filters = [
-        "#beginner_friendly",
-        "#does_not_spread",
-        "#transplantation_tolerant",
-        "#germinate_easy",
-        "#starter_pack_shade",
-        "#starter_pack_sun_dry",
-        "#starter_pack_sun_wet",
-    ]
-    wildlife_interaction_filters = [
-        "#hummingbird_friendly",
-        "#pollinator_garden",
-        "#bird_friendly",
-        "#deer_tolerant",
-        "#rabbit_tolerant",
-    ]
-    environmental_stress_tolerance_filters = [
-        "#drought_tolerant",
-        "#salt_tolerant",
-        "#foot_traffic_tolerant",
-        "#juglone_tolerant",
-    ]
-    ecosystem_services_filters = [
-        "#bee_host",
-        "#butterfly_host",
-        "#nitrogen_fixer",
-        "#keystones_species",
-    ]
-    conservation_status_filters = [
-        "#endangered",
-        "#grasp_candidate",
-        "#native_to_ottawa_region",
-    ]
-    safety_and_compatibility_filters = [
-        "#septic_tank_safe",
-        "#cause_skin_rashes",
-        "#produces_burs",
-        "#exclude_toxic",
-    ]
-    region_filters = [
-        "#is_native_to_AB",
-        "#is_native_to_BC",
-        "#is_native_to_MB",
-        "#is_native_to_NB",
-        "#is_native_to_NL",
-        "#is_native_to_NS",
-        "#is_native_to_NT",
-        "#is_native_to_NU",
-        "#is_native_to_ON",
-        "#is_native_to_PE",
-        "#is_native_to_QC",
-        "#is_native_to_SK",
-        "#is_native_to_YT",
-        "#native_to_ottawa_region",
-    ]
-    ecozones_filters = [f"#ecozone_{ecozone.id}" for ecozone in ecozones]
-    admin_controls_filters = [
-        "#is_draft",
-        "#is_not_active",
-        "#is_accepted",
-        "#has_notice",
-    ]
-
-    # Merge all filter lists and join with commas
-    hx_include = ",".join(
-        ["#any_plant_name"]
-        + ["#is_active"]
-        + sun_filters
-        + moisture_filters
-        + growth_habit_filters
-        + physical_attributes_filters
-        + lifecycle_filters
-        + bloom_period_filters
-        + bloom_colour_filters
-        + soil_tolerance_filters
-        + harvesting_start_filters
-        + ["#stratification_duration"]
-        + seed_sharing_filters
-        + garden_suitability_filters
-        + functional_use_filters
-        + gardening_experience_filters
-        + wildlife_interaction_filters
-        + environmental_stress_tolerance_filters
-        + ecosystem_services_filters
-        + conservation_status_filters
-        + safety_and_compatibility_filters
-        + region_filters
-        + ecozones_filters
-        + admin_controls_filters
-    )
-    item_count = object_list.qs.count()
-    stratification_durations = models.StratificationDuration.objects.all().order_by(
-        "stratification_duration"
-    )
+    item_count = page_obj.total
+    # Sidebar counts, not needed when htmx only loads another page of results
+    if request.GET and not (request.htmx and cursor):
+        facet_counts = result_cache.facet_counts(object_list, authenticated)
+    else:
+        facet_counts = None
     context = {
-        "growth_habits": growth_habits,
-        "ecozones": ecozones,
-        "bloom_colours": bloom_colours,
-        "stratification_durations": stratification_durations,
-        "months": utils.MONTHS.values(),
-        "months_numbered": utils.MONTHS.items(),
-        "harvesting_period": {
-            k: utils.MONTHS[k] for k in range(5, 12)
-        },  # from April (index 3) to December (index 11)
         "page_obj": page_obj,
+        "next_query": next_query,
         "favourite_plants": favourite_plants,
         "url_name": "index",
         "title": _("Plant Profile Filter"),
         "item_count": item_count,
-        "hx_include": hx_include,
+        "facet_counts": facet_counts,
     }
-    template = (
-        "project/plant-search-results.html"
-        if request.htmx
-        else "project/plant-catalog.html"
+    if request.htmx:
+        # Only the results are swapped in, the sidebar is already on the page
+        return render(request, "project/plant-search-results.html", context)
+
+    schema = filter_schema.get_filter_schema()
+    context.update(
+        {
+            "growth_habits": schema.growth_habits,
+            "ecozones": schema.ecozones,
+            "bloom_colours": schema.bloom_colours,
+            "stratification_durations": schema.stratification_durations,
+            "months": utils.MONTHS.values(),
+            "months_numbered": utils.MONTHS.items(),
+            "harvesting_period": {
+                k: utils.MONTHS[k] for k in range(5, 12)
+            },  # from April (index 3) to December (index 11)
+            "hx_include": schema.hx_include,
+        }
     )
-    return render(request, template, context)
+    return render(request, "project/plant-catalog.html", context)
 
 
 @group_required("Plant Profile Manager")
@@ -2091,9 +2086,12 @@ def admin_accept_all_seeds(request):
     }
     if request.method == "POST":
         # Set all plants to accepting seed and display how many were updated
-        updated_count = models.PlantProfile.objects.filter(accepting_seed=False).update(
-            accepting_seed=True
-        )
+        plants = models.PlantProfile.objects.filter(accepting_seed=False)
+        plant_ids = list(plants.values_list("id", flat=True))
+        updated_count = plants.update(accepting_seed=True)
+        # update() does not send post_save, invalidate the catalogue caches here
+        cache_versions.bump_version_on_commit(cache_versions.CATALOGUE)
+        profile_fragments.evict_on_commit(plant_ids)
         messages.success(
             request,
             _(
@@ -2121,9 +2119,12 @@ def admin_refuse_all_seeds(request):
     }
     if request.method == "POST":
         # Set all plants to not accepting seed and display how many were updated
-        updated_count = models.PlantProfile.objects.filter(accepting_seed=True).update(
-            accepting_seed=False
-        )
+        plants = models.PlantProfile.objects.filter(accepting_seed=True)
+        plant_ids = list(plants.values_list("id", flat=True))
+        updated_count = plants.update(accepting_seed=False)
+        # update() does not send post_save, invalidate the catalogue caches here
+        cache_versions.bump_version_on_commit(cache_versions.CATALOGUE)
+        profile_fragments.evict_on_commit(plant_ids)
         messages.success(
             request,
             _(
@@ -2431,7 +2432,10 @@ def user_logout(request):
 
 @login_required
 def user_plant_collection(request):
-    obj = models.PlantCollection.objects.filter(owner=request.user)
+    # The seed pack table shows sowing details that are not on the catalogue cards
+    obj = models.PlantCollection.objects.filter(owner=request.user).select_related(
+        "plants__stratification_duration", "plants__sowing_depth"
+    )
 
     context = {"object_list": obj}
     return render(request, "project/plant-collection.html", context)
@@ -2892,12 +2896,13 @@ def siteadmin(request):
 def plant_seed_box_label_pdf(request, pk):
     # create a pdf with elements of the plant profile including plant image, a qr code linking to the plant profile page, and formatted for seed box labels
 
-    plant: models.PlantProfile = utils.single_plant(pk, request)
-    if not plant:
+    bundle = profile_bundle.load(pk, request.user.is_authenticated)
+    if not bundle:
         return render(request, "core/404.html", status=404)
+    plant: models.PlantProfile = bundle.plant
 
     plant_profile_url = request.build_absolute_uri(plant.get_absolute_url())
-    plant_image = utils.plant_primary_image(plant)
+    plant_image = bundle.primary_image
 
     qrcode_img = utils.create_qr_code_image(plant_profile_url)
 
@@ -2962,7 +2967,10 @@ def plant_seed_box_label_pdf(request, pk):
 
 
 def plant_label_pdf(request, pk):
-    plant = utils.single_plant(pk, request)
+    bundle = profile_bundle.load(pk, request.user.is_authenticated)
+    if not bundle:
+        return render(request, "core/404.html", status=404)
+    plant = bundle.plant
     plant_lines = utils.plant_label_lines(plant, request)
     plant_info_len = len(plant_lines)
     plant_longest_string = max((line["text"] for line in plant_lines), key=len)
@@ -3570,7 +3578,11 @@ def plant_ecozones(request):
     # the first row is the header with the ecozone names.
     # the first column is the latin name.
     # other columns are the ecozones, with a 1 if the plant is in that ecozone, 0 otherwise.
-    plants = models.PlantProfile.objects.all().order_by("latin_name")
+    plants = (
+        models.PlantProfile.objects.all()
+        .order_by("latin_name")
+        .prefetch_related("ecozones")
+    )
     ecozones = models.Ecozone.objects.all().order_by("ecozone")
     response = HttpResponse(
         content_type="text/csv",
@@ -3581,7 +3593,7 @@ def plant_ecozones(request):
     writer.writerow(header)
     for plant in plants:
         row = [plant.latin_name]
-        plant_ecozones = plant.ecozones.values_list("ecozone", flat=True)
+        plant_ecozones = {ecozone.ecozone for ecozone in plant.ecozones.all()}
         for ecozone in ecozones:
             if ecozone.ecozone in plant_ecozones:
                 row.append(1)
@@ -3760,9 +3772,14 @@ def admin_growth_habit_delete(request, pk):
 
 @group_required(["Image Manager"])
 def admin_images_page(request):
-    images_list = models.PlantImage.objects.annotate(
-        plant_count=Count("plant_profile")
-    ).order_by("plant_profile__latin_name")
+    images_list = (
+        models.PlantImage.objects.select_related("morphology_aspect")
+        .annotate(
+            plant_count=Count("plant_profile"),
+            plant_latin_name=F("plant_profile__latin_name"),
+        )
+        .order_by("plant_latin_name")
+    )
 
     # Set up pagination
     paginator = Paginator(images_list, 18)  # Show 20 images per page
@@ -4074,6 +4091,8 @@ def create_customer(request):
     return render(request, "project/customer-form.html", context)
 
 
+@query_budget(10)
+@admission_required
 def shopping_cart(request):
     """
     Display the shopping cart with all items for current customer.
@@ -4083,21 +4102,20 @@ def shopping_cart(request):
         messages.info(request, _("The seed shop is currently closed."))
         return redirect("index")
 
-    customer = utils.get_or_create_customer_from_session(request)
+    customer = request.cart.customer
     if not customer:
         return redirect("create-customer")
 
-    cart_items = utils.get_cart_items(request)
-    item_count = utils.get_cart_total(request)
-
     context = {
         "customer": customer,
-        "cart_items": cart_items,
-        "item_count": item_count,
+        "cart_items": request.cart.lines,
+        "item_count": request.cart.total,
     }
     return render(request, "project/shopping-cart.html", context)
 
 
+@query_budget(10)
+@admission_required
 def add_to_cart(request, pk):
     """
     Add a plant to the shopping cart.
@@ -4117,8 +4135,8 @@ def add_to_cart(request, pk):
             return response
         return redirect("index")
 
-    customer = utils.get_or_create_customer_from_session(request)
-    if not customer:
+    cart = request.cart
+    if not cart.customer:
         messages.info(request, _("Please create a customer profile first."))
         if is_htmx:
             response = HttpResponse(status=200)
@@ -4144,45 +4162,35 @@ def add_to_cart(request, pk):
         except (ValueError, TypeError):
             quantity = 1
 
-    max_items = (
-        None
-        if customer.application and customer.application.priority == 1
-        else utils.MAX_NON_PRIORITY_CART_ITEMS
-    )
-    if max_items is not None:
-        current_total = utils.get_cart_total(request)
-        if current_total + quantity > max_items:
-            messages.error(
-                request,
-                _(
-                    "You can only order up to %(max_items)d items with your current application."
-                )
-                % {"max_items": max_items},
-            )
-            if is_htmx:
-                response = render(request, "core/_messages.html", status=200)
-                response["HX-Trigger"] = json.dumps({"cartChanged": current_total})
-                response["HX-Retarget"] = "#messages"
-                response["HX-Reswap"] = "innerHTML"
-                return response
-            return redirect("shopping-cart")
-
-    cart_item = utils.add_to_cart(request, plant, quantity)
-    if cart_item:
-        messages.success(
+    # Checks the cart limit and adds in one transaction
+    change = cart.add(plant, quantity)
+    if not change:
+        messages.error(
             request,
-            _("Added %(quantity)d %(plant)s to cart.")
-            % {"quantity": quantity, "plant": plant.latin_name},
+            _(
+                "You can only order up to %(max_items)d items with your current application."
+            )
+            % {"max_items": cart.max_items},
         )
-    else:
-        messages.error(request, _("Could not add item to cart."))
+        if is_htmx:
+            response = render(request, "core/_messages.html", status=200)
+            response["HX-Trigger"] = json.dumps({"cartChanged": change.total})
+            response["HX-Retarget"] = "#messages"
+            response["HX-Reswap"] = "innerHTML"
+            return response
+        return redirect("shopping-cart")
+
+    messages.success(
+        request,
+        _("Added %(quantity)d %(plant)s to cart.")
+        % {"quantity": quantity, "plant": plant.latin_name},
+    )
 
     if is_htmx:
         # For HTMX requests, return a small trigger header with the updated cart count
         # so client can update the cart indicator without a full page refresh.
-        new_count = utils.get_cart_total(request)
         response = HttpResponse(status=200)
-        response["HX-Trigger"] = json.dumps({"cartChanged": new_count})
+        response["HX-Trigger"] = json.dumps({"cartChanged": change.total})
         return response
 
     # For regular requests, redirect
@@ -4190,6 +4198,7 @@ def add_to_cart(request, pk):
     return redirect(next_url)
 
 
+@admission_required
 def update_cart_item(request, pk):
     """
     Update the quantity of an item in the shopping cart.
@@ -4199,8 +4208,8 @@ def update_cart_item(request, pk):
         messages.info(request, _("The seed shop is currently closed."))
         return redirect("index")
 
-    customer = utils.get_or_create_customer_from_session(request)
-    if not customer:
+    cart = request.cart
+    if not cart.customer:
         return redirect("create-customer")
 
     if request.method != "POST":
@@ -4224,11 +4233,7 @@ def update_cart_item(request, pk):
         if updated_item:
             messages.success(request, _("Cart updated."))
         else:
-            max_items = (
-                None
-                if customer.application and customer.application.priority == 1
-                else utils.MAX_NON_PRIORITY_CART_ITEMS
-            )
+            max_items = cart.max_items
             if max_items is None:
                 messages.error(request, _("Could not update cart."))
             else:
@@ -4243,6 +4248,7 @@ def update_cart_item(request, pk):
     return redirect("shopping-cart")
 
 
+@admission_required
 def remove_from_cart(request, pk):
     """
     Remove an item from the shopping cart.
@@ -4252,7 +4258,7 @@ def remove_from_cart(request, pk):
         messages.info(request, _("The seed shop is currently closed."))
         return redirect("index")
 
-    customer = utils.get_or_create_customer_from_session(request)
+    customer = request.cart.customer
     if not customer:
         return redirect("create-customer")
 
@@ -4272,6 +4278,7 @@ def remove_from_cart(request, pk):
     return redirect("shopping-cart")
 
 
+@admission_required
 def checkout(request):
     """
     Display checkout form for reviewing order and adding donation.
@@ -4282,12 +4289,12 @@ def checkout(request):
         messages.info(request, _("Donations are currently not accepted."))
         return redirect("shopping-cart")
 
-    customer = utils.get_or_create_customer_from_session(request)
+    customer = request.cart.customer
     if not customer:
         return redirect("create-customer")
 
-    cart_items = utils.get_cart_items(request)
-    if not cart_items.exists():
+    cart_items = request.cart.lines
+    if not cart_items:
         messages.warning(request, _("Your cart is empty. Add seeds before checkout."))
         return redirect("shopping-cart")
 
@@ -4311,6 +4318,8 @@ def checkout(request):
         )
 
         if order:
+            # Next customer waiting for the shop
+            admission.release(request)
             messages.success(
                 request,
                 _("Order created successfully! Order #%(order_id)d")
@@ -4320,7 +4329,7 @@ def checkout(request):
         else:
             messages.error(request, _("Could not create order. Please try again."))
 
-    item_count = utils.get_cart_total(request)
+    item_count = request.cart.total
     context = {
         "customer": customer,
         "cart_items": cart_items,
@@ -4947,14 +4956,9 @@ def admin_plant_narrative_delete(request, pk):
 def admin_order_management_page(request):
     """Display orders placed by customers for management purposes. Includes pagination and order status filtering."""
     status_filter = request.GET.get("status")
-    orders = (
-        models.Order.objects.select_related("customer")
-        .prefetch_related("items__plant_profile")
-        .annotate(
-            orderitem_count=Count("items", distinct=True),
-            total_seed_quantity=Sum("items__quantity"),
-        )
-        .order_by("-order_date")
+    # The item totals are stored on the orders, the items are not read
+    orders = models.Order.objects.select_related("customer__application").order_by(
+        "-order_date"
     )
     if status_filter in dict(models.Order.ORDER_STATUS_CHOICES):
         orders = orders.filter(status=status_filter)
@@ -5103,6 +5107,7 @@ def order_history(request):
     return render(request, "project/order-history.html", context)
 
 
+@admission_required
 def clear_cart(request):
     """
     Clear all items from the shopping cart.
@@ -5111,7 +5116,7 @@ def clear_cart(request):
     if request.method != "POST":
         return redirect("shopping-cart")
 
-    customer = utils.get_or_create_customer_from_session(request)
+    customer = request.cart.customer
     if not customer:
         return redirect("create-customer")
 
@@ -2,6 +2,8 @@
 set -eu
 
 mkdir -p logs
+# Metrics of the previous run's processes
+rm -rf "${METRICS_DIR:-logs/metrics}"
 touch logs/django.log logs/project.log logs/email.log logs/signals.log
 
 python manage.py collectstatic --noinput